@@ -1,5 +1,9 @@
 from django.shortcuts import render
 
+from core.cache_pagina import cache_anonimo
+
+
+@cache_anonimo()
 def index(request):
     """
     Exibe a página de índice do projeto Brincando e Dialogando,
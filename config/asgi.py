@@ -14,6 +14,7 @@ django_asgi_app = get_asgi_application()
 # --- IMPORTAÇÕES QUE DEPENDEM DO DJANGO INICIALIZADO ---
 from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
+from core.instrumentacao import InstrumentacaoASGI
 
 # Importação das rotas dos apps
 import mensagens.routing
@@ -24,11 +25,12 @@ application = ProtocolTypeRouter({
     "http": django_asgi_app,
 
     # 2. Requisições WebSocket
-    "websocket": AuthMiddlewareStack(
+    # (InstrumentacaoASGI mede cada conexão por rota, ver core/instrumentacao.py)
+    "websocket": InstrumentacaoASGI(AuthMiddlewareStack(
         URLRouter(
             # Combina as rotas dos apps ativos
             mensagens.routing.websocket_urlpatterns +
             repositorio.routing.websocket_urlpatterns
         )
-    ),
+    )),
 })
\ No newline at end of file
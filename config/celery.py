@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.signals import before_task_publish, task_prerun, worker_init, worker_process_shutdown
 
 # 1. Define o módulo de configurações padrão do Django para o Celery
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
@@ -13,6 +14,32 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # 3. Auto-descobre tasks.py em todos os apps instalados (como o galerias/tasks.py)
 app.autodiscover_tasks()
 
+# 4. Métricas Prometheus (core/metricas.py). Importação tardia: este módulo é
+# carregado junto com o Django, antes das settings.
+@before_task_publish.connect
+def _marcar_publicacao(**kwargs):
+    from core import metricas
+    metricas.marcar_publicacao(**kwargs)
+
+
+@task_prerun.connect
+def _medir_espera(**kwargs):
+    from core import metricas
+    metricas.medir_espera(**kwargs)
+
+
+@worker_init.connect
+def _iniciar_exportador(**kwargs):
+    from core import metricas
+    metricas.iniciar_exportador_celery(**kwargs)
+
+
+@worker_process_shutdown.connect
+def _processo_encerrado(**kwargs):
+    from core import metricas
+    metricas.processo_encerrado(**kwargs)
+
+
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
\ No newline at end of file
@@ -0,0 +1,44 @@
+import asyncio
+import weakref
+
+import redis
+import redis.asyncio as redis_async
+from django.conf import settings
+
+
+# NOTA: Clientes Redis compartilhados pelo processo, apontando para o mesmo
+# REDIS_URL usado pelo Channels. As chaves da aplicação usam prefixos próprios
+# (ex: 'presenca:') e não colidem com as chaves 'asgi:' do channels_redis.
+
+# Cliente síncrono (views, signals e tasks do Celery).
+_cliente_sync = None
+
+# Clientes assíncronos ficam presos ao event loop em que foram criados:
+# os consumers rodam no loop do Daphne, mas async_to_sync cria loops próprios.
+_clientes_async = weakref.WeakKeyDictionary()
+
+
+def get_redis():
+    """Retorna o cliente Redis síncrono do processo (respostas já decodificadas)."""
+    global _cliente_sync
+    if _cliente_sync is None:
+        _cliente_sync = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _cliente_sync
+
+
+def redis_disponivel():
+    """True se o Redis responde (os testes que dependem dele são pulados sem ele)."""
+    try:
+        return get_redis().ping()
+    except redis.RedisError:
+        return False
+
+
+def get_redis_async():
+    """Retorna o cliente Redis assíncrono do event loop corrente."""
+    loop = asyncio.get_running_loop()
+    cliente = _clientes_async.get(loop)
+    if cliente is None:
+        cliente = redis_async.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        _clientes_async[loop] = cliente
+    return cliente
@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import tempfile
 import environ
 
 # ==============================================================================
@@ -53,11 +54,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primeiro da lista: mede o custo total da requisição (core/instrumentacao.py)
+    'core.instrumentacao.InstrumentacaoMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.RenovacaoSessaoMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -142,6 +146,27 @@ AWS_S3_QUERYSTRING_AUTH = True
 AWS_S3_SIGNATURE_VERSION = 's3v4'
 AWS_S3_FILE_OVERWRITE = False
 
+# --- Entrega das imagens privadas (PrivateMediaProxyView, ver galerias/midia.py) ---
+# 'stream' (padrão), 'x-accel' (nginx) ou
+# 'redirect' (302 para URL assinada de vida curta; o servidor sai do caminho dos dados).
+# Exemplo de location interna do nginx para o modo x-accel:
+#   location ~ ^/_s3_interno/(?<s3_host>[^/]+)/(?<s3_caminho>.*)$ {
+#       internal;
+#       resolver 1.1.1.1;
+#       proxy_set_header Host $s3_host;
+#       proxy_pass https://$s3_host/$s3_caminho$is_args$args;
+#       proxy_cache midia; proxy_cache_key $s3_host/$s3_caminho;  # cache local (opcional)
+#   }
+# e, na location que encaminha para o Daphne:
+#   proxy_set_header X-Sendfile-Type X-Accel-Redirect;
+MEDIA_PROXY_MODO = env('MEDIA_PROXY_MODO', default='stream')
+MEDIA_PROXY_ACCEL_PREFIXO = '/_s3_interno/'
+MEDIA_PROXY_CHUNK = 64 * 1024
+# Threads para as chamadas bloqueantes ao S3 feitas pela view async do proxy
+MEDIA_PROXY_THREADS_S3 = 50
+# Modo 'redirect': duração da janela de cache das URLs assinadas (segundos)
+MEDIA_PROXY_REDIRECT_JANELA = 300
+
 # Gestão de Storages (Conforme Guisbeghen)
 STORAGES = {
     "default": {
@@ -174,21 +199,55 @@ LOGIN_URL = 'users:login'
 # 9. CONFIGURAÇÕES DE SESSÃO
 # ==============================================================================
 
-SESSION_SAVE_EVERY_REQUEST = True
+# Sessões no Redis (cache 'default'), com o banco como reserva: a leitura só
+# vai ao banco quando a chave não está no cache ou o Redis falha.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# A expiração desliza, mas a sessão só é regravada quando a última renovação
+# passou de SESSAO_RENOVACAO_INTERVALO (core/middleware.py). O proxy de mídia
+# nunca renova (uma página de galeria dispara dezenas de /medias3/).
+SESSION_SAVE_EVERY_REQUEST = False
+SESSAO_RENOVACAO_INTERVALO = 60 * 15
+SESSAO_CAMINHOS_SEM_RENOVACAO = ('/medias3/',)
 
 # ==============================================================================
 # 10. CONFIGURAÇÕES DO DJANGO CHANNELS
 # ==============================================================================
 
+REDIS_URL = env('REDIS_URL')
+
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            "hosts": [env('REDIS_URL')],
+            "hosts": [REDIS_URL],
         },
     },
 }
 
+# Presença no chat (registro no Redis, ver mensagens/presenca.py)
+CHAT_PRESENCA_TTL = 60  # Segundos sem heartbeat até a conexão ser considerada morta
+CHAT_PRESENCA_DEBOUNCE = 2  # Janela (s) para agregar entradas/saídas em um único diff
+
+# Cache do Django no mesmo Redis (chaves com prefixo próprio)
+CACHES = {
+    'default': {
+        # RedisCache que conta acertos/faltas por requisição (core/instrumentacao.py)
+        'BACKEND': 'core.instrumentacao.RedisCacheInstrumentado',
+        'LOCATION': REDIS_URL,
+        'KEY_PREFIX': 'ranieri',
+        'TIMEOUT': 60 * 15,
+    },
+}
+
+# Cache de página inteira para visitantes anônimos (core/cache_pagina.py).
+# TIMEOUT: tempo no cache do Django (purgado ao salvar os modelos da página).
+# MAX_AGE: Cache-Control enviado ao navegador/proxy, que não recebem a purga.
+PAGINA_CACHE_TIMEOUT = 60 * 60
+PAGINA_CACHE_MAX_AGE = 60
+# Páginas guardadas por view e versão das tags (combinações de parâmetros)
+PAGINA_CACHE_VARIANTES = 500
+
 # ==============================================================================
 # 11. CONFIGURAÇÕES CELERY (REVISADO)
 # ==============================================================================
@@ -219,6 +278,25 @@ CELERY_TASK_SOFT_TIME_LIMIT = 600
 CELERY_TASK_TIME_LIMIT = 900
 
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+# Copiadas para o banco pelo DatabaseScheduler na inicialização do beat
+CELERY_BEAT_SCHEDULE = {
+    'limpar-exportacoes-mensagens': {
+        'task': 'mensagens.tasks.limpar_exportacoes_task',
+        'schedule': 6 * 60 * 60,
+    },
+    # PROCESSAMENTO_DIR_TEMPORARIO é local: limpa a máquina do worker que a executar
+    'limpar-rascunhos-processamento': {
+        'task': 'repositorio.tasks.limpar_rascunhos_task',
+        'schedule': 6 * 60 * 60,
+    },
+}
+
+# Filas: 'celery' (padrão, uploads/rotação) e 'baixa_prioridade' (reprocessamentos em massa).
+# Em produção, rode um worker dedicado: celery -A config worker -Q baixa_prioridade -c 1
+CELERY_TASK_DEFAULT_QUEUE = 'celery'
+CELERY_TASK_ROUTES = {
+    'repositorio.tasks.reaplicar_marca_dagua_task': {'queue': 'baixa_prioridade'},
+}
 
 # ==============================================================================
 # 12. CONFIGURAÇÕES DE EMAIL
@@ -234,6 +312,34 @@ HOMEPAGE_ITEMS_LIMIT = 9
 DATA_UPLOAD_MAX_MEMORY_SIZE = 52428800
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 2000
 
+# Exportação CSV de mensagens: acima deste total o arquivo é gerado pelo Celery
+EXPORTACAO_CSV_LIMITE_SINCRONO = 100000
+# Arquivos gerados pelo Celery: fora do MEDIA_ROOT (o /media/ é servido sem
+# login), entregues só pela view do admin e apagados depois da validade.
+EXPORTACOES_ROOT = env('EXPORTACOES_ROOT', default=str(BASE_DIR / 'privado' / 'exportacoes'))
+EXPORTACOES_VALIDADE = 7 * 24 * 60 * 60  # Segundos
+
+# Upload direto para o S3: janela de arquivos simultâneos do agendador JS
+UPLOAD_CONCORRENCIA_INICIAL = 3
+UPLOAD_CONCORRENCIA_MAXIMA = 8
+# Redução no navegador antes do upload, quando a galeria não define a sua (None = original)
+UPLOAD_REDUCAO_LADO_MAXIMO = None
+UPLOAD_REDUCAO_QUALIDADE = 85
+# Rascunho local do processamento de imagens (original baixada e rendição
+# ainda não enviada), reaproveitado pelas retentativas no mesmo worker
+PROCESSAMENTO_DIR_TEMPORARIO = os.path.join(tempfile.gettempdir(), 'ranieri_processamento')
+# Rascunhos parados há mais tempo que isso (worker morto) são apagados (limpar_rascunhos_task)
+PROCESSAMENTO_RASCUNHO_VALIDADE = 24 * 60 * 60
+# Reaplicação da marca d'água após editar um WatermarkConfig (fila baixa_prioridade)
+MARCA_DAGUA_REAPLICACAO_LOTE = 20
+MARCA_DAGUA_REAPLICACAO_INTERVALO = 30  # segundos entre lotes
+# Se houver mais imagens que isso aguardando processamento, a reaplicação espera.
+# Só contam os uploads recentes (imagens presas em PROCESSANDO não seguram a
+# fila para sempre) e a espera tem limite de adiamentos seguidos.
+MARCA_DAGUA_REAPLICACAO_LIMITE_FILA = 10
+MARCA_DAGUA_REAPLICACAO_JANELA_FILA = 60 * 60  # segundos
+MARCA_DAGUA_REAPLICACAO_MAX_ADIAMENTOS = 20
+
 
 # ==============================================================================
 # 14. LOGGING
@@ -248,6 +354,10 @@ LOGGING = {
             'class': 'logging.FileHandler',
             'filename': os.path.join(BASE_DIR, 'django_debug.log'),
         },
+        'console': {
+            'level': 'WARNING',
+            'class': 'logging.StreamHandler',
+        },
     },
     'loggers': {
         'django': {
@@ -255,5 +365,43 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': True,
         },
+        # Requisições lentas, com a lista de queries
+        'core.instrumentacao': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
     },
-}
\ No newline at end of file
+}
+
+# ==============================================================================
+# 15. INSTRUMENTAÇÃO DE DESEMPENHO (core/instrumentacao.py)
+# ==============================================================================
+# Medições por rota num buffer circular de cada processo, publicado no Redis a
+# cada INSTRUMENTACAO_PUBLICAR_INTERVALO segundos. Relatório: /desempenho/
+# (staff) ou `python manage.py desempenho`.
+
+INSTRUMENTACAO_BUFFER = 5000
+INSTRUMENTACAO_LENTO_MS = 1000
+INSTRUMENTACAO_PUBLICAR_INTERVALO = 30
+# ==============================================================================
+# 16. MÉTRICAS PROMETHEUS (core/metricas.py)
+# ==============================================================================
+# Daphne e os workers do Celery gravam as métricas em arquivos de
+# PROMETHEUS_MULTIPROC_DIR (modo multiprocesso do prometheus_client); a
+# exposição soma todos os processos da máquina. Esvazie a pasta antes de subir
+# os serviços (ex: ExecStartPre=/bin/rm -rf <pasta>/* no systemd).
+#
+# Coleta: /metricas/ (web) ou a porta METRICAS_CELERY_PORTA (servidor HTTP
+# aberto pelo worker). Numa máquina com os dois serviços, basta raspar um deles.
+
+METRICAS_DIR = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'ranieri_metricas')
+)
+os.makedirs(METRICAS_DIR, exist_ok=True)
+
+# Em produção /metricas/ exige o token (sem ele, responde 403). Os IPs abaixo
+# só valem com DEBUG, para o desenvolvimento local sem token.
+METRICAS_TOKEN = env('METRICAS_TOKEN', default='')
+METRICAS_IPS_PERMITIDOS = ('127.0.0.1', '::1')
+METRICAS_CELERY_PORTA = env.int('METRICAS_CELERY_PORTA', default=9808)
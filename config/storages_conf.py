@@ -24,4 +24,28 @@ class PrivateMediaStorage(S3Boto3Storage):
     querystring_auth = False
 
     # GARANTIA DE PRIVACIDADE:
-    custom_domain = False
\ No newline at end of file
+    custom_domain = False
+
+# --- Cliente boto3 compartilhado ---
+# Criar um client por requisição custa caro (credenciais, endpoints, pool HTTP).
+# O client do boto3 é thread-safe, então um por processo atende views e tasks.
+_s3_client = None
+
+
+def get_s3_client():
+    global _s3_client
+    if _s3_client is None:
+        import boto3
+        from botocore.config import Config
+        from django.conf import settings
+
+        _s3_client = boto3.client(
+            's3',
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+            region_name=settings.AWS_S3_REGION_NAME,
+            config=Config(signature_version='s3v4', max_pool_connections=50)
+        )
+        from core.instrumentacao import instrumentar_cliente_s3
+        instrumentar_cliente_s3(_s3_client)
+    return _s3_client
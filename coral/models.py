@@ -2,6 +2,10 @@ import os
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+from core.cache_pagina import purgar_ao_salvar
+from core.navegacao import IndiceLivro
+
+
 class HistoriaCoral(models.Model):
     titulo = models.CharField(
         max_length=200,
@@ -84,4 +88,13 @@ class RepertorioCoral(models.Model):
     def extensao_arquivo(self):
         if self.arquivo:
             return os.path.splitext(self.arquivo.name)[1].lower()
-        return ""
\ No newline at end of file
+        return ""
+
+
+# Índices cacheados da navegação dos livros digitais (core/navegacao.py)
+indice_historia = IndiceLivro(HistoriaCoral, 'coral_historia')
+indice_repertorio = IndiceLivro(RepertorioCoral, 'coral_repertorio')
+
+# Páginas anônimas cacheadas do coral (core/cache_pagina.py)
+purgar_ao_salvar(HistoriaCoral, 'coral')
+purgar_ao_salvar(RepertorioCoral, 'coral')
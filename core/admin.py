@@ -1,3 +1,26 @@
 from django.contrib import admin
 
-# Register your models here.
+
+# ==============================================================================
+# FILTRO DE LISTAGEM COM RELAÇÕES CARREGADAS
+# ==============================================================================
+# O RelatedFieldListFilter monta as opções com str() de cada objeto relacionado.
+# Quando o __str__ lê outras tabelas (Canal -> Grupo -> AuthGroup, usuário ->
+# registro), cada opção custa uma query. Este filtro carrega essas relações na
+# mesma consulta: list_filter = (('canal', filtro_com_relacoes('grupo__auth_group')),)
+
+def filtro_com_relacoes(*relacoes):
+    class FiltroComRelacoes(admin.RelatedFieldListFilter):
+        def field_choices(self, field, request, model_admin):
+            ordering = self.field_admin_ordering(field, request, model_admin)
+            qs = (
+                field.remote_field.model._default_manager
+                .complex_filter(field.get_limit_choices_to())
+                .select_related(*relacoes)
+            )
+            if ordering:
+                qs = qs.order_by(*ordering)
+            campo = field.remote_field.get_related_field().attname
+            return [(getattr(obj, campo), str(obj)) for obj in qs]
+
+    return FiltroComRelacoes
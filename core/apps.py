@@ -4,4 +4,12 @@ from django.utils.translation import gettext_lazy as _
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
-    verbose_name = _("Geral do Site")
\ No newline at end of file
+    verbose_name = _("Geral do Site")
+
+    def ready(self):
+        # Mede as queries de todas as conexões (core/instrumentacao.py)
+        from django.db.backends.signals import connection_created
+        from .instrumentacao import instalar_na_conexao
+        from .metricas import conexao_criada
+        connection_created.connect(instalar_na_conexao, dispatch_uid='instrumentacao')
+        connection_created.connect(conexao_criada, dispatch_uid='metricas')
\ No newline at end of file
@@ -0,0 +1,672 @@
+import asyncio
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import secrets
+import shutil
+import string
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from email.utils import formatdate
+from functools import cache
+from urllib.parse import unquote, urlencode, urlsplit
+
+import botocore.handlers
+import django
+from botocore.awsrequest import AWSResponse
+from django.conf import settings
+from django.test.utils import override_settings, setup_databases, teardown_databases
+from django.urls import reverse
+from urllib3 import HTTPResponse
+
+from . import instrumentacao, massa_dados
+from .instrumentacao import _percentil
+
+
+# ==============================================================================
+# BENCHMARK DE CARGA OFFLINE (`manage.py benchmark`)
+# ==============================================================================
+# Sobe a aplicação ASGI inteira (config/asgi.py, com middlewares e
+# instrumentação) dentro do processo, sem rede:
+#   - banco: banco de teste descartável, criado e destruído como no `manage.py test`
+#   - S3: bucket em memória (S3Local) que responde ao boto3 no 'before-send';
+#     assinatura, parâmetros e parsing das respostas continuam os reais
+#   - Celery: eager (a task roda dentro da requisição que a enfileira)
+#   - Channels e cache: em memória, ou o Redis configurado com --redis
+#
+# Os cenários reproduzem o uso real (pais abrindo uma galeria, fotógrafo
+# enviando um lote, turma conversando num Canal). Cada um gera vazão e
+# p50/p95/p99 por operação, medidos no cliente; as queries por rota vêm das
+# amostras da InstrumentacaoMiddleware/InstrumentacaoASGI. O resultado vai
+# para um JSON de referência, com o qual as execuções seguintes são comparadas.
+
+HOST = 'benchmark.local'
+BUCKET = 'ranieri-benchmark'
+TIMEOUT = 120  # Segundos de espera por uma resposta (processamento de foto incluso)
+INTERVALO_RSS = 0.02  # Segundos entre as leituras de memória durante um cenário
+
+
+# ==============================================================================
+# 1. S3 LOCAL
+# ==============================================================================
+
+def _cabecalho(request, nome):
+    valor = request.headers.get(nome)
+    return valor.decode() if isinstance(valor, bytes) else valor
+
+
+def _decodificar_aws_chunked(dados):
+    """Corpo 'aws-chunked' (checksum no trailer, padrão do botocore nos PutObject)."""
+    saida = bytearray()
+    posicao = 0
+    while True:
+        fim_linha = dados.index(b'\r\n', posicao)
+        tamanho = int(dados[posicao:fim_linha].split(b';')[0], 16)
+        if not tamanho:
+            return bytes(saida)
+        inicio = fim_linha + 2
+        saida += dados[inicio:inicio + tamanho]
+        posicao = inicio + tamanho + 2
+
+
+def _intervalo(valor, tamanho):
+    """Cabeçalho Range ('bytes=0-99', 'bytes=100-') -> (início, fim inclusivo)."""
+    inicio, _, fim = valor.split('=', 1)[1].partition('-')
+    if not inicio:
+        return max(tamanho - int(fim), 0), tamanho - 1
+    return int(inicio), min(int(fim), tamanho - 1) if fim else tamanho - 1
+
+
+def _storages_s3():
+    """Storages S3 já instanciados: os de settings.STORAGES e os dos FileFields dos models."""
+    from django.apps import apps
+    from django.core.files.storage import storages
+    from django.db.models import FileField
+    from storages.backends.s3boto3 import S3Boto3Storage
+
+    candidatos = [storages[alias] for alias in settings.STORAGES]
+    for modelo in apps.get_models():
+        candidatos += [campo.storage for campo in modelo._meta.fields if isinstance(campo, FileField)]
+    unicos = {id(storage): storage for storage in candidatos if isinstance(storage, S3Boto3Storage)}
+    return list(unicos.values())
+
+
+class S3Local:
+    """
+    Bucket em memória. Cobre as operações usadas pelo site: PutObject (storages
+    e upload_fileobj), GetObject com Range (proxy e download_fileobj),
+    HeadObject e DeleteObject. URLs e formulários assinados saem do boto3 sem
+    chamada de rede e continuam funcionando.
+    """
+
+    def __init__(self, bucket=BUCKET):
+        self.bucket = bucket
+        self.objetos = {}
+        self.chamadas = 0
+        self._trava = threading.Lock()
+        self._originais = []
+
+    def put(self, chave, corpo, tipo=None):
+        """Grava direto no bucket (massa de dados e o envio que o navegador faria)."""
+        tipo = tipo or mimetypes.guess_type(chave)[0] or 'binary/octet-stream'
+        with self._trava:
+            self.objetos[chave] = (bytes(corpo), tipo, formatdate(usegmt=True))
+
+    def instalar(self):
+        """Liga o bucket às sessões do boto3 criadas daqui em diante e aos storages existentes."""
+        from config import storages_conf
+
+        # Registrado em toda sessão nova do botocore: client compartilhado e
+        # as conexões por thread dos storages
+        botocore.handlers.BUILTIN_HANDLERS.append(('before-send.s3', self.responder))
+        storages_conf._s3_client = None
+        for storage in _storages_s3():
+            self._originais.append((storage, storage.bucket_name, storage.access_key, storage.secret_key))
+            storage.bucket_name = self.bucket
+            storage.access_key = storage.secret_key = 'benchmark'
+            storage._connections = threading.local()
+            storage._bucket = None
+
+    def remover(self):
+        from config import storages_conf
+
+        botocore.handlers.BUILTIN_HANDLERS.remove(('before-send.s3', self.responder))
+        storages_conf._s3_client = None
+        for storage, bucket_name, access_key, secret_key in self._originais:
+            storage.bucket_name, storage.access_key, storage.secret_key = bucket_name, access_key, secret_key
+            storage._connections = threading.local()
+            storage._bucket = None
+        self._originais = []
+
+    def _chave(self, url):
+        partes = urlsplit(url)
+        caminho = unquote(partes.path)
+        # Endereçamento virtual (bucket no host) ou por caminho (/bucket/chave)
+        if partes.hostname.startswith(f'{self.bucket}.'):
+            return caminho[1:]
+        return caminho[len(self.bucket) + 2:]
+
+    @staticmethod
+    def _resposta(request, status, cabecalhos=None, corpo=b''):
+        cabecalhos = cabecalhos or {}
+        # request_method: no HEAD o Content-Length descreve o objeto, não o corpo
+        if request.method == 'HEAD':
+            corpo = b''
+        raw = HTTPResponse(body=io.BytesIO(corpo), headers=cabecalhos, status=status,
+                           preload_content=False, request_method=request.method)
+        return AWSResponse(request.url, status, cabecalhos, raw)
+
+    def _erro(self, request, status, codigo):
+        xml = f'<?xml version="1.0" encoding="UTF-8"?><Error><Code>{codigo}</Code><Message>{codigo}</Message></Error>'
+        return self._resposta(request, status, {'Content-Type': 'application/xml'}, xml.encode())
+
+    def responder(self, request, event_name, **kwargs):
+        """Handler do 'before-send.s3': a resposta devolvida substitui a chamada HTTP."""
+        operacao = event_name.rsplit('.', 1)[-1]
+        chave = self._chave(request.url)
+        with self._trava:
+            self.chamadas += 1
+
+        if operacao == 'PutObject':
+            corpo = request.body.read() if hasattr(request.body, 'read') else request.body or b''
+            corpo = corpo.encode() if isinstance(corpo, str) else bytes(corpo)
+            if 'aws-chunked' in (_cabecalho(request, 'Content-Encoding') or ''):
+                corpo = _decodificar_aws_chunked(corpo)
+            self.put(chave, corpo, _cabecalho(request, 'Content-Type'))
+            return self._resposta(request, 200, {'ETag': f'"{hashlib.md5(corpo).hexdigest()}"'})
+
+        if operacao in ('GetObject', 'HeadObject'):
+            with self._trava:
+                objeto = self.objetos.get(chave)
+            if objeto is None:
+                return self._erro(request, 404, 'NoSuchKey')
+            corpo, tipo, modificado = objeto
+            cabecalhos = {
+                'Content-Type': tipo, 'Last-Modified': modificado,
+                'ETag': f'"{hashlib.md5(corpo).hexdigest()}"', 'Accept-Ranges': 'bytes',
+            }
+            status = 200
+            intervalo = _cabecalho(request, 'Range')
+            if intervalo and operacao == 'GetObject':
+                inicio, fim = _intervalo(intervalo, len(corpo))
+                cabecalhos['Content-Range'] = f'bytes {inicio}-{fim}/{len(corpo)}'
+                corpo = corpo[inicio:fim + 1]
+                status = 206
+            cabecalhos['Content-Length'] = str(len(corpo))
+            return self._resposta(request, status, cabecalhos, corpo)
+
+        if operacao == 'DeleteObject':
+            with self._trava:
+                self.objetos.pop(chave, None)
+            return self._resposta(request, 204)
+
+        return self._erro(request, 501, 'NotImplemented')
+
+
+@cache
+def foto_de_teste(largura, altura):
+    """JPEG com gradiente e ruído: tamanho e custo de decodificação próximos de uma foto real."""
+    from PIL import Image
+
+    fundo = Image.linear_gradient('L').resize((largura, altura)).convert('RGB')
+    ruido = Image.effect_noise((largura, altura), 40).convert('RGB')
+    saida = io.BytesIO()
+    Image.blend(fundo, ruido, 0.35).save(saida, format='JPEG', quality=88)
+    return saida.getvalue()
+
+
+# ==============================================================================
+# 2. AMBIENTE ISOLADO
+# ==============================================================================
+
+@contextmanager
+def s3_local():
+    """
+    Bucket e credenciais fixos com o S3Local instalado: também usado pelos
+    testes, que assim não dependem das variáveis AWS_* do deploy.
+    """
+    s3 = S3Local()
+    with override_settings(AWS_ACCESS_KEY_ID='benchmark', AWS_SECRET_ACCESS_KEY='benchmark',
+                           AWS_STORAGE_BUCKET_NAME=BUCKET):
+        s3.instalar()
+        try:
+            yield s3
+        finally:
+            s3.remover()
+
+
+@contextmanager
+def ambiente(redis=False):
+    """
+    Banco de teste, S3 local e Celery eager; sem `redis`, channel layer e cache
+    em memória. Ao sair, o banco é destruído e as configurações voltam.
+    """
+    from config.celery import app
+    from django.db import connection
+
+    pasta = tempfile.mkdtemp(prefix='ranieri_benchmark_')
+    ajustes = {
+        'DEBUG': False,
+        'ALLOWED_HOSTS': [HOST],
+        'SECURE_SSL_REDIRECT': False,
+        'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend',
+        'PROCESSAMENTO_DIR_TEMPORARIO': pasta,
+        # A instrumentação só alimenta o buffer local: sem publicar no Redis e sem log de lentidão
+        'INSTRUMENTACAO_PUBLICAR_INTERVALO': float('inf'),
+        'INSTRUMENTACAO_LENTO_MS': float('inf'),
+    }
+    if not redis:
+        ajustes['CHANNEL_LAYERS'] = {
+            'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer', 'CONFIG': {'capacity': 10000}},
+        }
+        ajustes['CACHES'] = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+    # SQLite: o banco de teste padrão é em memória com cache compartilhado, que
+    # responde "table is locked" na hora às escritas concorrentes. Em arquivo,
+    # as escritas esperam a vez (timeout do sqlite3), como no banco de produção.
+    teste = connection.settings_dict.setdefault('TEST', {})
+    nome_teste = teste.get('NAME')
+    if connection.vendor == 'sqlite' and not nome_teste:
+        teste['NAME'] = os.path.join(pasta, 'benchmark.sqlite3')
+
+    eager = (app.conf.task_always_eager, app.conf.task_eager_propagates)
+    with override_settings(**ajustes), s3_local() as s3:
+        bancos = setup_databases(verbosity=0, interactive=False)
+        app.conf.task_always_eager = app.conf.task_eager_propagates = True
+        try:
+            yield s3
+        finally:
+            app.conf.task_always_eager, app.conf.task_eager_propagates = eager
+            teardown_databases(bancos, verbosity=0)
+            teste['NAME'] = nome_teste
+            shutil.rmtree(pasta, ignore_errors=True)
+
+
+# ==============================================================================
+# 3. CLIENTE E MEDIÇÃO
+# ==============================================================================
+
+class Cliente:
+    """Navegador de um usuário logado: sessão e CSRF em cada requisição ASGI."""
+
+    def __init__(self, application, usuario):
+        from django.test import Client
+
+        navegador = Client()
+        navegador.force_login(usuario)
+        self.application = application
+        self.usuario = usuario
+        self.csrf = ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(32))
+        cookies = (
+            f'{settings.SESSION_COOKIE_NAME}={navegador.cookies[settings.SESSION_COOKIE_NAME].value}; '
+            f'{settings.CSRF_COOKIE_NAME}={self.csrf}'
+        )
+        self.cabecalhos = [(b'host', HOST.encode()), (b'cookie', cookies.encode())]
+
+    async def requisitar(self, metodo, caminho, dados=None):
+        # ApplicationCommunicator direto: o HttpCommunicator não aceita a mensagem
+        # final sem 'body' que o Django envia ao fim das respostas em streaming
+        from asgiref.testing import ApplicationCommunicator
+
+        cabecalhos = list(self.cabecalhos)
+        corpo = b''
+        if dados is not None:
+            corpo = urlencode(dados).encode()
+            cabecalhos += [
+                (b'content-type', b'application/x-www-form-urlencoded'),
+                (b'x-csrftoken', self.csrf.encode()),
+            ]
+        partes = urlsplit(caminho)
+        comunicador = ApplicationCommunicator(self.application, {
+            'type': 'http', 'http_version': '1.1', 'method': metodo, 'scheme': 'http',
+            'path': unquote(partes.path), 'query_string': partes.query.encode(),
+            'headers': cabecalhos, 'server': (HOST, 80), 'client': ('127.0.0.1', 0),
+        })
+        await comunicador.send_input({'type': 'http.request', 'body': corpo})
+        resposta = await comunicador.receive_output(TIMEOUT)
+        resposta['body'] = b''
+        while True:
+            bloco = await comunicador.receive_output(TIMEOUT)
+            resposta['body'] += bloco.get('body', b'')
+            if not bloco.get('more_body'):
+                break
+        await comunicador.wait(TIMEOUT)
+        return resposta
+
+
+class Medidor:
+    """Latências (ms) e erros por operação, do ponto de vista do cliente."""
+
+    def __init__(self):
+        self.latencias = {}
+        self.erros = {}
+
+    def registrar(self, operacao, inicio, erro=False):
+        self.latencias.setdefault(operacao, []).append((time.perf_counter() - inicio) * 1000)
+        if erro:
+            self.erros[operacao] = self.erros.get(operacao, 0) + 1
+
+    async def http(self, cliente, operacao, metodo, caminho, dados=None):
+        inicio = time.perf_counter()
+        resposta = await cliente.requisitar(metodo, caminho, dados)
+        self.registrar(operacao, inicio, erro=resposta['status'] >= 400)
+        return resposta
+
+    def resumo(self, duracao):
+        operacoes = {}
+        for operacao, latencias in self.latencias.items():
+            ordenadas = sorted(latencias)
+            operacoes[operacao] = {
+                'total': len(ordenadas),
+                'erros': self.erros.get(operacao, 0),
+                'vazao_por_s': round(len(ordenadas) / duracao, 1),
+                'p50_ms': round(_percentil(ordenadas, 50), 1),
+                'p95_ms': round(_percentil(ordenadas, 95), 1),
+                'p99_ms': round(_percentil(ordenadas, 99), 1),
+            }
+        return operacoes
+
+
+def _rss_mb():
+    """Memória residente atual (Linux); None onde não há /proc."""
+    try:
+        with open('/proc/self/statm') as f:
+            return round(int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20, 1)
+    except (OSError, ValueError):
+        return None
+
+
+async def _acompanhar_rss(pico):
+    """
+    Guarda em pico[0] a maior RSS vista enquanto o cenário roda. O ru_maxrss
+    não serve: é o pico do processo inteiro, herdado dos cenários anteriores.
+    """
+    while True:
+        await asyncio.sleep(INTERVALO_RSS)
+        pico[0] = max(pico[0], _rss_mb())
+
+
+async def _receber(ws, tipo, **campos):
+    """Lê o WebSocket até a mensagem do tipo (e campos) esperada, descartando as demais."""
+    while True:
+        mensagem = await ws.receive_json_from(TIMEOUT)
+        if mensagem.get('type') == tipo and all(mensagem.get(k) == v for k, v in campos.items()):
+            return mensagem
+
+
+# ==============================================================================
+# 4. CENÁRIOS
+# ==============================================================================
+# preparar() semeia o banco e o bucket (síncrono, antes da carga); executar()
+# gera a carga no event loop; conferir() lê o resultado no banco depois.
+
+class CenarioGaleria:
+    """N responsáveis abrem a mesma galeria publicada: a página e cada foto pelo /medias3/."""
+    nome = 'galeria'
+    requer_redis = False
+
+    def __init__(self, pais=50, fotos=20, paralelas=6):
+        self.parametros = {'pais': pais, 'fotos': fotos, 'paralelas': paralelas}
+
+    def preparar(self, s3, application):
+        grupo = massa_dados.criar_grupos(1, prefixo='Turma Benchmark')[0]
+        fotografo = massa_dados.criar_usuario('fotografo_galeria', is_fotografo=True)
+        pais = massa_dados.criar_usuarios(self.parametros['pais'], [grupo])
+        self.galeria = massa_dados.criar_galeria(fotografo, 'Festa Junina', grupos=[grupo],
+                                                 imagens=self.parametros['fotos'])
+        # Rendições do site têm até 800px
+        foto = foto_de_teste(800, 533)
+        self.fotos = []
+        for imagem in self.galeria.imagens.all():
+            s3.put(imagem.arquivo_processado.name, foto)
+            self.fotos.append(reverse('private_media_proxy', kwargs={'path': imagem.arquivo_processado.name}))
+        self.clientes = [Cliente(application, pai) for pai in pais]
+
+    async def executar(self, medidor):
+        pagina = reverse('galerias:detalhe_galeria', kwargs={'pk': self.galeria.pk})
+        paralelas = self.parametros['paralelas']
+
+        async def visitar(cliente):
+            await medidor.http(cliente, 'pagina_galeria', 'GET', pagina)
+            # Como o navegador: algumas fotos por vez
+            for i in range(0, len(self.fotos), paralelas):
+                await asyncio.gather(*[
+                    medidor.http(cliente, 'foto_medias3', 'GET', foto) for foto in self.fotos[i:i + paralelas]
+                ])
+
+        await asyncio.gather(*[visitar(cliente) for cliente in self.clientes])
+
+    def conferir(self):
+        return {}
+
+
+class CenarioUpload:
+    """
+    Um fotógrafo envia um lote para uma galeria: assinatura, envio ao S3 (feito
+    pelo navegador, aqui gravado direto no bucket) e confirmação. Com o Celery
+    eager, a confirmação inclui o processamento da foto.
+    """
+    nome = 'upload'
+    requer_redis = False
+
+    def __init__(self, arquivos=20, janela=None):
+        self.parametros = {'arquivos': arquivos, 'janela': janela or settings.UPLOAD_CONCORRENCIA_INICIAL}
+
+    def preparar(self, s3, application):
+        fotografo = massa_dados.criar_usuario('fotografo_upload', is_fotografo=True)
+        self.galeria = massa_dados.criar_galeria(fotografo, 'Formatura', imagens=0)
+        self.cliente = Cliente(application, fotografo)
+        self.s3 = s3
+
+    async def executar(self, medidor):
+        assinar = reverse('repositorio:assinar_upload')
+        confirmar = reverse('repositorio:confirmar_upload')
+        foto = foto_de_teste(1920, 1280)
+        total = self.parametros['arquivos']
+        janela = asyncio.Semaphore(self.parametros['janela'])
+
+        async def enviar(indice):
+            async with janela:
+                resposta = await medidor.http(self.cliente, 'assinar', 'POST', assinar, {
+                    'nome_arquivo': f'IMG_{indice:04d}.jpg', 'tipo_mime': 'image/jpeg',
+                    'galeria_id': self.galeria.pk, 'upload_id': uuid.uuid4().hex,
+                })
+                if resposta['status'] != 200:
+                    return
+                dados = json.loads(resposta['body'])
+                self.s3.put(dados['campos_assinados']['key'], foto, 'image/jpeg')
+                await medidor.http(self.cliente, 'confirmar_e_processar', 'POST', confirmar, {
+                    'imagem_id': dados['imagem_id'], 'total_files': total, 'current_index': indice,
+                })
+
+        await asyncio.gather(*[enviar(i + 1) for i in range(total)])
+
+    def conferir(self):
+        from repositorio.models import Imagem
+
+        return {'processadas': Imagem.objects.filter(galeria=self.galeria, status_processamento='PROCESSADA').count()}
+
+
+class CenarioChat:
+    """M usuários conversando num Canal: cada mensagem é medida até voltar ao autor pelo grupo."""
+    nome = 'chat'
+    # Presença e contadores de não lidas ficam no Redis (mensagens/presenca.py e notificacoes.py)
+    requer_redis = True
+
+    def __init__(self, usuarios=20, mensagens=10):
+        self.parametros = {'usuarios': usuarios, 'mensagens': mensagens}
+
+    def preparar(self, s3, application):
+        from mensagens.models import Canal
+
+        grupo = massa_dados.criar_grupos(1, prefixo='Canal Benchmark')[0]
+        usuarios = massa_dados.criar_usuarios(self.parametros['usuarios'], [grupo], prefixo='participante')
+        self.canal = Canal.objects.get(grupo=grupo)
+        massa_dados.criar_mensagens(self.canal, usuarios, 200)
+        self.application = application
+        self.clientes = [Cliente(application, usuario) for usuario in usuarios]
+
+    async def executar(self, medidor):
+        from channels.testing import WebsocketCommunicator
+
+        caminho = f'/ws/chat/{self.canal.id}/'
+
+        async def entrar(cliente):
+            ws = WebsocketCommunicator(self.application, caminho, headers=cliente.cabecalhos)
+            inicio = time.perf_counter()
+            conectado, _ = await ws.connect(TIMEOUT)
+            if conectado:
+                await _receber(ws, 'presence_state')
+            medidor.registrar('conectar', inicio, erro=not conectado)
+            return ws if conectado else None
+
+        async def conversar(cliente, ws):
+            for i in range(self.parametros['mensagens']):
+                texto = f'Mensagem {i + 1} de {cliente.usuario.username}'
+                inicio = time.perf_counter()
+                await ws.send_json_to({'type': 'message', 'message': texto})
+                await _receber(ws, 'chat_message', conteudo=texto)
+                medidor.registrar('mensagem_ida_e_volta', inicio)
+
+        sockets = await asyncio.gather(*[entrar(cliente) for cliente in self.clientes])
+        conectados = [(cliente, ws) for cliente, ws in zip(self.clientes, sockets) if ws]
+        await asyncio.gather(*[conversar(cliente, ws) for cliente, ws in conectados])
+        await asyncio.gather(*[ws.disconnect() for _, ws in conectados])
+
+    def conferir(self):
+        return {'mensagens_gravadas': self.canal.mensagens.count()}
+
+
+CENARIOS = {cenario.nome: cenario for cenario in (CenarioGaleria, CenarioUpload, CenarioChat)}
+
+
+# ==============================================================================
+# 5. EXECUÇÃO
+# ==============================================================================
+
+def executar(cenarios, redis=False):
+    """
+    Roda os cenários (instâncias) em sequência no mesmo ambiente isolado.
+    Retorna o dicionário gravado como referência (JSON).
+    """
+    from config.asgi import application
+    from config.storages_conf import get_s3_client
+    from django.db import connection
+
+    resultado = {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'django': django.get_version(),
+        'redis': redis,
+        'cenarios': {},
+    }
+    with ambiente(redis=redis) as s3:
+        resultado['banco'] = connection.vendor
+        for cenario in cenarios:
+            cenario.preparar(s3, application)
+        # Carregar os modelos do botocore leva centenas de ms: fica fora da medição
+        get_s3_client()
+
+        async def carga():
+            medicoes = []
+            for cenario in cenarios:
+                instrumentacao.limpar_locais()
+                medidor = Medidor()
+                rss_inicio = _rss_mb()
+                pico = [rss_inicio]
+                acompanhamento = asyncio.create_task(_acompanhar_rss(pico)) if rss_inicio else None
+                inicio = time.perf_counter()
+                try:
+                    await cenario.executar(medidor)
+                finally:
+                    if acompanhamento:
+                        acompanhamento.cancel()
+                duracao = time.perf_counter() - inicio
+                medicoes.append((cenario, medidor, duracao, rss_inicio, _rss_mb(), pico[0],
+                                 instrumentacao.amostras_locais()))
+            return medicoes
+
+        for cenario, medidor, duracao, rss_inicio, rss_fim, rss_pico, amostras in asyncio.run(carga()):
+            resultado['cenarios'][cenario.nome] = {
+                'parametros': cenario.parametros,
+                'duracao_s': round(duracao, 2),
+                'operacoes': medidor.resumo(duracao),
+                'queries': {
+                    rota: {campo: dados[campo] for campo in ('requisicoes', 'queries_media', 'queries_p95')}
+                    for rota, dados in instrumentacao.resumir(amostras).items()
+                },
+                'rss_inicio_mb': rss_inicio,
+                'rss_fim_mb': rss_fim,
+                'rss_pico_mb': rss_pico,
+                # Comparável entre execuções: não depende do que os cenários anteriores deixaram
+                'rss_acrescimo_mb': round(rss_pico - rss_inicio, 1) if rss_inicio else None,
+                **cenario.conferir(),
+            }
+        resultado['s3_chamadas'] = s3.chamadas
+    return resultado
+
+
+# ==============================================================================
+# 6. COMPARAÇÃO COM A REFERÊNCIA
+# ==============================================================================
+# Latência e memória pioram quando sobem e a vazão quando cai, além da
+# tolerância percentual. Queries por rota não oscilam com a máquina: qualquer
+# aumento de meia query na média já conta como piora. A memória comparada é o
+# acréscimo durante o cenário, e só conta acima de FOLGA_RSS_MB (acréscimos
+# pequenos variam muito em percentual).
+
+FOLGA_QUERIES = 0.5
+FOLGA_RSS_MB = 5
+
+
+def _comparacao(metrica, antes, depois, maior_e_pior, tolerancia=None, folga=0):
+    variacao = round((depois - antes) / antes * 100, 1) if antes else None
+    if tolerancia is None:
+        piorou = depois - antes > FOLGA_QUERIES
+    elif variacao is None:
+        piorou = False
+    elif maior_e_pior:
+        piorou = variacao > tolerancia and depois - antes > folga
+    else:
+        piorou = -variacao > tolerancia
+    return {'metrica': metrica, 'antes': antes, 'depois': depois, 'variacao_pct': variacao, 'piorou': piorou}
+
+
+def comparar(atual, referencia, tolerancia=20):
+    """Linhas de comparação (métrica, antes, depois, variação, piorou) dos cenários em comum."""
+    linhas = []
+    for nome, dados in atual['cenarios'].items():
+        anterior = referencia.get('cenarios', {}).get(nome)
+        # Só compara execuções com os mesmos volumes
+        if not anterior or anterior['parametros'] != dados['parametros']:
+            continue
+
+        for operacao, estatisticas in dados['operacoes'].items():
+            antes = anterior['operacoes'].get(operacao)
+            if not antes:
+                continue
+            for metrica, maior_e_pior in (('p50_ms', True), ('p95_ms', True), ('p99_ms', True), ('vazao_por_s', False)):
+                linhas.append(_comparacao(
+                    f'{nome} {operacao} {metrica}', antes[metrica], estatisticas[metrica], maior_e_pior, tolerancia
+                ))
+
+        for rota, estatisticas in dados['queries'].items():
+            antes = anterior['queries'].get(rota)
+            if antes:
+                linhas.append(_comparacao(
+                    f'{nome} {rota} queries', antes['queries_media'], estatisticas['queries_media'], True
+                ))
+
+        if anterior.get('rss_acrescimo_mb') is not None and dados.get('rss_acrescimo_mb') is not None:
+            linhas.append(_comparacao(
+                f'{nome} rss_acrescimo_mb', anterior['rss_acrescimo_mb'], dados['rss_acrescimo_mb'], True,
+                tolerancia, FOLGA_RSS_MB,
+            ))
+    return linhas
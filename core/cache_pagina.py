@@ -0,0 +1,156 @@
+import hashlib
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+
+# ==============================================================================
+# CACHE DE PÁGINA INTEIRA PARA VISITANTES ANÔNIMOS
+# ==============================================================================
+# As páginas públicas (home, livros digitais, galerias públicas...) geram o
+# mesmo HTML para todo visitante sem login. O decorator cache_anonimo guarda a
+# resposta por caminho + parâmetros da query string que a view usa (declarados
+# em `parametros`) e a serve sem executar a view. Query strings com outros
+# parâmetros não passam pelo cache, e cada view guarda no máximo
+# PAGINA_CACHE_VARIANTES páginas por versão: visitantes não conseguem encher o
+# Redis variando a URL. Cada página declara as tags dos dados que exibe; a
+# chave inclui a versão de cada tag, então salvar um modelo da tag
+# (purgar_ao_salvar) descarta só as páginas que dependem dele.
+#
+# As respostas anônimas levam ETag, Cache-Control público e Vary: Cookie, para
+# que o proxy da frente também possa guardá-las sem servir a página anônima a
+# quem está logado.
+
+PREFIXO = 'pagina'
+
+
+def _chave_tag(tag):
+    return f'{PREFIXO}:tag:{tag}'
+
+
+def _versoes(tags):
+    chaves = [_chave_tag(tag) for tag in tags]
+    versoes = cache.get_many(chaves)
+    for chave in chaves:
+        if chave not in versoes:
+            cache.add(chave, 1, timeout=None)
+            versoes[chave] = cache.get(chave, 1)
+    return '.'.join(str(versoes[chave]) for chave in chaves)
+
+
+def purgar(*tags):
+    """Descarta as páginas cacheadas que dependem das tags."""
+    for tag in tags:
+        try:
+            cache.incr(_chave_tag(tag))
+        except ValueError:
+            cache.set(_chave_tag(tag), 1, timeout=None)
+
+
+def purgar_ao_salvar(model, *tags):
+    """Liga o post_save/post_delete do modelo à purga das tags."""
+    def receiver(sender, **kwargs):
+        purgar(*tags)
+
+    uid = f'{PREFIXO}:{model._meta.label_lower}:{",".join(tags)}'
+    post_save.connect(receiver, sender=model, weak=False, dispatch_uid=f'{uid}:save')
+    post_delete.connect(receiver, sender=model, weak=False, dispatch_uid=f'{uid}:delete')
+
+
+def _cacheavel(request):
+    if request.method != 'GET' or request.user.is_authenticated:
+        return False
+    # Mensagens pendentes (ex: "Você saiu") são exibidas uma única vez
+    return not len(get_messages(request))
+
+
+def _url_normalizada(request, parametros):
+    """
+    Caminho + parâmetros usados pela view, em ordem fixa e sem os vazios.
+    None se a query string tiver outros parâmetros (ou algum repetido).
+    """
+    if not set(request.GET).issubset(parametros):
+        return None
+    valores = []
+    for nome in sorted(parametros):
+        lista = request.GET.getlist(nome)
+        if len(lista) > 1:
+            return None
+        if lista and lista[0]:
+            valores.append((nome, lista[0]))
+    return f'{request.build_absolute_uri(request.path)}?{urlencode(valores)}'
+
+
+def _reservar_variante(base, timeout):
+    """Conta uma página nova da view nesta versão; False acima do limite."""
+    chave = f'{base}:variantes'
+    cache.add(chave, 0, timeout=timeout)
+    try:
+        return cache.incr(chave) <= settings.PAGINA_CACHE_VARIANTES
+    except ValueError:
+        return False
+
+
+def _etag(conteudo):
+    return '"%s"' % hashlib.md5(conteudo, usedforsecurity=False).hexdigest()
+
+
+def _cabecalhos_publicos(response, etag):
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=settings.PAGINA_CACHE_MAX_AGE)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def _responder(request, conteudo, content_type, etag):
+    if etag in request.headers.get('If-None-Match', ''):
+        return _cabecalhos_publicos(HttpResponseNotModified(), etag)
+    return _cabecalhos_publicos(HttpResponse(conteudo, content_type=content_type), etag)
+
+
+def cache_anonimo(*tags, parametros=(), timeout=None):
+    """
+    Cacheia a página para GETs anônimos. `tags` nomeiam os dados exibidos
+    (ver purgar_ao_salvar); páginas estáticas podem não declarar nenhuma.
+    `parametros` são os nomes da query string que a view lê (ex: 'page').
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            url = _url_normalizada(request, parametros) if _cacheavel(request) else None
+            if url is None:
+                return view(request, *args, **kwargs)
+
+            base = f'{PREFIXO}:{view.__module__}.{view.__qualname__}:{_versoes(tags)}'
+            chave = f'{base}:{hashlib.md5(url.encode(), usedforsecurity=False).hexdigest()}'
+
+            guardada = cache.get(chave)
+            if guardada is not None:
+                return _responder(request, *guardada)
+
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render') and callable(response.render):
+                response = response.render()
+
+            # Só guarda a página que não depende do visitante: nada de cookies
+            # novos nem token CSRF gerado durante a renderização.
+            if (response.status_code != 200 or response.streaming or response.cookies
+                    or request.META.get('CSRF_COOKIE_NEEDS_UPDATE')):
+                return response
+            validade = settings.PAGINA_CACHE_TIMEOUT if timeout is None else timeout
+            if not _reservar_variante(base, validade):
+                return response
+
+            conteudo = response.content
+            guardada = (conteudo, response['Content-Type'], _etag(conteudo))
+            cache.set(chave, guardada, validade)
+            return _responder(request, *guardada)
+
+        return wrapper
+    return decorator
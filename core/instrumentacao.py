@@ -0,0 +1,288 @@
+import contextvars
+import json
+import logging
+import os
+import re
+import socket
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache.backends.redis import RedisCache
+
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# INSTRUMENTAÇÃO DAS REQUISIÇÕES (custo por rota)
+# ==============================================================================
+# Cada requisição HTTP (InstrumentacaoMiddleware) e cada conexão WebSocket
+# (InstrumentacaoASGI) ganha uma Medicao num contextvar. Os contadores são
+# alimentados por ganchos globais, que só agem quando há uma medição ativa:
+#   - banco: execute_wrapper instalado em cada conexão (connection_created, core/apps.py)
+#   - cache: backend RedisCacheInstrumentado (settings.CACHES)
+#   - S3: eventos do botocore no cliente de config/storages_conf.py
+#
+# As medições vão para um buffer circular do processo. De tempos em tempos o
+# buffer é publicado no Redis (um campo por processo), e o endpoint de staff e o
+# comando `manage.py desempenho` juntam os processos e calculam os percentis.
+
+CHAVE_PROCESSOS = 'desempenho:processos'
+MAX_SQL_POR_MEDICAO = 50
+
+_atual = contextvars.ContextVar('medicao_atual', default=None)
+_buffer = deque(maxlen=settings.INSTRUMENTACAO_BUFFER)
+_trava = threading.Lock()
+_ultima_publicacao = 0.0
+_identificador = f'{socket.gethostname()}:{os.getpid()}'
+
+
+@dataclass
+class Medicao:
+    rota: str
+    inicio: float = field(default_factory=time.perf_counter)
+    queries: int = 0
+    tempo_db: float = 0.0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    s3_chamadas: int = 0
+    s3_bytes: int = 0
+    sqls: list = field(default_factory=list)
+
+    def amostra(self, duracao):
+        """Linha compacta guardada no buffer (duração e tempo de banco em ms)."""
+        return (
+            self.rota, round(duracao * 1000, 1), self.queries, round(self.tempo_db * 1000, 1),
+            self.cache_hits, self.cache_misses, self.s3_chamadas, self.s3_bytes,
+        )
+
+
+# ------------------------------------------------------------------------------
+# GANCHOS (banco, cache, S3)
+# ------------------------------------------------------------------------------
+
+def _wrapper_banco(execute, sql, params, many, context):
+    medicao = _atual.get()
+    if medicao is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duracao = time.perf_counter() - inicio
+        medicao.queries += 1
+        medicao.tempo_db += duracao
+        if len(medicao.sqls) < MAX_SQL_POR_MEDICAO:
+            medicao.sqls.append((round(duracao * 1000, 1), sql))
+
+
+def instalar_na_conexao(sender, connection, **kwargs):
+    """Receiver do connection_created: mede todas as queries da conexão."""
+    if _wrapper_banco not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_wrapper_banco)
+
+
+def contar_cache(hits, misses):
+    medicao = _atual.get()
+    if medicao is not None:
+        medicao.cache_hits += hits
+        medicao.cache_misses += misses
+
+
+def _evento_s3(http_response=None, parsed=None, **kwargs):
+    medicao = _atual.get()
+    if medicao is None:
+        return
+    medicao.s3_chamadas += 1
+    if isinstance(parsed, dict):
+        medicao.s3_bytes += parsed.get('ContentLength') or 0
+
+
+def instrumentar_cliente_s3(client):
+    client.meta.events.register('after-call.s3', _evento_s3)
+    return client
+
+
+class RedisCacheInstrumentado(RedisCache):
+    """RedisCache que conta acertos e faltas na medição corrente."""
+
+    def get(self, key, default=None, version=None):
+        sentinela = object()
+        valor = super().get(key, sentinela, version)
+        if valor is sentinela:
+            contar_cache(0, 1)
+            return default
+        contar_cache(1, 0)
+        return valor
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        valores = super().get_many(keys, version)
+        contar_cache(len(valores), len(keys) - len(valores))
+        return valores
+
+
+# ------------------------------------------------------------------------------
+# BUFFER, PUBLICAÇÃO E RESUMO
+# ------------------------------------------------------------------------------
+
+def _registrar(medicao, duracao, avisar_lenta=True):
+    with _trava:
+        _buffer.append(medicao.amostra(duracao))
+
+    if avisar_lenta and duracao * 1000 >= settings.INSTRUMENTACAO_LENTO_MS:
+        consultas = '\n'.join(f'  {ms:>8} ms  {sql}' for ms, sql in medicao.sqls)
+        logger.warning(
+            f"Requisição lenta: {medicao.rota} em {duracao * 1000:.0f} ms, "
+            f"{medicao.queries} queries ({medicao.tempo_db * 1000:.0f} ms no banco)\n{consultas}"
+        )
+
+
+def _precisa_publicar():
+    return time.monotonic() - _ultima_publicacao >= settings.INSTRUMENTACAO_PUBLICAR_INTERVALO
+
+
+def publicar():
+    """Grava o buffer do processo no Redis (HASH desempenho:processos)."""
+    global _ultima_publicacao
+    from config.redis_conf import get_redis
+
+    _ultima_publicacao = time.monotonic()
+    with _trava:
+        amostras = list(_buffer)
+    try:
+        get_redis().hset(CHAVE_PROCESSOS, _identificador, json.dumps({'em': time.time(), 'amostras': amostras}))
+    except Exception as e:
+        logger.warning(f"Não foi possível publicar as medições de desempenho: {e}")
+
+
+def amostras_locais():
+    with _trava:
+        return list(_buffer)
+
+
+def limpar_locais():
+    """Esvazia o buffer do processo (`manage.py benchmark` mede cada cenário separado)."""
+    with _trava:
+        _buffer.clear()
+
+
+def amostras_de_todos(max_idade=3600):
+    """Junta as amostras publicadas pelos processos (descarta os que pararam de publicar)."""
+    from config.redis_conf import get_redis
+
+    amostras = []
+    limite = time.time() - max_idade
+    for ident, dados in get_redis().hgetall(CHAVE_PROCESSOS).items():
+        dados = json.loads(dados)
+        if dados['em'] < limite:
+            get_redis().hdel(CHAVE_PROCESSOS, ident)
+            continue
+        amostras.extend(dados['amostras'])
+    return amostras
+
+
+def _percentil(ordenados, p):
+    if not ordenados:
+        return 0
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def resumir(amostras):
+    """{rota: estatísticas} com p50/p95/p99 da duração e médias dos contadores."""
+    por_rota = {}
+    for rota, *valores in amostras:
+        por_rota.setdefault(rota, []).append(valores)
+
+    resumo = {}
+    for rota, linhas in sorted(por_rota.items()):
+        duracoes = sorted(linha[0] for linha in linhas)
+        queries = sorted(linha[1] for linha in linhas)
+        n = len(linhas)
+        resumo[rota] = {
+            'requisicoes': n,
+            'p50_ms': _percentil(duracoes, 50),
+            'p95_ms': _percentil(duracoes, 95),
+            'p99_ms': _percentil(duracoes, 99),
+            'queries_media': round(sum(queries) / n, 1),
+            'queries_p95': _percentil(queries, 95),
+            'db_ms_media': round(sum(linha[2] for linha in linhas) / n, 1),
+            'cache_hits': sum(linha[3] for linha in linhas),
+            'cache_misses': sum(linha[4] for linha in linhas),
+            's3_chamadas': sum(linha[5] for linha in linhas),
+            's3_bytes': sum(linha[6] for linha in linhas),
+        }
+    return resumo
+
+
+# ------------------------------------------------------------------------------
+# MIDDLEWARE HTTP E WRAPPER ASGI (WebSocket)
+# ------------------------------------------------------------------------------
+
+def _rota_http(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is not None and match.view_name:
+        return match.view_name
+    return 'sem_rota'
+
+
+class InstrumentacaoMiddleware:
+    """Mede cada requisição HTTP (deve ser o primeiro middleware da lista)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        medicao = Medicao(rota='')
+        token = _atual.set(medicao)
+        try:
+            response = self.get_response(request)
+        finally:
+            _atual.reset(token)
+        self._finalizar(request, medicao)
+        if _precisa_publicar():
+            publicar()
+        return response
+
+    async def __acall__(self, request):
+        medicao = Medicao(rota='')
+        token = _atual.set(medicao)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _atual.reset(token)
+        self._finalizar(request, medicao)
+        if _precisa_publicar():
+            await sync_to_async(publicar, thread_sensitive=False)()
+        return response
+
+    def _finalizar(self, request, medicao):
+        medicao.rota = f'{request.method} {_rota_http(request)}'
+        _registrar(medicao, time.perf_counter() - medicao.inicio)
+
+
+class InstrumentacaoASGI:
+    """Mede cada conexão WebSocket, do handshake ao fechamento, por rota."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        caminho = re.sub(r'/\d+', '/<id>', scope.get('path', ''))
+        medicao = Medicao(rota=f'ws {caminho}')
+        token = _atual.set(medicao)
+        try:
+            return await self.app(scope, receive, send)
+        finally:
+            _atual.reset(token)
+            # Conexões são longas por natureza: não entram no log de lentidão
+            _registrar(medicao, time.perf_counter() - medicao.inicio, avisar_lenta=False)
@@ -0,0 +1,99 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from config.redis_conf import redis_disponivel
+from core import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark de carga offline (ASGI em processo, banco de teste, S3 local, Celery eager). "
+        "Grava o resultado como referência e compara com uma referência anterior."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cenarios', nargs='+', choices=list(benchmark.CENARIOS), default=list(benchmark.CENARIOS),
+                            help="Cenários a executar (padrão: todos).")
+        parser.add_argument('--pais', type=int, default=50, help="Galeria: responsáveis simultâneos.")
+        parser.add_argument('--fotos', type=int, default=20, help="Galeria: fotos abertas por responsável.")
+        parser.add_argument('--arquivos', type=int, default=20, help="Upload: arquivos no lote do fotógrafo.")
+        parser.add_argument('--janela', type=int, help="Upload: envios simultâneos (padrão: UPLOAD_CONCORRENCIA_INICIAL).")
+        parser.add_argument('--usuarios', type=int, default=20, help="Chat: usuários conectados ao Canal.")
+        parser.add_argument('--mensagens', type=int, default=10, help="Chat: mensagens enviadas por usuário.")
+        parser.add_argument('--redis', action='store_true',
+                            help="Usa o Redis configurado no channel layer e no cache (padrão: em memória).")
+        parser.add_argument('--salvar', metavar='ARQUIVO', help="Grava o resultado em JSON (nova referência).")
+        parser.add_argument('--comparar', metavar='ARQUIVO', help="Compara com uma referência gravada antes.")
+        parser.add_argument('--tolerancia', type=float, default=20,
+                            help="Piora percentual aceita em latência, vazão e memória (padrão: 20).")
+
+    def handle(self, *args, **options):
+        parametros = {
+            'galeria': {'pais': options['pais'], 'fotos': options['fotos']},
+            'upload': {'arquivos': options['arquivos'], 'janela': options['janela']},
+            'chat': {'usuarios': options['usuarios'], 'mensagens': options['mensagens']},
+        }
+        referencia = None
+        if options['comparar']:
+            try:
+                with open(options['comparar'], encoding='utf-8') as f:
+                    referencia = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Referência inválida ({options['comparar']}): {e}")
+
+        cenarios = []
+        for nome in options['cenarios']:
+            classe = benchmark.CENARIOS[nome]
+            # Presença e contadores do chat usam o Redis direto, mesmo com o layer em memória
+            if classe.requer_redis and not redis_disponivel():
+                self.stderr.write(self.style.WARNING(f"Cenário '{nome}' ignorado: Redis indisponível."))
+                continue
+            cenarios.append(classe(**parametros[nome]))
+        if not cenarios:
+            raise CommandError("Nenhum cenário para executar.")
+
+        resultado = benchmark.executar(cenarios, redis=options['redis'])
+        self._mostrar(resultado)
+
+        if options['salvar']:
+            with open(options['salvar'], 'w', encoding='utf-8') as f:
+                json.dump(resultado, f, indent=2, ensure_ascii=False)
+            self.stdout.write(f"\nReferência gravada em {options['salvar']}.")
+
+        if referencia is not None:
+            linhas = benchmark.comparar(resultado, referencia, options['tolerancia'])
+            self._mostrar_comparacao(linhas)
+            piores = [linha['metrica'] for linha in linhas if linha['piorou']]
+            if piores:
+                raise CommandError(f"{len(piores)} métrica(s) piores que a referência: {', '.join(piores)}")
+
+    def _mostrar(self, resultado):
+        self.stdout.write(f"Banco: {resultado['banco']}  Python {resultado['python']}  Django {resultado['django']}")
+        colunas = ('total', 'erros', 'vazao_por_s', 'p50_ms', 'p95_ms', 'p99_ms')
+        for nome, dados in resultado['cenarios'].items():
+            extras = {k: v for k, v in dados.items()
+                      if k not in ('parametros', 'operacoes', 'queries', 'duracao_s')}
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"\n{nome} {dados['parametros']}  ({dados['duracao_s']} s)"
+            ))
+            self.stdout.write(f"{'operação':<24}  " + '  '.join(f'{c:>11}' for c in colunas))
+            for operacao, estatisticas in dados['operacoes'].items():
+                self.stdout.write(f"{operacao:<24}  " + '  '.join(f'{estatisticas[c]:>11}' for c in colunas))
+            for rota, estatisticas in dados['queries'].items():
+                self.stdout.write(
+                    f"  queries {rota}: média {estatisticas['queries_media']}, p95 {estatisticas['queries_p95']} "
+                    f"({estatisticas['requisicoes']} medições)"
+                )
+            self.stdout.write('  ' + ', '.join(f'{k}: {v}' for k, v in extras.items()))
+
+    def _mostrar_comparacao(self, linhas):
+        if not linhas:
+            self.stdout.write("\nNenhum cenário em comum com a referência (mesmos parâmetros).")
+            return
+        largura = max(len(linha['metrica']) for linha in linhas)
+        self.stdout.write(self.style.MIGRATE_HEADING("\nComparação com a referência"))
+        for linha in linhas:
+            variacao = '-' if linha['variacao_pct'] is None else f"{linha['variacao_pct']:+}%"
+            texto = f"{linha['metrica']:<{largura}}  {linha['antes']:>10}  {linha['depois']:>10}  {variacao:>9}"
+            self.stdout.write(self.style.ERROR(texto) if linha['piorou'] else texto)
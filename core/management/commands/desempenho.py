@@ -0,0 +1,38 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core import instrumentacao
+
+
+class Command(BaseCommand):
+    help = "Mostra o custo por rota (percentis, queries, cache, S3) publicado pelos processos web."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rota', help="Filtra as rotas que contêm o texto informado.")
+        parser.add_argument('--ordenar', default='p95_ms', help="Coluna de ordenação (padrão: p95_ms).")
+        parser.add_argument('--max-idade', type=int, default=3600,
+                            help="Ignora processos sem publicação há mais de N segundos.")
+        parser.add_argument('--json', action='store_true', help="Saída em JSON.")
+
+    def handle(self, *args, **options):
+        resumo = instrumentacao.resumir(instrumentacao.amostras_de_todos(options['max_idade']))
+        if options['rota']:
+            resumo = {rota: dados for rota, dados in resumo.items() if options['rota'] in rota}
+
+        if options['json']:
+            self.stdout.write(json.dumps(resumo, indent=2, ensure_ascii=False))
+            return
+
+        if not resumo:
+            self.stdout.write("Nenhuma medição publicada.")
+            return
+
+        colunas = ('requisicoes', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_media', 'queries_p95',
+                   'db_ms_media', 'cache_hits', 'cache_misses', 's3_chamadas', 's3_bytes')
+        linhas = sorted(resumo.items(), key=lambda item: item[1].get(options['ordenar'], 0), reverse=True)
+        largura = max(len(rota) for rota in resumo)
+
+        self.stdout.write(f"{'rota':<{largura}}  " + '  '.join(f'{c:>13}' for c in colunas))
+        for rota, dados in linhas:
+            self.stdout.write(f"{rota:<{largura}}  " + '  '.join(f'{dados[c]:>13}' for c in colunas))
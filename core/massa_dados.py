@@ -0,0 +1,161 @@
+import datetime
+from functools import cache
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group as AuthGroup
+from django.utils import timezone
+
+
+# ==============================================================================
+# MASSA DE DADOS (testes de orçamento de queries e benchmark)
+# ==============================================================================
+# Cria volumes parecidos com os de produção: galerias com centenas de fotos,
+# usuários em vários grupos, canais movimentados e tópicos de suporte com
+# respostas. As linhas em volume saem em bulk_create (sem signals por linha);
+# usuários e grupos passam pelo save() para que o Profile, o grupo 'free' e o
+# Canal de cada grupo sejam criados como no site.
+#
+# Usado pelos tests.py de cada app e por `manage.py benchmark`.
+
+SENHA = 'senha-de-teste'
+
+
+@cache
+def _senha_hash():
+    # O hash de senha é o passo mais caro ao criar centenas de usuários: calculado uma vez
+    return make_password(SENHA)
+
+
+def criar_grupos(quantidade, prefixo='Turma'):
+    """Grupos de Audiência (cada um ganha o seu Canal pelo signal)."""
+    from users.models import Grupo, TipoGrupo
+
+    grupos = []
+    for i in range(quantidade):
+        auth_group = AuthGroup.objects.create(name=f'{prefixo} {i + 1}')
+        grupos.append(Grupo.objects.create(auth_group=auth_group, tipo=TipoGrupo.TURMA))
+    return grupos
+
+
+def criar_usuario(username, grupos=(), **campos):
+    from users.models import CustomUser
+
+    usuario = CustomUser.objects.create_user(username=username, **campos)
+    usuario.password = _senha_hash()
+    usuario.save(update_fields=['password'])
+    if grupos:
+        usuario.groups.add(*[grupo.auth_group for grupo in grupos])
+    return usuario
+
+
+def criar_usuarios(quantidade, grupos=(), prefixo='responsavel'):
+    """Usuários comuns em todos os `grupos` (vínculos inseridos em massa)."""
+    from users.grupos import adicionar_ao_grupo
+    from users.models import CustomUser
+
+    usuarios = [criar_usuario(f'{prefixo}{i + 1}') for i in range(quantidade)]
+    qs = CustomUser.objects.filter(pk__in=[usuario.pk for usuario in usuarios])
+    for grupo in grupos:
+        adicionar_ao_grupo(qs, grupo.auth_group)
+    return usuarios
+
+
+def criar_turma(nome, alunos=30, grupo=None, ano_letivo=2025):
+    """
+    Turma com regente, um professor adicional e `alunos` alunos, cada um com
+    usuário e um responsável. Com `grupo`, alunos e responsáveis são matriculados nele.
+    """
+    from users.grupos import matricular_registros
+    from users.models import (
+        CustomUserTipo, RegistroAluno, RegistroProfessor, RegistroResponsavel, TipoProfessor, Turma
+    )
+
+    regente = RegistroProfessor.objects.create(nome_completo=f'Regente {nome}', tipo_professor=TipoProfessor.REGENTE)
+    turma = Turma.objects.create(nome=nome, ano_letivo=ano_letivo, professor_regente=regente)
+    RegistroProfessor.objects.create(nome_completo=f'Professor de Artes {nome}').turmas.add(turma)
+
+    registros = RegistroAluno.objects.bulk_create([
+        RegistroAluno(nome_completo=f'Aluno {i + 1} {nome}', ra_numero=f'{turma.pk}{i:04d}',
+                      ra_digito_verificador='0', turma=turma)
+        for i in range(alunos)
+    ])
+    responsaveis = RegistroResponsavel.objects.bulk_create([
+        RegistroResponsavel(nome_completo=f'Responsável de {registro.nome_completo}') for registro in registros
+    ])
+    RegistroResponsavel.alunos.through.objects.bulk_create([
+        RegistroResponsavel.alunos.through(registroresponsavel=responsavel, registroaluno=registro)
+        for registro, responsavel in zip(registros, responsaveis)
+    ])
+    for registro in registros:
+        criar_usuario(f'aluno{registro.pk}', registro_aluno=registro, tipo_usuario=CustomUserTipo.ALUNO)
+
+    if grupo is not None:
+        matricular_registros(grupo, registros + responsaveis)
+    return turma
+
+
+def criar_galeria(fotografo, nome, grupos=(), imagens=300, publica=False, curtidas_por=()):
+    """
+    Galeria publicada com `imagens` fotos já processadas. Cada usuário de
+    `curtidas_por` curte uma a cada três fotos.
+    """
+    from repositorio.models import Curtida, Galeria, Imagem
+
+    galeria = Galeria.objects.create(
+        nome=nome, fotografo=fotografo, acesso_publico=publica,
+        data_do_evento=datetime.date(2025, 1, 1), status='PB', publicada_em=timezone.now(),
+    )
+    if grupos:
+        galeria.grupos_acesso.add(*grupos)
+
+    fotos = Imagem.objects.bulk_create([
+        Imagem(
+            fotografo=fotografo, galeria=galeria, status_processamento='PROCESSADA',
+            nome_arquivo_original=f'foto_{i}.jpg',
+            arquivo_original=f'repo/originais/{galeria.slug}/foto_{i}.jpg',
+            arquivo_processado=f'repo/processadas/{galeria.slug}/foto_{i}.webp',
+            thumbnail=f'repo/thumbs/{galeria.slug}/foto_{i}.webp',
+            largura=1600, altura=1067,
+        )
+        for i in range(imagens)
+    ])
+    if fotos:
+        galeria.capa = fotos[0]
+        galeria.save(update_fields=['capa'])
+
+    Curtida.objects.bulk_create([
+        Curtida(usuario=usuario, imagem=foto)
+        for usuario in curtidas_por
+        for foto in fotos[::3]
+    ])
+    return galeria
+
+
+def criar_mensagens(canal, autores, quantidade):
+    """Histórico do canal, com os autores se revezando; cada autor já leu o canal uma vez."""
+    from mensagens.models import Mensagem, UltimaLeituraUsuario
+
+    UltimaLeituraUsuario.objects.bulk_create(
+        [UltimaLeituraUsuario(usuario=autor, canal=canal) for autor in autores], ignore_conflicts=True,
+    )
+    return Mensagem.objects.bulk_create([
+        Mensagem(canal=canal, autor=autores[i % len(autores)], conteudo=f'Mensagem {i + 1} do canal {canal.nome}')
+        for i in range(quantidade)
+    ])
+
+
+def criar_topicos(criador, quantidade, suporte, respostas=4):
+    """Tópicos de suporte em atendimento, alternando as respostas entre o criador e o suporte."""
+    from suporte.models import MensagemSuporte, Topico, TopicoStatus
+
+    topicos = Topico.objects.bulk_create([
+        Topico(assunto=f'Dúvida {i + 1}', criador=criador, admin_responsavel=suporte,
+               status=TopicoStatus.EM_ATENDIMENTO)
+        for i in range(quantidade)
+    ])
+    MensagemSuporte.objects.bulk_create([
+        MensagemSuporte(topico=topico, autor=(criador, suporte)[j % 2], conteudo=f'Resposta {j + 1}')
+        for topico in topicos
+        for j in range(respostas)
+    ])
+    return topicos
@@ -0,0 +1,198 @@
+import glob
+import logging
+import os
+import re
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connections
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# MÉTRICAS PROMETHEUS (web, WebSocket e Celery)
+# ==============================================================================
+# Complementa core/instrumentacao.py (custo por rota) com séries contínuas para
+# um coletor local. Os valores ficam em arquivos por PID na pasta
+# PROMETHEUS_MULTIPROC_DIR (definida em settings antes de qualquer importação
+# do prometheus_client), e a exposição soma os arquivos de todos os processos.
+#
+# Ganchos:
+#   - proxy de mídia: galerias/views.py (latência) e galerias/midia.py (bytes)
+#   - processamento: _Checkpoint.executar e enviar_progresso_websocket (repositorio/tasks.py)
+#   - fila do Celery: sinais ligados em config/celery.py
+#   - WebSockets: connect/disconnect dos consumers
+#   - sessão: RenovacaoSessaoMiddleware (core/middleware.py)
+#   - banco: connection_created (core/apps.py) e ColetorBanco, lido na hora da coleta
+
+PROXY_LATENCIA = Histogram(
+    'ranieri_proxy_midia_segundos',
+    'Tempo até a resposta do proxy de mídia (/medias3/), por modo.',
+    ['modo'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+PROXY_BYTES = Counter(
+    'ranieri_proxy_midia_bytes',
+    'Bytes transmitidos pelo proxy de mídia no modo stream.',
+)
+ETAPA_DURACAO = Histogram(
+    'ranieri_processamento_etapa_segundos',
+    'Duração de cada etapa do processar_imagem_task.',
+    ['etapa'],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+FILA_ESPERA = Histogram(
+    'ranieri_celery_espera_fila_segundos',
+    'Tempo entre a publicação da task e o início da execução.',
+    ['task'],
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 1800, 3600),
+)
+WEBSOCKET_CONEXOES = Gauge(
+    'ranieri_websocket_conexoes',
+    'Conexões WebSocket abertas, por consumer.',
+    ['consumer'],
+    multiprocess_mode='livesum',
+)
+GROUP_SEND = Counter(
+    'ranieri_group_send',
+    'Mensagens enviadas a grupos do Channels, por origem.',
+    ['origem'],
+)
+SESSAO_GRAVACOES = Counter(
+    'ranieri_sessao_gravacoes',
+    'Sessões gravadas no fim da requisição (renovação do prazo ou alteração).',
+    ['motivo'],
+)
+DB_CONEXOES_ABERTAS = Counter(
+    'ranieri_db_conexoes_abertas',
+    'Conexões abertas com o banco (churn: com CONN_MAX_AGE=0 é uma por requisição).',
+    ['alias'],
+)
+
+
+# ------------------------------------------------------------------------------
+# GANCHOS
+# ------------------------------------------------------------------------------
+
+def websocket_aberto(consumer):
+    consumer._metrica_conexao = True
+    WEBSOCKET_CONEXOES.labels(type(consumer).__name__).inc()
+
+
+def websocket_fechado(consumer):
+    # Conexões recusadas no connect também passam pelo disconnect
+    if getattr(consumer, '_metrica_conexao', False):
+        consumer._metrica_conexao = False
+        WEBSOCKET_CONEXOES.labels(type(consumer).__name__).dec()
+
+
+def conexao_criada(sender, connection, **kwargs):
+    """Receiver do connection_created."""
+    DB_CONEXOES_ABERTAS.labels(connection.alias).inc()
+
+
+class ColetorBanco:
+    """
+    Uso das conexões do Postgres, lido do pg_stat_activity a cada coleta.
+    Cobre todos os processos (web, Celery, beat) que usam o banco.
+    """
+
+    def collect(self):
+        por_estado = GaugeMetricFamily(
+            'ranieri_db_conexoes', 'Conexões no servidor do banco, por estado.', labels=['alias', 'estado'],
+        )
+        maximo = GaugeMetricFamily('ranieri_db_conexoes_max', 'max_connections do servidor.', labels=['alias'])
+
+        for conexao in connections.all(initialized_only=False):
+            if conexao.vendor != 'postgresql':
+                continue
+            try:
+                with conexao.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT coalesce(state, 'desconhecido'), count(*) FROM pg_stat_activity "
+                        "WHERE datname = current_database() GROUP BY 1"
+                    )
+                    for estado, total in cursor.fetchall():
+                        por_estado.add_metric([conexao.alias, estado], total)
+                    cursor.execute('SHOW max_connections')
+                    maximo.add_metric([conexao.alias], int(cursor.fetchone()[0]))
+            except Exception as e:
+                logger.warning(f"Não foi possível ler o pg_stat_activity ({conexao.alias}): {e}")
+
+        yield por_estado
+        yield maximo
+
+
+# ------------------------------------------------------------------------------
+# CELERY (sinais ligados em config/celery.py)
+# ------------------------------------------------------------------------------
+
+def marcar_publicacao(headers=None, **kwargs):
+    """before_task_publish: carimba a hora de envio no cabeçalho da mensagem."""
+    if headers is not None:
+        headers['enviado_em'] = time.time()
+
+
+def medir_espera(task=None, **kwargs):
+    """task_prerun: observa a espera na fila (descontando o ETA/countdown)."""
+    enviado_em = getattr(task.request, 'enviado_em', None)
+    if enviado_em is None:
+        return
+    eta = task.request.eta
+    if eta:
+        enviado_em = max(enviado_em, datetime.fromisoformat(eta).timestamp())
+    FILA_ESPERA.labels(task.name).observe(max(0.0, time.time() - enviado_em))
+
+
+def processo_encerrado(pid=None, **kwargs):
+    """worker_process_shutdown: descarta as gauges do processo filho."""
+    multiprocess.mark_process_dead(pid or os.getpid())
+
+
+def iniciar_exportador_celery(**kwargs):
+    """worker_init: servidor HTTP das métricas no processo principal do worker."""
+    from prometheus_client import start_http_server
+
+    if not settings.METRICAS_CELERY_PORTA:
+        return
+    try:
+        start_http_server(settings.METRICAS_CELERY_PORTA, addr='127.0.0.1', registry=registro())
+    except OSError as e:
+        # Outro worker da máquina já expõe a mesma pasta
+        logger.warning(f"Exportador de métricas não iniciado na porta {settings.METRICAS_CELERY_PORTA}: {e}")
+
+
+# ------------------------------------------------------------------------------
+# EXPOSIÇÃO
+# ------------------------------------------------------------------------------
+
+_ARQUIVO_GAUGE = re.compile(r'gauge_live\w+_(\d+)\.db$')
+
+
+def _descartar_processos_mortos():
+    """Remove as gauges de PIDs que morreram sem passar pelo mark_process_dead."""
+    for caminho in glob.glob(os.path.join(settings.METRICAS_DIR, 'gauge_live*.db')):
+        encontrado = _ARQUIVO_GAUGE.search(caminho)
+        if not encontrado:
+            continue
+        pid = int(encontrado.group(1))
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            multiprocess.mark_process_dead(pid)
+        except PermissionError:
+            pass
+
+
+def registro(banco=False):
+    """Registry que soma os arquivos de todos os processos (e o banco, se pedido)."""
+    _descartar_processos_mortos()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    if banco:
+        registry.register(ColetorBanco())
+    return registry
@@ -0,0 +1,61 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import metricas
+
+
+# ==============================================================================
+# RENOVAÇÃO DA SESSÃO (expiração deslizante com gravação espaçada)
+# ==============================================================================
+# Com SESSION_SAVE_EVERY_REQUEST toda requisição gravava a sessão (inclusive
+# cada imagem do /medias3/ e cada curtida). Aqui a expiração continua
+# deslizante, mas a sessão só é gravada quando a última renovação tem mais de
+# SESSAO_RENOVACAO_INTERVALO segundos: o SessionMiddleware grava a sessão
+# modificada e reenvia o cookie com o novo prazo.
+#
+# Precisa vir depois do SessionMiddleware na lista (roda antes dele na resposta).
+# Os WebSockets (AuthMiddlewareStack) não passam por aqui e nunca gravam a sessão.
+# Cada gravação (renovação ou alteração) é contada em core/metricas.py.
+
+CHAVE_RENOVACAO = '_renovada_em'
+
+
+class RenovacaoSessaoMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self._renovar(request)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        self._renovar(request)
+        return response
+
+    def _renovar(self, request):
+        session = getattr(request, 'session', None)
+        # Só olha sessões já carregadas pela requisição: nenhuma leitura extra.
+        # Sessão vazia é apagada pelo SessionMiddleware, não gravada.
+        if session is None or not session.accessed or session.is_empty():
+            return
+        if session.modified:
+            metricas.SESSAO_GRAVACOES.labels('alteracao').inc()
+            return
+        if request.path_info.startswith(settings.SESSAO_CAMINHOS_SEM_RENOVACAO):
+            return
+
+        agora = int(time.time())
+        if agora - session.get(CHAVE_RENOVACAO, 0) >= settings.SESSAO_RENOVACAO_INTERVALO:
+            session[CHAVE_RENOVACAO] = agora
+            metricas.SESSAO_GRAVACOES.labels('renovacao').inc()
@@ -0,0 +1,117 @@
+from bisect import bisect_left
+from typing import NamedTuple
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+
+
+# ==============================================================================
+# NAVEGAÇÃO DOS LIVROS DIGITAIS (historia, coral, sim_cozinha)
+# ==============================================================================
+# Cada livro guarda no cache um índice ordenado [(pk, ordem_exibicao, titulo)].
+# Com ele a página sabe o total, o anterior e o próximo sem consultar o banco:
+# cada requisição custa só a busca do capítulo atual pela chave primária.
+# O índice é descartado no post_save/post_delete do modelo (admin, list_editable).
+
+TIMEOUT_INDICE = 60 * 60 * 24
+
+
+class EntradaLivro(NamedTuple):
+    pk: int
+    ordem_exibicao: int
+    titulo: str
+    posicao: int
+
+
+class PaginaLivro(NamedTuple):
+    objeto: object
+    posicao: int
+    total: int
+    anterior: EntradaLivro = None
+    proximo: EntradaLivro = None
+
+
+class IndiceLivro:
+    """
+    Índice cacheado de um livro digital.
+    `filtro` restringe os itens do livro (ex: apenas eventos com vídeo).
+    """
+
+    def __init__(self, model, nome, filtro=None, campo_titulo='titulo'):
+        self.model = model
+        self.nome = nome
+        self.filtro = filtro or {}
+        self.campo_titulo = campo_titulo
+        post_save.connect(self._invalidar_sinal, sender=model, weak=False, dispatch_uid=f'livro:{nome}:save')
+        post_delete.connect(self._invalidar_sinal, sender=model, weak=False, dispatch_uid=f'livro:{nome}:delete')
+
+    @property
+    def chave(self):
+        return f'livro:{self.nome}:indice'
+
+    def _invalidar_sinal(self, sender, **kwargs):
+        self.invalidar()
+
+    def invalidar(self):
+        cache.delete(self.chave)
+
+    def entradas(self):
+        """[(pk, ordem_exibicao, titulo)] na ordem do livro."""
+        indice = cache.get(self.chave)
+        if indice is None:
+            indice = list(
+                self.model._default_manager.filter(**self.filtro)
+                .order_by('ordem_exibicao')
+                .values_list('pk', 'ordem_exibicao', self.campo_titulo)
+            )
+            cache.set(self.chave, indice, TIMEOUT_INDICE)
+        return indice
+
+    def posicao_da_ordem(self, ordem):
+        """Posição (base 1) do item com a ordem_exibicao informada, ou None."""
+        entradas = self.entradas()
+        ordens = [entrada[1] for entrada in entradas]
+        i = bisect_left(ordens, ordem)
+        if i < len(ordens) and ordens[i] == ordem:
+            return i + 1
+        return None
+
+    def _entrada(self, entradas, posicao):
+        if 1 <= posicao <= len(entradas):
+            return EntradaLivro(*entradas[posicao - 1], posicao)
+        return None
+
+    def pagina(self, posicao):
+        """
+        Página na posição (base 1), ajustada para o intervalo do livro.
+        Retorna None se o livro estiver vazio.
+        """
+        for _tentativa in range(2):
+            entradas = self.entradas()
+            if not entradas:
+                return None
+
+            posicao = max(1, min(posicao, len(entradas)))
+            try:
+                objeto = self.model._default_manager.get(pk=entradas[posicao - 1][0])
+            except self.model.DoesNotExist:
+                # Índice de outro processo ainda não invalidado: recarrega uma vez
+                self.invalidar()
+                continue
+
+            return PaginaLivro(
+                objeto=objeto,
+                posicao=posicao,
+                total=len(entradas),
+                anterior=self._entrada(entradas, posicao - 1),
+                proximo=self._entrada(entradas, posicao + 1),
+            )
+        return None
+
+
+def posicao_da_requisicao(request, parametro='page'):
+    """Lê a página (base 1) da query string; valores inválidos viram 1."""
+    try:
+        return max(1, int(request.GET.get(parametro, 1)))
+    except (TypeError, ValueError):
+        return 1
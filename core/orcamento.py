@@ -0,0 +1,90 @@
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from django.urls import resolve
+
+
+# ==============================================================================
+# ORÇAMENTO DE QUERIES POR VIEW
+# ==============================================================================
+# Cada view quente declara, ao lado do código, o máximo de queries que pode
+# fazer, qualquer que seja o volume de dados (fotos na galeria, grupos do
+# usuário, mensagens no canal). Os testes de cada app semeiam volumes realistas
+# (core/massa_dados.py) e falham listando o SQL quando a view passa do limite:
+# um N+1 novo aparece no teste, não em produção.
+#
+#   views de função:  @orcamento_queries(8)
+#   views de classe e ModelAdmin (changelist):  orcamento_queries = 8
+#   consumers:  orcamento_queries = {'connect': 4, 'receive_json': 3}
+
+
+def orcamento_queries(limite):
+    """Declara o orçamento de uma view de função (vale em qualquer posição entre os decorators)."""
+    def decorator(view):
+        view.orcamento_queries = limite
+        return view
+    return decorator
+
+
+def orcamento_de(alvo, acao=None):
+    """Orçamento declarado na view, ModelAdmin ou consumer (`acao` escolhe o handler do consumer)."""
+    # As views de classe e as do admin chegam embrulhadas pelo as_view()/admin_view()
+    alvo = getattr(alvo, 'view_class', None) or getattr(alvo, 'model_admin', None) or alvo
+    orcamento = getattr(alvo, 'orcamento_queries', None)
+    if isinstance(orcamento, dict):
+        orcamento = orcamento.get(acao)
+    if orcamento is None:
+        raise LookupError(f'{alvo!r} não declara orçamento de queries{f" para {acao}" if acao else ""}.')
+    return orcamento
+
+
+class OrcamentoQueriesMixin:
+    """Asserções de orçamento para os TestCase dos apps."""
+
+    def entrar(self, usuario, cliente=None):
+        """
+        Login já com a sessão renovada: a gravação da RenovacaoSessaoMiddleware
+        na primeira requisição não entra na conta da view medida.
+        """
+        from .middleware import CHAVE_RENOVACAO
+
+        cliente = cliente or self.client
+        cliente.force_login(usuario)
+        sessao = cliente.session
+        sessao[CHAVE_RENOVACAO] = int(time.time())
+        sessao.save()
+        return cliente
+
+    @contextmanager
+    def assertOrcamento(self, alvo, acao=None, nome=None, conexao=None):
+        """
+        Conta as queries do bloco. Nos consumers o bloco roda no event loop de
+        outra thread: passe em `conexao` a conexão da thread do teste, onde o
+        database_sync_to_async executa.
+        """
+        limite = orcamento_de(alvo, acao)
+        consultas = []
+
+        def registrar(execute, sql, params, many, context):
+            consultas.append(sql)
+            return execute(sql, params, many, context)
+
+        # execute_wrapper (e não CaptureQueriesContext): não abre conexão, então
+        # também pode ser usado dentro de código assíncrono
+        with (conexao or connection).execute_wrapper(registrar):
+            yield consultas
+
+        if len(consultas) > limite:
+            listagem = '\n'.join(f'{i:>4}. {sql}' for i, sql in enumerate(consultas, 1))
+            self.fail(
+                f'{nome or getattr(alvo, "__qualname__", alvo)}{f".{acao}" if acao else ""}: '
+                f'{len(consultas)} queries, orçamento de {limite}.\n{listagem}'
+            )
+
+    def assertOrcamentoDaUrl(self, url, cliente=None):
+        """GET na URL, comparado ao orçamento da view que a atende. Retorna a resposta."""
+        with self.assertOrcamento(resolve(url.split('?')[0]).func, nome=url):
+            response = (cliente or self.client).get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return response
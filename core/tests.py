@@ -1,3 +1,80 @@
-from django.test import TestCase
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
 
-# Create your tests here.
+from .cache_pagina import cache_anonimo
+
+CACHE_LOCAL = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+# ==============================================================================
+# ACESSO A /metricas/ (views.metricas_view)
+# ==============================================================================
+
+class MetricasAcessoTests(TestCase):
+
+    def obter(self, **extra):
+        return self.client.get(reverse('core:metricas'), **extra)
+
+    @override_settings(METRICAS_TOKEN='', DEBUG=False)
+    def test_sem_token_fica_fechada(self):
+        # Atrás do nginx toda requisição chega de 127.0.0.1
+        self.assertEqual(self.obter(REMOTE_ADDR='127.0.0.1').status_code, 403)
+
+    @override_settings(METRICAS_TOKEN='', DEBUG=True)
+    def test_sem_token_com_debug_aceita_so_local(self):
+        self.assertEqual(self.obter(REMOTE_ADDR='127.0.0.1').status_code, 200)
+        self.assertEqual(self.obter(REMOTE_ADDR='10.0.0.8').status_code, 403)
+
+    @override_settings(METRICAS_TOKEN='segredo', DEBUG=False)
+    def test_com_token(self):
+        self.assertEqual(self.obter(REMOTE_ADDR='127.0.0.1').status_code, 403)
+        self.assertEqual(self.obter(HTTP_AUTHORIZATION='Bearer errado').status_code, 403)
+        self.assertEqual(self.obter(HTTP_AUTHORIZATION='Bearer segredo').status_code, 200)
+
+
+# ==============================================================================
+# CHAVES DO CACHE DE PÁGINA ANÔNIMO (cache_pagina.py)
+# ==============================================================================
+
+@override_settings(CACHES=CACHE_LOCAL, PAGINA_CACHE_VARIANTES=3)
+class CacheAnonimoTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.execucoes = 0
+
+        @cache_anonimo(parametros=('page', 'mes'))
+        def view(request):
+            self.execucoes += 1
+            return HttpResponse(f'execução {self.execucoes}')
+
+        self.view = view
+
+    def obter(self, query=''):
+        request = RequestFactory().get(f'/galerias/{query}')
+        request.user = AnonymousUser()
+        return self.view(request)
+
+    def test_parametros_da_view_em_ordem_fixa(self):
+        primeira = self.obter('?page=2&mes=5').content
+        self.assertEqual(self.obter('?mes=5&page=2').content, primeira)
+        # Parâmetro vazio equivale ao ausente
+        self.assertEqual(self.obter('?page=').content, self.obter().content)
+        self.assertEqual(self.execucoes, 2)
+
+    def test_parametros_desconhecidos_nao_passam_pelo_cache(self):
+        for query in ('?x=1', '?x=1', '?page=1&utm_source=a', '?page=1&page=2'):
+            self.obter(query)
+        self.assertEqual(self.execucoes, 4)
+
+    def test_limite_de_variantes_por_view(self):
+        for page in range(1, 6):
+            self.obter(f'?page={page}')
+        # Só as 3 primeiras ficaram no cache; as outras são sempre renderizadas
+        self.assertEqual(self.execucoes, 5)
+        self.obter('?page=1')
+        self.obter('?page=5')
+        self.assertEqual(self.execucoes, 6)
@@ -7,4 +7,10 @@ app_name = 'core'
 urlpatterns = [
     # Mapeia a URL raiz ('/') para a view da página inicial
     path('', views.home_view, name='home'),
+
+    # Relatório de desempenho por rota (somente staff)
+    path('desempenho/', views.desempenho_view, name='desempenho'),
+
+    # Métricas Prometheus (coletor local)
+    path('metricas/', views.metricas_view, name='metricas'),
 ]
\ No newline at end of file
@@ -1,6 +1,15 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from . import instrumentacao, metricas
+from .cache_pagina import cache_anonimo
 
 # View da Página Inicial
+@cache_anonimo()
 def home_view(request):
     """
     Função de visualização para a página inicial (Home).
@@ -8,4 +17,36 @@ def home_view(request):
     context = {
         'title': 'Bem-vindo à Escola Estadual Professor José Ranieri'
     }
-    return render(request, 'core/home.html', context)
\ No newline at end of file
+    return render(request, 'core/home.html', context)
+
+
+# Relatório de desempenho por rota (core/instrumentacao.py)
+@staff_member_required
+def desempenho_view(request):
+    """
+    Percentis por rota de todos os processos que publicaram medições.
+    ?local=1 mostra só o buffer do processo que atendeu a requisição.
+    """
+    if request.GET.get('local'):
+        amostras = instrumentacao.amostras_locais()
+    else:
+        amostras = instrumentacao.amostras_de_todos()
+    return JsonResponse({'amostras': len(amostras), 'rotas': instrumentacao.resumir(amostras)})
+
+
+# Exposição das métricas Prometheus (core/metricas.py), para o coletor local
+def metricas_view(request):
+    """
+    Com METRICAS_TOKEN exige 'Authorization: Bearer <token>'. Sem ele, fica
+    fechada, exceto com DEBUG para os IPs de METRICAS_IPS_PERMITIDOS: atrás
+    do nginx todo acesso chega de 127.0.0.1.
+    """
+    if settings.METRICAS_TOKEN:
+        permitido = constant_time_compare(
+            request.headers.get('Authorization', ''), f'Bearer {settings.METRICAS_TOKEN}'
+        )
+    else:
+        permitido = settings.DEBUG and request.META.get('REMOTE_ADDR') in settings.METRICAS_IPS_PERMITIDOS
+    if not permitido:
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(metricas.registro(banco=True)), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,178 @@
+import asyncio
+import contextvars
+import functools
+import hashlib
+import mimetypes
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+
+from config.storages_conf import get_s3_client
+from core import metricas
+
+
+# ==============================================================================
+# ENTREGA DAS IMAGENS PRIVADAS (PrivateMediaProxyView)
+# ==============================================================================
+# A permissão é sempre checada pelo Django. Depois dela, os bytes saem por um
+# dos modos de settings.MEDIA_PROXY_MODO:
+#   'stream'     o worker transmite o objeto do S3 em blocos (funciona sem proxy na frente)
+#   'x-accel'    nginx: a resposta só traz X-Accel-Redirect para uma location interna
+#   'redirect'   302 para uma URL assinada do S3, de vida curta (ver url_assinada)
+#
+# Não há modo X-Sendfile (Apache/lighttpd): ele exige o arquivo num disco
+# local, e as imagens só existem no bucket privado.
+#
+# O offload só é usado quando o proxy da frente se anuncia no cabeçalho
+# X-Sendfile-Type (ex: proxy_set_header X-Sendfile-Type X-Accel-Redirect;).
+# Sem ele (runserver, Daphne exposto direto), cai no modo stream.
+
+CABECALHOS_OFFLOAD = {
+    'x-accel': 'X-Accel-Redirect',
+}
+
+# Validade da URL assinada entregue ao nginx: ele a usa imediatamente
+EXPIRACAO_ACCEL = 60
+
+
+def tipo_conteudo(caminho):
+    return mimetypes.guess_type(caminho)[0] or 'application/octet-stream'
+
+
+def offload_disponivel(request):
+    """Retorna o cabeçalho de offload a usar, ou None se não houver proxy que o entenda."""
+    cabecalho = CABECALHOS_OFFLOAD.get(settings.MEDIA_PROXY_MODO)
+    if not cabecalho:
+        return None
+    anunciado = request.META.get('HTTP_X_SENDFILE_TYPE', '')
+    return cabecalho if anunciado.lower() == cabecalho.lower() else None
+
+
+def resposta_offload(cabecalho, chave):
+    """Resposta vazia: o proxy da frente busca e envia o arquivo."""
+    response = HttpResponse(content_type=tipo_conteudo(chave))
+
+    # A location interna faz proxy_pass para host/caminho?assinatura, então
+    # o bucket continua privado e o nginx não precisa de credenciais.
+    url = get_s3_client().generate_presigned_url(
+        'get_object',
+        Params={'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Key': chave},
+        ExpiresIn=EXPIRACAO_ACCEL,
+    )
+    partes = urlsplit(url)
+    destino = f"{settings.MEDIA_PROXY_ACCEL_PREFIXO}{partes.netloc}{partes.path}"
+    if partes.query:
+        destino = f"{destino}?{partes.query}"
+    response[cabecalho] = destino
+
+    return response
+
+
+# ==============================================================================
+# TRANSFERÊNCIA ASSÍNCRONA (modo stream)
+# ==============================================================================
+# A view do proxy é async (roda no event loop do Daphne). O boto3 é
+# bloqueante, então cada chamada ao S3 (get_object e a leitura de cada bloco)
+# roda em um pool de threads próprio: a thread fica presa só durante um bloco,
+# não durante a transferência inteira, e o pool do sync_to_async (ORM) fica
+# livre. O tamanho do pool acompanha o pool HTTP do client (max_pool_connections).
+# O run_in_executor não leva os contextvars: cada chamada roda numa cópia do
+# contexto, para a medição da requisição (core/instrumentacao.py) contar o S3.
+
+_executor_s3 = None
+
+
+def _executor():
+    global _executor_s3
+    if _executor_s3 is None:
+        _executor_s3 = ThreadPoolExecutor(
+            max_workers=settings.MEDIA_PROXY_THREADS_S3,
+            thread_name_prefix='midia-s3',
+        )
+    return _executor_s3
+
+
+async def em_thread(funcao, *args, **kwargs):
+    """Executa uma chamada bloqueante (S3, cache) no pool de mídia, sem travar o event loop."""
+    loop = asyncio.get_running_loop()
+    contexto = contextvars.copy_context()
+    return await loop.run_in_executor(_executor(), functools.partial(contexto.run, funcao, *args, **kwargs))
+
+
+async def _blocos(corpo):
+    # Fecha a conexão com o S3 mesmo se o cliente desistir no meio da transferência
+    try:
+        while True:
+            bloco = await em_thread(corpo.read, settings.MEDIA_PROXY_CHUNK)
+            if not bloco:
+                break
+            metricas.PROXY_BYTES.inc(len(bloco))
+            yield bloco
+    finally:
+        corpo.close()
+
+
+async def resposta_stream(chave):
+    """Transmite o objeto do S3 como iterador assíncrono, sem carregá-lo inteiro na memória."""
+    s3_response = await em_thread(
+        get_s3_client().get_object, Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=chave
+    )
+    response = StreamingHttpResponse(
+        _blocos(s3_response['Body']),
+        content_type=s3_response.get('ContentType') or tipo_conteudo(chave),
+    )
+    if s3_response.get('ContentLength') is not None:
+        response['Content-Length'] = s3_response['ContentLength']
+    return response
+
+
+# ==============================================================================
+# MODO REDIRECT (URL assinada de vida curta)
+# ==============================================================================
+# O tempo é dividido em janelas de MEDIA_PROXY_REDIRECT_JANELA segundos. A URL
+# de cada (chave, janela) é assinada uma vez e fica no cache até o fim da
+# janela, então todos que abrem a mesma foto recebem a mesma URL e o navegador
+# aproveita o que já baixou. A assinatura vale até uma janela inteira depois
+# do fim da janela em que foi gerada: quem recebeu o 302 no último segundo
+# ainda tem esse tempo para usá-la. Nenhum link vive mais que duas janelas.
+
+
+def _janela_atual():
+    janela = settings.MEDIA_PROXY_REDIRECT_JANELA
+    agora = time.time()
+    indice = int(agora // janela)
+    restante = int((indice + 1) * janela - agora) or 1
+    return janela, indice, restante
+
+
+def url_assinada(chave):
+    """URL assinada para a chave, compartilhada por todos na janela de tempo atual."""
+    janela, indice, restante = _janela_atual()
+    chave_cache = f"midia:url:{hashlib.sha1(chave.encode()).hexdigest()}:{indice}"
+
+    url = cache.get(chave_cache)
+    if url is None:
+        url = get_s3_client().generate_presigned_url(
+            'get_object',
+            Params={
+                'Bucket': settings.AWS_STORAGE_BUCKET_NAME,
+                'Key': chave,
+                # O S3 devolve a imagem já com o cache do navegador ajustado à validade
+                'ResponseCacheControl': f'private, max-age={janela}',
+            },
+            ExpiresIn=restante + janela,
+        )
+        cache.set(chave_cache, url, timeout=restante)
+    return url, restante
+
+
+def resposta_redirect(chave):
+    """302 para o S3. O próprio redirect pode ser reaproveitado pelo navegador até o fim da janela."""
+    url, restante = url_assinada(chave)
+    response = HttpResponseRedirect(url)
+    response['Cache-Control'] = f'private, max-age={restante}'
+    return response
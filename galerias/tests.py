@@ -1,3 +1,106 @@
-from django.test import TestCase
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
 
-# Create your tests here.
+from core import benchmark, instrumentacao, massa_dados
+from core.orcamento import OrcamentoQueriesMixin
+
+from . import midia
+
+CACHE_LOCAL = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+# ==============================================================================
+# ORÇAMENTO DE QUERIES DAS GALERIAS (core/orcamento.py)
+# ==============================================================================
+# Galerias com centenas de fotos e curtidas, e um responsável em vários grupos:
+# o número de queries das views não pode crescer com esses volumes.
+
+@override_settings(CACHES=CACHE_LOCAL)
+class OrcamentoGaleriasTests(OrcamentoQueriesMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        grupos = massa_dados.criar_grupos(12)
+        cls.fotografo = massa_dados.criar_usuario('fotografo', is_fotografo=True)
+        cls.responsaveis = massa_dados.criar_usuarios(20, grupos)
+        cls.galerias = [
+            massa_dados.criar_galeria(
+                cls.fotografo, f'Evento {i + 1}', grupos=[grupos[i], grupos[(i + 1) % len(grupos)]],
+                imagens=300 if i == 0 else 20, curtidas_por=cls.responsaveis,
+            )
+            for i in range(len(grupos))
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.entrar(self.responsaveis[0])
+
+    def test_detalhe_da_galeria(self):
+        response = self.assertOrcamentoDaUrl(
+            reverse('galerias:detalhe_galeria', kwargs={'pk': self.galerias[0].pk})
+        )
+        self.assertEqual(len(response.context['curtidas_pelo_usuario']), 300)
+        self.assertEqual(response.context['curtidas_totais_galeria'], 100 * len(self.responsaveis))
+
+    def test_lista_de_galerias_exclusivas(self):
+        response = self.assertOrcamentoDaUrl(reverse('galerias:lista_galerias'))
+        self.assertEqual(len(response.context['galerias_exclusivas']), 12)
+
+    def test_lista_de_galerias_filtrada_por_grupo(self):
+        grupo = self.galerias[0].grupos_acesso.first()
+        self.assertOrcamentoDaUrl(f"{reverse('galerias:lista_galerias')}?grupo={grupo.pk}")
+
+
+# ==============================================================================
+# INSTRUMENTAÇÃO DO PROXY DE MÍDIA (modo stream)
+# ==============================================================================
+
+class MedicaoProxyTests(TestCase):
+
+    def test_chamadas_ao_s3_no_pool_de_threads(self):
+        conteudo = b'\xff\xd8' + b'0' * 5000
+
+        async def transmitir():
+            # O middleware faz o mesmo: a medição fica no contextvar da requisição
+            medicao = instrumentacao.Medicao(rota='GET private_media_proxy')
+            token = instrumentacao._atual.set(medicao)
+            try:
+                response = await midia.resposta_stream('repo/processadas/foto.jpg')
+                corpo = b''.join([bloco async for bloco in response.streaming_content])
+            finally:
+                instrumentacao._atual.reset(token)
+            return medicao, corpo
+
+        with benchmark.s3_local() as s3:
+            s3.put('repo/processadas/foto.jpg', conteudo)
+            medicao, corpo = async_to_sync(transmitir)()
+
+        self.assertEqual(corpo, conteudo)
+        self.assertEqual((medicao.s3_chamadas, medicao.s3_bytes), (1, len(conteudo)))
+
+
+# ==============================================================================
+# OFFLOAD PARA O PROXY DA FRENTE (midia.offload_disponivel)
+# ==============================================================================
+
+class OffloadProxyTests(TestCase):
+
+    def requisicao(self, tipo):
+        return RequestFactory().get('/media/foto.jpg', HTTP_X_SENDFILE_TYPE=tipo)
+
+    @override_settings(MEDIA_PROXY_MODO='x-accel')
+    def test_x_accel_aponta_para_a_location_interna(self):
+        self.assertIsNone(midia.offload_disponivel(self.requisicao('')))
+        cabecalho = midia.offload_disponivel(self.requisicao('X-Accel-Redirect'))
+        self.assertEqual(cabecalho, 'X-Accel-Redirect')
+
+        with benchmark.s3_local():
+            response = midia.resposta_offload(cabecalho, 'repo/processadas/foto.jpg')
+        self.assertRegex(response['X-Accel-Redirect'], r'^/_s3_interno/[^/]+/.*repo/processadas/foto\.jpg\?')
+
+    @override_settings(MEDIA_PROXY_MODO='x-sendfile')
+    def test_sem_modo_x_sendfile(self):
+        # As imagens só existem no bucket: não há arquivo local para o Apache enviar
+        self.assertIsNone(midia.offload_disponivel(self.requisicao('X-Sendfile')))
@@ -1,15 +1,19 @@
 from django.views.generic import ListView, DetailView, View
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.http import JsonResponse, HttpResponseForbidden, HttpResponseBadRequest, HttpResponse
-from django.db.models import Q
+from django.db.models import Count, Prefetch, Q
 from repositorio.models import Galeria, Curtida, Imagem
 from users.models import Grupo
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse
 from django.conf import settings
+from django.utils.decorators import method_decorator
 from django.contrib.auth.models import Group
 import mimetypes
-import boto3
+import time
+from core import metricas
+from core.cache_pagina import cache_anonimo
+from . import midia
 from botocore.exceptions import ClientError
 
 
@@ -37,10 +41,31 @@ class GaleriaAccessMixin:
         user_auth_groups = user.groups.all()
         return galeria.grupos_acesso.filter(auth_group__in=user_auth_groups).exists()
 
+    async def ahas_access(self, galeria, user):
+        """Versão assíncrona de has_access (views async, ex: proxy de mídia)."""
+        if galeria is None:
+            return False
+
+        if user.is_authenticated and user.is_superuser:
+            return galeria.status == 'PB'
+
+        if galeria.status != 'PB':
+            return False
+
+        if galeria.acesso_publico:
+            return True
+
+        if not user.is_authenticated:
+            return False
+
+        user_auth_groups = user.groups.all()
+        return await galeria.grupos_acesso.filter(auth_group__in=user_auth_groups).aexists()
+
 
 # ----------------------------------------------------------------------
 # 1. LISTAGEM PÚBLICA (Atualizada com Paginação e Filtros)
 # ----------------------------------------------------------------------
+@method_decorator(cache_anonimo('galerias', parametros=('mes', 'ano', 'grupo', 'page')), name='dispatch')
 class GaleriaPublicaListView(ListView):
     model = Galeria
     template_name = 'galerias/lista_publicas.html'
@@ -100,6 +125,7 @@ class GaleriaListView(LoginRequiredMixin, GaleriaAccessMixin, ListView):
     template_name = 'galerias/lista_galerias.html'
     context_object_name = 'galerias_exclusivas'
     paginate_by = 12
+    orcamento_queries = 5
 
     def get_queryset(self):
         user = self.request.user
@@ -120,7 +146,7 @@ class GaleriaListView(LoginRequiredMixin, GaleriaAccessMixin, ListView):
         if grupo_id:
             queryset = queryset.filter(grupos_acesso__id=grupo_id)
 
-        return queryset.prefetch_related('capa', 'grupos_acesso').order_by('-data_do_evento').distinct()
+        return queryset.select_related('capa').prefetch_related('grupos_acesso').order_by('-data_do_evento').distinct()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -137,34 +163,42 @@ class GaleriaListView(LoginRequiredMixin, GaleriaAccessMixin, ListView):
                 grupo_ranieri__galerias_acessiveis__status='PB'
             ).distinct()
 
+        # Avaliado uma única vez: serve para o select e para o agrupamento abaixo
+        grupos_base = list(grupos_base)
         context['grupos_filtros'] = grupos_base
 
         # 2. Lógica de Grupos para Exibição (Respeitando o filtro de grupo selecionado)
         if grupo_id_filtrado:
-            user_groups_to_iterate = grupos_base.filter(id=grupo_id_filtrado)
+            user_groups_to_iterate = [g for g in grupos_base if str(g.id) == grupo_id_filtrado]
         else:
             user_groups_to_iterate = grupos_base
 
-        grupos_com_galerias = []
         galerias_da_pagina = context['galerias_exclusivas']
 
-        for group in user_groups_to_iterate:
-            # Filtra apenas as galerias que pertencem a este grupo dentro do queryset já filtrado pela paginação/data
-            galerias_do_grupo = [g for g in galerias_da_pagina if g.grupos_acesso.filter(auth_group=group).exists()]
+        # Agrupamento em memória a partir do grupos_acesso já pré-carregado
+        # (prefetch_related): o número de queries não depende de quantos grupos
+        # o usuário tem nem de quantas galerias há na página.
+        galerias_por_grupo = {}
+        for galeria in galerias_da_pagina:
+            if galeria.capa and galeria.capa.arquivo_processado:
+                try:
+                    galeria.capa_proxy_url = reverse(
+                        'galerias:private_media_proxy',
+                        kwargs={'path': galeria.capa.arquivo_processado.name}
+                    )
+                except Exception:
+                    galeria.capa_proxy_url = None
+            else:
+                galeria.capa_proxy_url = None
 
-            if galerias_do_grupo:
-                for galeria in galerias_do_grupo:
-                    if galeria.capa and galeria.capa.arquivo_processado:
-                        try:
-                            galeria.capa_proxy_url = reverse(
-                                'galerias:private_media_proxy',
-                                kwargs={'path': galeria.capa.arquivo_processado.name}
-                            )
-                        except Exception:
-                            galeria.capa_proxy_url = None
-                    else:
-                        galeria.capa_proxy_url = None
+            for grupo in galeria.grupos_acesso.all():
+                galerias_por_grupo.setdefault(grupo.auth_group_id, []).append(galeria)
 
+        grupos_com_galerias = []
+        for group in user_groups_to_iterate:
+            # Galerias deste grupo dentro da página já filtrada pela paginação/data
+            galerias_do_grupo = galerias_por_grupo.get(group.id)
+            if galerias_do_grupo:
                 grupos_com_galerias.append({
                     'nome_grupo': group.name,
                     'galerias': galerias_do_grupo
@@ -181,11 +215,13 @@ class GaleriaDetailView(GaleriaAccessMixin, DetailView):
     model = Galeria
     template_name = 'galerias/detalhe_galeria.html'
     context_object_name = 'galeria'
+    orcamento_queries = 5
 
     def get_queryset(self):
+        # Só a contagem de curtidas de cada foto, não as linhas de Curtida
+        imagens = Imagem.objects.annotate(total_curtidas=Count('curtidas'))
         return Galeria.objects.prefetch_related(
-            'imagens__curtidas',
-            'imagens',
+            Prefetch('imagens', queryset=imagens),
         ).select_related('fotografo')
 
     def get(self, request, *args, **kwargs):
@@ -204,14 +240,19 @@ class GaleriaDetailView(GaleriaAccessMixin, DetailView):
         context = super().get_context_data(**kwargs)
         galeria = context['galeria']
         user = self.request.user
-        curtidas_pelo_usuario = {}
         curtidas_totais_galeria = 0
 
+        # Fotos curtidas pelo usuário nesta galeria: uma consulta para todas
+        curtidas_do_usuario = set()
+        if user.is_authenticated:
+            curtidas_do_usuario = set(
+                Curtida.objects.filter(usuario=user, imagem__galeria=galeria).values_list('imagem_id', flat=True)
+            )
+        curtidas_pelo_usuario = {}
+
         for imagem in galeria.imagens.all():
-            curtidas_count = imagem.curtidas.count()
-            curtidas_totais_galeria += curtidas_count
-            curtidas_pelo_usuario[imagem.pk] = imagem.curtidas.filter(
-                usuario=user).exists() if user.is_authenticated else False
+            curtidas_totais_galeria += imagem.total_curtidas
+            curtidas_pelo_usuario[imagem.pk] = imagem.pk in curtidas_do_usuario
 
             if imagem.arquivo_processado:
                 try:
@@ -260,39 +301,46 @@ class CurtirView(LoginRequiredMixin, View):
 # 5. PROXY DE MÉDIA PRIVADA S3
 # ----------------------------------------------------------------------
 class PrivateMediaProxyView(View):
-    def get(self, request, *args, **kwargs):
-        file_path = kwargs.get('path')
-        user = request.user
+    """
+    View assíncrona: roda direto no event loop do Daphne. A busca da imagem e
+    a checagem de acesso usam o ORM async; as chamadas ao S3 vão para o pool
+    de threads de galerias/midia.py, bloco a bloco.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        inicio = time.perf_counter()
+        modo, response = await self._responder(request, kwargs.get('path'))
+        metricas.PROXY_LATENCIA.labels(modo).observe(time.perf_counter() - inicio)
+        return response
+
+    async def _responder(self, request, file_path):
+        """Retorna (modo, resposta); o modo vira o rótulo da métrica de latência."""
+        user = await request.auser()
 
         try:
-            imagem = Imagem.objects.get(arquivo_processado__endswith=file_path)
+            imagem = await Imagem.objects.select_related('galeria').aget(arquivo_processado__endswith=file_path)
             galeria = imagem.galeria
         except (Imagem.DoesNotExist, Imagem.MultipleObjectsReturned):
-            return HttpResponseBadRequest('Arquivo não encontrado.')
+            return 'nao_encontrado', HttpResponseBadRequest('Arquivo não encontrado.')
 
         if user.is_authenticated and (
-                user.is_superuser or getattr(user, 'is_fotografo_master', False) or imagem.fotografo == user):
+                user.is_superuser or getattr(user, 'is_fotografo_master', False) or imagem.fotografo_id == user.pk):
             allowed = True
         else:
-            allowed = GaleriaAccessMixin().has_access(galeria, user)
+            allowed = await GaleriaAccessMixin().ahas_access(galeria, user)
 
         if not allowed:
-            return HttpResponseForbidden('Acesso negado.')
+            return 'negado', HttpResponseForbidden('Acesso negado.')
 
+        chave = imagem.arquivo_processado.name
         try:
-            s3_client = boto3.client(
-                's3',
-                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                region_name=settings.AWS_S3_REGION_NAME
-            )
-            s3_response = s3_client.get_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME,
-                                               Key=imagem.arquivo_processado.name)
-            response = HttpResponse(s3_response['Body'].read(), content_type=s3_response.get('ContentType',
-                                                                                             mimetypes.guess_type(
-                                                                                                 file_path)[
-                                                                                                 0] or 'application/octet-stream'))
-            response['Content-Length'] = s3_response.get('ContentLength')
-            return response
+            if settings.MEDIA_PROXY_MODO == 'redirect':
+                return 'redirect', await midia.em_thread(midia.resposta_redirect, chave)
+
+            # Com o nginx na frente, os bytes não passam pelo worker
+            cabecalho = midia.offload_disponivel(request)
+            if cabecalho:
+                return 'offload', await midia.em_thread(midia.resposta_offload, cabecalho, chave)
+            return 'stream', await midia.resposta_stream(chave)
         except Exception:
-            return HttpResponseBadRequest('Erro ao acessar o armazenamento.')
\ No newline at end of file
+            return 'erro', HttpResponseBadRequest('Erro ao acessar o armazenamento.')
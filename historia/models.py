@@ -2,6 +2,9 @@ from django.db import models
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 
+from core.cache_pagina import purgar_ao_salvar
+from core.navegacao import IndiceLivro
+
 
 # ==============================================================================
 # 🎯 Modelo: HistoricoCapitulo
@@ -61,4 +64,11 @@ class HistoricoCapitulo(models.Model):
     def save(self, *args, **kwargs):
         """Executa a validação 'clean' antes de salvar."""
         self.full_clean()
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+
+# Índice cacheado da navegação do Livro Digital (core/navegacao.py)
+indice_capitulos = IndiceLivro(HistoricoCapitulo, 'historia')
+
+# Páginas anônimas cacheadas que exibem os capítulos (core/cache_pagina.py)
+purgar_ao_salvar(HistoricoCapitulo, 'historia')
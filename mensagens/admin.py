@@ -1,14 +1,20 @@
 from django.contrib import admin
-from django.http import HttpResponse
+from django.conf import settings
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.shortcuts import redirect
+from django.urls import path
 from django.utils.translation import gettext_lazy as _
-import csv
 import datetime
 from django import forms
 from django.template.response import TemplateResponse
 from django.contrib import messages
 from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
 
+from core.admin import filtro_com_relacoes
+from users.models import RELACOES_REGISTRO_USUARIO, relacoes_usuario
 from .models import Canal, Mensagem, UltimaLeituraUsuario
+from . import exportacao
+from .tasks import exportar_mensagens_csv_task
 
 
 # ==============================================================================
@@ -70,59 +76,42 @@ def exportar_mensagens_dos_canais_csv(modeladmin, request, queryset_canais):
             data_inicial = form.cleaned_data.get('data_inicial')
             data_final = form.cleaned_data.get('data_final')
 
-            # INÍCIO DA LÓGICA DE EXPORTAÇÃO
-            data_hora_agora = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            nome_arquivo = f"relatorio_auditoria_canais_{data_hora_agora}.csv"
-
-            response = HttpResponse(content_type='text/csv')
-            response['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
-
-            # 🎯 CORREÇÃO DE DETALHE: Usar ponto e vírgula (;) como delimitador para compatibilidade com Excel em pt-BR
-            writer = csv.writer(response, delimiter=';', quoting=csv.QUOTE_ALL)
-
-            writer.writerow([
-                _('ID Mensagem'), _('Data/Hora de Envio'), _('Canal'),
-                _('Grupo Associado'), _('ID Autor'), _('Autor (Username)'), _('Conteúdo')
-            ])
-
-            canal_ids = queryset_canais.values_list('id', flat=True)
-            mensagens_queryset = Mensagem.objects.filter(canal_id__in=canal_ids)
-
+            canal_ids = list(queryset_canais.values_list('id', flat=True))
             # APLICAÇÃO DO FILTRO DE DATAS CUSTOMIZADAS
-            if data_inicial:
-                mensagens_queryset = mensagens_queryset.filter(data_envio__date__gte=data_inicial)
+            mensagens_queryset = exportacao.mensagens_do_periodo(canal_ids, data_inicial, data_final)
 
-            if data_final:
-                mensagens_queryset = mensagens_queryset.filter(data_envio__date__lte=data_final)
+            # Contagem limitada: substitui o .exists() e decide entre streaming e task
+            limite = settings.EXPORTACAO_CSV_LIMITE_SINCRONO
+            total = exportacao.contar_ate(mensagens_queryset, limite)
 
-            if not mensagens_queryset.exists():
+            if total == 0:
                 messages.warning(request, _("Nenhuma mensagem encontrada para o período selecionado."))
-                from django.shortcuts import redirect
-                return redirect(f'admin:mensagens_canal_changelist')
+                return redirect('admin:mensagens_canal_changelist')
+
+            # Períodos muito grandes: gera o arquivo em segundo plano (Celery)
+            if total > limite:
+                exportar_mensagens_csv_task.delay(
+                    canal_ids,
+                    data_inicial.isoformat() if data_inicial else None,
+                    data_final.isoformat() if data_final else None,
+                    request.user.id,
+                    request.build_absolute_uri('/'),
+                )
+                messages.success(request, _(
+                    "A exportação tem mais de %(limite)s mensagens e será gerada em segundo plano. "
+                    "Você receberá o link de download por notificação e e-mail."
+                ) % {'limite': limite})
+                return redirect('admin:mensagens_canal_changelist')
+
+            # INÍCIO DA LÓGICA DE EXPORTAÇÃO (streaming, sem montar o CSV em memória)
+            data_hora_agora = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            nome_arquivo = f"relatorio_auditoria_canais_{data_hora_agora}.csv"
 
-            mensagens_queryset = mensagens_queryset.order_by(
-                'canal__nome', 'data_envio'
-            ).select_related(
-                'canal', 'autor', 'canal__grupo', 'canal__grupo__auth_group'
+            response = StreamingHttpResponse(
+                exportacao.stream_csv(mensagens_queryset),
+                content_type='text/csv'
             )
-
-            # Iteração e escrita no CSV
-            for mensagem in mensagens_queryset:
-                try:
-                    nome_grupo = mensagem.canal.grupo.auth_group.name
-                except AttributeError:
-                    nome_grupo = "N/A (Grupo Inexistente)"
-
-                writer.writerow([
-                    mensagem.pk,
-                    mensagem.data_envio.strftime("%Y-%m-%d %H:%M:%S"),
-                    mensagem.canal.nome,
-                    nome_grupo,
-                    mensagem.autor.pk,
-                    mensagem.autor.username,
-                    mensagem.conteudo,
-                ])
-
+            response['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
             return response
         else:
             messages.error(request, _("Erro nos dados do formulário de período. Verifique as datas."))
@@ -142,6 +131,8 @@ exportar_mensagens_dos_canais_csv.short_description = _("Exportar Mensagens (Per
 @admin.register(Canal)
 class CanalAdmin(admin.ModelAdmin):
     list_display = ('nome', 'grupo_nome', 'criador_nome', 'ativo', 'criado_em')
+    list_select_related = ('grupo__auth_group', 'criador')
+    orcamento_queries = 5
     list_filter = (
         'ativo',
         'criado_em',
@@ -177,6 +168,30 @@ class CanalAdmin(admin.ModelAdmin):
             return tuple(fields)  # Retorna como tupla
         return fields
 
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path(
+                'exportacoes/<str:nome_arquivo>/',
+                self.admin_site.admin_view(self.baixar_exportacao_view),
+                name='mensagens_canal_exportacao',
+            ),
+        ]
+        return custom_urls + urls
+
+    def baixar_exportacao_view(self, request, nome_arquivo):
+        """Entrega um arquivo gerado pela exportação em segundo plano (Celery)."""
+        if not self.has_view_permission(request):
+            raise Http404
+        if not exportacao.arquivo_valido(nome_arquivo):
+            raise Http404
+        return FileResponse(
+            exportacao.storage_exportacoes().open(nome_arquivo, 'rb'),
+            as_attachment=True,
+            filename=nome_arquivo,
+            content_type='application/gzip',
+        )
+
     def save_model(self, request, obj, form, change):
         if not change and not obj.criador:
             obj.criador = request.user
@@ -206,7 +221,13 @@ class CanalAdmin(admin.ModelAdmin):
 @admin.register(Mensagem)
 class MensagemAdmin(admin.ModelAdmin):
     list_display = ('autor_nome', 'canal_nome', 'conteudo_preview', 'data_envio')
-    list_filter = ('canal', 'data_envio', 'autor')
+    list_select_related = ('canal', 'autor')
+    list_filter = (
+        ('canal', filtro_com_relacoes('grupo__auth_group')),
+        'data_envio',
+        ('autor', filtro_com_relacoes(*RELACOES_REGISTRO_USUARIO)),
+    )
+    orcamento_queries = 9
     search_fields = ('autor__username', 'conteudo', 'canal__nome')
     date_hierarchy = 'data_envio'
     readonly_fields = ('autor', 'data_envio')
@@ -240,7 +261,9 @@ class MensagemAdmin(admin.ModelAdmin):
 @admin.register(UltimaLeituraUsuario)
 class UltimaLeituraUsuarioAdmin(admin.ModelAdmin):
     list_display = ('usuario', 'canal', 'data_leitura')
-    list_filter = ('canal', 'data_leitura')
+    list_select_related = (*relacoes_usuario('usuario'), 'canal__grupo__auth_group')
+    list_filter = (('canal', filtro_com_relacoes('grupo__auth_group')), 'data_leitura')
+    orcamento_queries = 8
     search_fields = ('usuario__username', 'canal__nome')
     date_hierarchy = 'data_leitura'
     raw_id_fields = ('usuario', 'canal')
\ No newline at end of file
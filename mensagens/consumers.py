@@ -1,13 +1,17 @@
 import json
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from datetime import datetime
+from redis.exceptions import RedisError
 
 # Importa os modelos necessários
-from .models import Canal, Mensagem
+from .models import Canal, Mensagem, UltimaLeituraUsuario
+from . import notificacoes, presenca
 # Importa Grupo para validação de membros.
 from users.models import Grupo
+from core import metricas
 
 # Obtém o modelo CustomUser (users.CustomUser)
 CustomUser = get_user_model()
@@ -17,8 +21,10 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
     """
     Gerencia conexões WebSocket para um canal de chat específico.
     Realiza a validação de membro do grupo e o salvamento de mensagens.
-    **ADICIONADO**: Eventos de entrada e saída de membros.
+    A presença dos membros fica no registro Redis de mensagens/presenca.py.
     """
+    # Queries por handler, com o handshake (sessão e usuário) no connect (core/orcamento.py)
+    orcamento_queries = {'connect': 3, 'receive_json': 2, 'disconnect': 3}
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -26,6 +32,7 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
         self.canal_group_name = None
         self.user = None
         self.canal_obj = None
+        self.presenca_info = None
 
     # ======================================================================
     # Métodos Auxiliares Assíncronos (Database Access)
@@ -82,6 +89,14 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
             'user_id': str(user.id),
         }
 
+    @database_sync_to_async
+    def registrar_leitura(self, canal, user):
+        """
+        Atualiza UltimaLeituraUsuario ao sair do chat: as mensagens vistas ao vivo
+        não contam como não lidas se os contadores forem recarregados do banco.
+        """
+        UltimaLeituraUsuario.objects.update_or_create(usuario=user, canal=canal)
+
     # ======================================================================
     # Métodos de Conexão WebSocket
     # ======================================================================
@@ -110,42 +125,36 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
                 self.channel_name
             )
             await self.accept()
+            metricas.websocket_aberto(self)
             print(f"WS CONNECTION ACCEPTED for user {self.user.username} on canal {self.canal_id}")
 
-            # 2. **NOVO:** Envia o evento de 'user_join' para o grupo
+            # 2. Registra esta conexão no registro de presença (Redis).
+            # A entrada não é anunciada aqui: o grupo recebe um diff agregado
+            # (presence.diff) depois da janela de debounce.
             user_display_name = await self.get_user_display_name(self.user)
+            self.presenca_info = {
+                'user_id': str(self.user.id),
+                'username': self.user.username,
+                'display_name': user_display_name,
+                'initials': self.user.username[0].upper(),
+            }
+            await presenca.registrar_conexao(self.canal_id, self.channel_name, self.presenca_info)
 
-            await self.channel_layer.group_send(
-                self.canal_group_name,
-                {
-                    'type': 'user.status',  # Novo handler
-                    'action': 'join',
-                    'user_id': str(self.user.id),
-                    'username': self.user.username,
-                    'display_name': user_display_name,
-                    'initials': self.user.username[0].upper(),
-                }
-            )
+            # 3. O próprio cliente recebe a lista completa de quem está online.
+            await self.send_presence_state()
+            await presenca.agendar_diff(self.channel_layer, self.canal_id, self.canal_group_name)
 
     async def disconnect(self, close_code):
         """
         Chamado quando o WebSocket se desconecta.
-        Remove o usuário do grupo e envia evento de saída.
+        Remove a conexão do registro de presença e sai do grupo.
         """
-        if self.canal_group_name and self.user and self.user.is_authenticated:
-            # 1. Envia o evento de 'user_leave' para o grupo
-            user_display_name = await self.get_user_display_name(self.user)
-
-            await self.channel_layer.group_send(
-                self.canal_group_name,
-                {
-                    'type': 'user.status',  # Novo handler
-                    'action': 'leave',
-                    'user_id': str(self.user.id),
-                    'username': self.user.username,
-                    'display_name': user_display_name,
-                }
-            )
+        metricas.websocket_fechado(self)
+        if self.canal_group_name and self.user and self.user.is_authenticated and self.canal_obj:
+            # 1. Remove só esta conexão: outras abas do usuário continuam online.
+            await presenca.remover_conexao(self.canal_id, str(self.user.id), self.channel_name)
+            await presenca.agendar_diff(self.channel_layer, self.canal_id, self.canal_group_name)
+            await self.registrar_leitura(self.canal_obj, self.user)
 
             # 2. Remove o usuário do grupo
             await self.channel_layer.group_discard(
@@ -154,6 +163,16 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
             )
             print(f"WS DISCONNECTED for user {self.user.username}")
 
+    async def send_presence_state(self):
+        """ Envia ao cliente o snapshot dos usuários online no canal. """
+        online = await presenca.usuarios_online(self.canal_id)
+        await self.send_json({
+            'type': 'presence_state',
+            'online': list(online.values()),
+            # O cliente usa este intervalo para o heartbeat (folga de 3x sobre o TTL).
+            'heartbeat': max(settings.CHAT_PRESENCA_TTL // 3, 1),
+        })
+
     async def receive_json(self, content, **kwargs):
         """
         Chamado quando uma mensagem JSON é recebida do WebSocket (do cliente).
@@ -162,6 +181,24 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
         message_type = content.get("type", "message")
         message_content = content.get("message", "").strip()
 
+        if message_type == "heartbeat" and self.canal_obj:
+            # Renova a conexão; se ela já tinha expirado (ex: aba suspensa), registra de novo.
+            renovada, expiradas = await presenca.renovar_conexao(
+                self.canal_id, str(self.user.id), self.channel_name
+            )
+            if not renovada:
+                await presenca.registrar_conexao(self.canal_id, self.channel_name, self.presenca_info)
+            # Conexões de outros membros que pararam de bater (worker morto) só
+            # saem do grupo por um diff: o heartbeat de quem segue online o agenda.
+            if not renovada or expiradas:
+                await presenca.agendar_diff(self.channel_layer, self.canal_id, self.canal_group_name)
+            return
+
+        if message_type == "presence" and self.canal_obj:
+            # Consulta de quem está online, sem depender de eventos anteriores.
+            await self.send_presence_state()
+            return
+
         if message_type == "message" and message_content and self.canal_obj:
             # 1. Salva a mensagem no banco de dados
             message_data = await self.save_message(
@@ -176,6 +213,15 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
                     'text': message_data,
                 }
             )
+
+            # 3. Incrementa os não lidos de quem não está com o chat aberto
+            try:
+                online = await presenca.usuarios_online(self.canal_id)
+            except RedisError:
+                online = {}  # Os contadores também dependem do Redis (ver notificacoes.py)
+            await notificacoes.notificar_mensagem_canal(
+                self.channel_layer, self.canal_obj, self.user.id, ignorar=online.keys()
+            )
         elif not self.canal_obj:
             print("ERROR: Mensagem recebida sem canal_obj configurado.")
 
@@ -192,19 +238,71 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
         message_to_send['type'] = 'chat_message'
         await self.send_json(message_to_send)
 
-    async def user_status(self, event):
+    async def presence_diff(self, event):
         """
-        **NOVO**
-        Chamado quando um evento user_join ou user_leave é recebido do grupo.
-        Envia o status do usuário (JSON) de volta ao cliente.
+        Chamado quando o diff agregado de presença é publicado no grupo.
+        Envia ao cliente quem entrou e quem saiu desde o último diff.
         """
-        # Garante que apenas o tipo e os dados relevantes sejam enviados
-        payload = {
-            'type': f'user_{event["action"]}',  # Será 'user_join' ou 'user_leave'
-            'user_id': event['user_id'],
-            'username': event['username'],
-            'display_name': event['display_name'],
-            # Inclui iniciais apenas no join (para renderização)
-            'initials': event.get('initials'),
-        }
-        await self.send_json(payload)
\ No newline at end of file
+        await self.send_json({
+            'type': 'presence_diff',
+            'entraram': event['entraram'],
+            'sairam': event['sairam'],
+        })
+
+
+class NotificacaoConsumer(AsyncJsonWebsocketConsumer):
+    """
+    WebSocket de notificações do usuário (um por aba, em todas as páginas).
+    Entra no grupo 'user_<id>' e recebe os totais de não lidas por canal/tópico.
+    """
+    # connect com o HASH frio: usuário + não lidas por canal + por tópico de suporte
+    orcamento_queries = {'connect': 3}
+
+    async def connect(self):
+        self.user = self.scope["user"]
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+
+        self.user_group_name = notificacoes.grupo_usuario(self.user.id)
+        await self.channel_layer.group_add(self.user_group_name, self.channel_name)
+        await self.accept()
+        metricas.websocket_aberto(self)
+
+        # Snapshot inicial: o cliente monta os badges sem esperar eventos.
+        await self.send_json({
+            'type': 'notificacoes_estado',
+            'contagens': await notificacoes.contagens_usuario_async(self.user),
+        })
+
+    async def disconnect(self, close_code):
+        metricas.websocket_fechado(self)
+        if getattr(self, 'user_group_name', None):
+            await self.channel_layer.group_discard(self.user_group_name, self.channel_name)
+
+    async def notificacao_delta(self, event):
+        """ Novo total de não lidas de um canal ou tópico. """
+        await self.send_json({
+            'type': 'notificacao',
+            'chave': event['chave'],
+            'total': event['total'],
+        })
+
+    async def notificacao_aviso(self, event):
+        """ Aviso avulso com link (ex: exportação de mensagens concluída). """
+        await self.send_json({
+            'type': 'aviso',
+            'mensagem': event['mensagem'],
+            'url': event.get('url'),
+        })
+
+    async def notificacao_progresso(self, event):
+        """ Progresso de uma tarefa em segundo plano (ex: importação de alunos). """
+        await self.send_json({
+            'type': 'progresso',
+            'tarefa': event['tarefa'],
+            'feitos': event['feitos'],
+            'total': event['total'],
+            'mensagem': event.get('mensagem', ''),
+            'url': event.get('url'),
+        })
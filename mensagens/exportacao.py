@@ -0,0 +1,171 @@
+import csv
+import gzip
+import io
+import itertools
+import os
+import re
+import secrets
+import tempfile
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from .models import Mensagem
+
+
+# ==============================================================================
+# EXPORTAÇÃO CSV DE MENSAGENS (Auditoria)
+# ==============================================================================
+# Usada pela ação do admin (streaming) e pela task do Celery (arquivo gzip).
+# As linhas saem de values_list + iterator(): nenhum objeto do ORM é montado e,
+# no Postgres, o iterator usa cursor do lado do servidor (lotes de CHUNK_SIZE).
+#
+# No Daphne, um StreamingHttpResponse com iterador síncrono é consumido
+# inteiro (sync_to_async(list)) antes do envio: o stream do admin é um
+# iterador assíncrono que busca um lote por vez numa thread.
+#
+# Os arquivos da task ficam em EXPORTACOES_ROOT, fora do MEDIA_ROOT, com um
+# token aleatório no nome: só a view do admin (staff) os entrega.
+
+CHUNK_SIZE = 2000
+NOME_ARQUIVO = re.compile(r'relatorio_auditoria_canais_\d{8}_\d{6}_[0-9a-f]{32}\.csv\.gz')
+
+CAMPOS = (
+    'pk',
+    'data_envio',
+    'canal__nome',
+    'canal__grupo__auth_group__name',
+    'autor_id',
+    'autor__username',
+    'conteudo',
+)
+
+
+class Echo:
+    """Pseudo-buffer para o csv.writer: devolve a linha em vez de guardá-la."""
+
+    def write(self, value):
+        return value
+
+
+def novo_writer(buffer):
+    # Ponto e vírgula (;) como delimitador para compatibilidade com Excel em pt-BR
+    return csv.writer(buffer, delimiter=';', quoting=csv.QUOTE_ALL)
+
+
+def cabecalho():
+    return [
+        _('ID Mensagem'), _('Data/Hora de Envio'), _('Canal'),
+        _('Grupo Associado'), _('ID Autor'), _('Autor (Username)'), _('Conteúdo')
+    ]
+
+
+def mensagens_do_periodo(canal_ids, data_inicial=None, data_final=None):
+    """QuerySet (values_list) das mensagens dos canais no período, já ordenado."""
+    mensagens_queryset = Mensagem.objects.filter(canal_id__in=canal_ids)
+
+    if data_inicial:
+        mensagens_queryset = mensagens_queryset.filter(data_envio__date__gte=data_inicial)
+
+    if data_final:
+        mensagens_queryset = mensagens_queryset.filter(data_envio__date__lte=data_final)
+
+    return mensagens_queryset.order_by('canal__nome', 'data_envio').values_list(*CAMPOS)
+
+
+def contar_ate(queryset, limite):
+    """
+    Conta as linhas parando em limite + 1: basta saber se a exportação cabe
+    na resposta síncrona, sem varrer o período inteiro.
+    """
+    return queryset.order_by()[:limite + 1].count()
+
+
+def linhas(queryset):
+    """Gera as linhas do CSV (sem cabeçalho) como listas de valores."""
+    for pk, data_envio, canal_nome, nome_grupo, autor_id, autor_username, conteudo in queryset.iterator(
+            chunk_size=CHUNK_SIZE):
+        yield [
+            pk,
+            data_envio.strftime("%Y-%m-%d %H:%M:%S"),
+            canal_nome,
+            nome_grupo or "N/A (Grupo Inexistente)",
+            autor_id,
+            autor_username,
+            conteudo,
+        ]
+
+
+async def stream_csv(queryset):
+    """Gera o CSV em blocos de CHUNK_SIZE linhas para o StreamingHttpResponse (ASGI)."""
+    writer = novo_writer(Echo())
+    yield writer.writerow(cabecalho())
+
+    # O cursor fica na thread do banco da requisição (thread_sensitive)
+    gerador = linhas(queryset)
+    proximo_lote = sync_to_async(lambda: list(itertools.islice(gerador, CHUNK_SIZE)))
+    try:
+        while lote := await proximo_lote():
+            yield ''.join(writer.writerow(linha) for linha in lote)
+    finally:
+        await sync_to_async(gerador.close)()
+
+
+def storage_exportacoes():
+    # Sem base_url: o storage não tem URL pública
+    return FileSystemStorage(location=settings.EXPORTACOES_ROOT)
+
+
+def novo_nome_arquivo():
+    data_hora_agora = timezone.localtime().strftime("%Y%m%d_%H%M%S")
+    return f"relatorio_auditoria_canais_{data_hora_agora}_{secrets.token_hex(16)}.csv.gz"
+
+
+def arquivo_valido(nome_arquivo):
+    """O nome segue o padrão da task e aponta para um arquivo regular do storage."""
+    if not NOME_ARQUIVO.fullmatch(nome_arquivo):
+        return False
+    return os.path.isfile(storage_exportacoes().path(nome_arquivo))
+
+
+def limpar_exportacoes(validade=None):
+    """Apaga os arquivos gerados há mais de validade segundos. Retorna quantos apagou."""
+    storage = storage_exportacoes()
+    if not storage.exists(''):
+        return 0
+    limite = timezone.now() - timedelta(seconds=validade or settings.EXPORTACOES_VALIDADE)
+    apagados = 0
+    for nome in storage.listdir('')[1]:
+        if NOME_ARQUIVO.fullmatch(nome) and storage.get_modified_time(nome) < limite:
+            storage.delete(nome)
+            apagados += 1
+    return apagados
+
+
+def gravar_csv_gzip(queryset, nome_arquivo):
+    """
+    Grava o CSV comprimido em um arquivo temporário e o envia ao storage das
+    exportações. Retorna (nome no storage, total de linhas).
+    """
+    total = 0
+    with tempfile.TemporaryFile() as tmp:
+        with gzip.GzipFile(fileobj=tmp, mode='wb') as gz:
+            texto = io.TextIOWrapper(gz, encoding='utf-8', newline='')
+            writer = novo_writer(texto)
+            writer.writerow(cabecalho())
+            for linha in linhas(queryset):
+                writer.writerow(linha)
+                total += 1
+            texto.flush()
+            texto.detach()
+
+        tmp.seek(0)
+        nome_salvo = storage_exportacoes().save(nome_arquivo, File(tmp))
+
+    return nome_salvo, total
@@ -0,0 +1,279 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from redis.exceptions import RedisError
+
+from config.redis_conf import get_redis, get_redis_async
+
+logger = logging.getLogger(__name__)
+
+
+# ==============================================================================
+# CONTADORES DE NÃO LIDAS (Redis)
+# ==============================================================================
+# Chaves:
+#   naolidas:usuario:<user_id>   HASH  "canal:<id>" / "suporte:<topico_id>" -> total não lido
+#   membros:grupo:<auth_group_id> SET  ids dos usuários do grupo (cache para o push)
+#
+# O caminho de envio (ChatConsumer, resposta do suporte) só toca o Redis: os
+# membros do canal vêm do SET em cache, que é invalidado pelo m2m_changed de
+# CustomUser.groups (ver signals.py). O Postgres só é consultado quando o cache
+# está frio ou quando o HASH do usuário ainda não foi carregado.
+#
+# Cada usuário recebe os deltas no grupo do Channels 'user_<id>'
+# (NotificacaoConsumer em consumers.py).
+#
+# As funções síncronas são chamadas por views comuns (chat, suporte,
+# dashboard): com o Redis fora do ar, o contador e o push ficam para depois
+# (RedisError só vai para o log) e a leitura cai no cálculo pelo banco.
+
+CAMPO_CARREGADO = '_carregado'
+TTL_MEMBROS = 60 * 60 * 24
+
+
+def chave_usuario(user_id):
+    return f'naolidas:usuario:{user_id}'
+
+
+def chave_membros(auth_group_id):
+    return f'membros:grupo:{auth_group_id}'
+
+
+def grupo_usuario(user_id):
+    """Nome do grupo do Channels que recebe as notificações do usuário."""
+    return f'user_{user_id}'
+
+
+def _limpar(contagens):
+    """Remove o marcador interno e converte os totais para int."""
+    return {
+        chave: int(total)
+        for chave, total in contagens.items()
+        if chave != CAMPO_CARREGADO and int(total) > 0
+    }
+
+
+# ==============================================================================
+# MEMBROS DO GRUPO (cache)
+# ==============================================================================
+
+def _carregar_membros_db(auth_group_id):
+    from users.models import CustomUser
+    ids = [
+        str(user_id) for user_id in
+        CustomUser.objects.filter(groups__id=auth_group_id).values_list('id', flat=True)
+    ]
+    if ids:
+        r = get_redis()
+        with r.pipeline(transaction=True) as pipe:
+            pipe.delete(chave_membros(auth_group_id))
+            pipe.sadd(chave_membros(auth_group_id), *ids)
+            pipe.expire(chave_membros(auth_group_id), TTL_MEMBROS)
+            pipe.execute()
+    return set(ids)
+
+
+async def membros_grupo(auth_group_id):
+    membros = await get_redis_async().smembers(chave_membros(auth_group_id))
+    if not membros:
+        membros = await database_sync_to_async(_carregar_membros_db)(auth_group_id)
+    return membros
+
+
+def invalidar_membros(auth_group_ids):
+    chaves = [chave_membros(group_id) for group_id in auth_group_ids]
+    if not chaves:
+        return
+    try:
+        get_redis().delete(*chaves)
+    except RedisError as e:
+        # Não impede o cadastro/vínculo: o SET expira sozinho (TTL_MEMBROS).
+        logger.warning(f"Falha ao invalidar cache de membros {chaves}: {e}")
+
+
+# ==============================================================================
+# ENVIO (deltas para o grupo user_<id>)
+# ==============================================================================
+
+async def notificar_mensagem_canal(channel_layer, canal, autor_id, ignorar=()):
+    """
+    Incrementa o contador do canal para todos os membros, exceto o autor e
+    quem já está com o chat aberto (ignorar), e envia o novo total a cada um.
+    Com o Redis fora do ar a mensagem segue entregue: só os contadores ficam
+    para trás (RedisError vai para o log, como nas funções síncronas).
+    """
+    chave = f'canal:{canal.id}'
+    try:
+        membros = await membros_grupo(canal.grupo.auth_group_id)
+        destinatarios = sorted(membros - {str(autor_id)} - set(ignorar))
+        if not destinatarios:
+            return
+
+        async with get_redis_async().pipeline(transaction=False) as pipe:
+            for user_id in destinatarios:
+                pipe.hincrby(chave_usuario(user_id), chave, 1)
+            totais = await pipe.execute()
+
+        for user_id, total in zip(destinatarios, totais):
+            await channel_layer.group_send(
+                grupo_usuario(user_id),
+                {
+                    'type': 'notificacao.delta',
+                    'chave': chave,
+                    'total': total,
+                }
+            )
+    except RedisError as e:
+        logger.warning(f"Contadores do {chave} não atualizados: {e}")
+
+
+def notificar_usuario(user_id, chave, delta=1):
+    """Versão síncrona (views): incrementa um contador e envia o novo total."""
+    try:
+        total = get_redis().hincrby(chave_usuario(user_id), chave, delta)
+    except RedisError as e:
+        logger.warning(f"Contador {chave} do usuário {user_id} não incrementado: {e}")
+        return
+    _enviar_total(user_id, chave, total)
+
+
+def marcar_lido(user_id, chave):
+    """Zera um contador (canal ou tópico aberto) e avisa as outras abas do usuário."""
+    try:
+        removidos = get_redis().hdel(chave_usuario(user_id), chave)
+    except RedisError as e:
+        logger.warning(f"Contador {chave} do usuário {user_id} não zerado: {e}")
+        return
+    if removidos:
+        _enviar_total(user_id, chave, 0)
+
+
+def avisar_usuario(user_id, mensagem, url=None):
+    """Envia um aviso avulso (ex: exportação pronta) para as abas abertas do usuário."""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    async_to_sync(channel_layer.group_send)(
+        grupo_usuario(user_id),
+        {
+            'type': 'notificacao.aviso',
+            'mensagem': mensagem,
+            'url': url,
+        }
+    )
+
+
+def enviar_progresso(user_id, tarefa, feitos, total, mensagem='', url=None):
+    """Progresso de uma tarefa em segundo plano (ex: importação de alunos) para as abas do usuário."""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    async_to_sync(channel_layer.group_send)(
+        grupo_usuario(user_id),
+        {
+            'type': 'notificacao.progresso',
+            'tarefa': tarefa,
+            'feitos': feitos,
+            'total': total,
+            'mensagem': mensagem,
+            'url': url,
+        }
+    )
+
+
+def _enviar_total(user_id, chave, total):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(
+            grupo_usuario(user_id),
+            {
+                'type': 'notificacao.delta',
+                'chave': chave,
+                'total': total,
+            }
+        )
+    except RedisError as e:
+        logger.warning(f"Push do contador {chave} para o usuário {user_id} não enviado: {e}")
+
+
+# ==============================================================================
+# LEITURA (snapshot do usuário)
+# ==============================================================================
+
+def _contagens_db(user):
+    """
+    Calcula os não lidos por canal (UltimaLeituraUsuario) e por tópico de
+    suporte do usuário (Topico.criador_leu_em), uma query para cada (usado
+    para carregar o HASH do usuário no Redis).
+    """
+    from suporte.models import Topico
+    from .models import Canal, UltimaLeituraUsuario
+
+    ultima_leitura = UltimaLeituraUsuario.objects.filter(
+        usuario=user, canal=OuterRef('pk')
+    ).values('data_leitura')[:1]
+
+    canais = Canal.objects.filter(
+        grupo__auth_group__in=user.groups.all()
+    ).annotate(
+        ultima_leitura=Subquery(ultima_leitura)
+    ).annotate(
+        nao_lidas=Count(
+            'mensagens',
+            filter=(
+                Q(ultima_leitura__isnull=True) | Q(mensagens__data_envio__gt=F('ultima_leitura'))
+            ) & ~Q(mensagens__autor=user)
+        )
+    ).values_list('id', 'nao_lidas')
+
+    # Respostas de outros autores (equipe de suporte) depois da última leitura
+    topicos = Topico.objects.filter(criador=user).annotate(
+        nao_lidas=Count(
+            'mensagens',
+            filter=(
+                Q(criador_leu_em__isnull=True) | Q(mensagens__timestamp__gt=F('criador_leu_em'))
+            ) & ~Q(mensagens__autor=user)
+        )
+    ).values_list('id', 'nao_lidas')
+
+    return {
+        **{f'canal:{canal_id}': total for canal_id, total in canais if total},
+        **{f'suporte:{topico_id}': total for topico_id, total in topicos if total},
+    }
+
+
+def contagens_usuario(user):
+    """Retorna {chave: total} do usuário, carregando do banco se o HASH não existir."""
+    r = get_redis()
+    try:
+        contagens = r.hgetall(chave_usuario(user.id))
+    except RedisError as e:
+        logger.warning(f"Contagens do usuário {user.id} calculadas pelo banco: {e}")
+        return _contagens_db(user)
+    if CAMPO_CARREGADO in contagens:
+        return _limpar(contagens)
+
+    contagens = _contagens_db(user)
+    try:
+        with r.pipeline(transaction=True) as pipe:
+            pipe.delete(chave_usuario(user.id))
+            pipe.hset(chave_usuario(user.id), mapping={CAMPO_CARREGADO: 1, **contagens})
+            pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Contagens do usuário {user.id} não gravadas no Redis: {e}")
+    return contagens
+
+
+async def contagens_usuario_async(user):
+    try:
+        contagens = await get_redis_async().hgetall(chave_usuario(user.id))
+    except RedisError:
+        contagens = {}
+    if CAMPO_CARREGADO in contagens:
+        return _limpar(contagens)
+    return await database_sync_to_async(contagens_usuario)(user)
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import time
+
+from django.conf import settings
+
+from config.redis_conf import get_redis_async
+
+
+# ==============================================================================
+# REGISTRO DE PRESENÇA DO CHAT (Redis)
+# ==============================================================================
+# Chaves por canal:
+#   presenca:canal:<id>:conexoes   ZSET  "<user_id>|<channel_name>" -> último heartbeat
+#   presenca:canal:<id>:usuarios   HASH  user_id -> JSON com os dados de exibição
+#   presenca:canal:<id>:anunciados SET   user_ids já anunciados como online ao grupo
+#   presenca:canal:<id>:flush      STR   trava do debounce (apenas um diff agendado por janela)
+#
+# Cada socket aberto é uma entrada no ZSET, então o número de entradas de um
+# usuário funciona como refcount: várias abas ou reconexões não geram eventos,
+# só a primeira conexão e a última desconexão mudam o estado. Conexões cujo
+# heartbeat expirou (worker morto, rede móvel caiu) não geram desconexão: cada
+# heartbeat do canal confere se há alguma e, se houver, agenda um diff, que as
+# descarta na leitura e anuncia a saída.
+
+PREFIXO = 'presenca:canal'
+
+
+def _chaves(canal_id):
+    base = f'{PREFIXO}:{canal_id}'
+    return f'{base}:conexoes', f'{base}:usuarios', f'{base}:anunciados', f'{base}:flush'
+
+
+def _membro(user_id, channel_name):
+    return f'{user_id}|{channel_name}'
+
+
+def _ttl_chaves():
+    # As chaves somem sozinhas se o canal ficar sem atividade.
+    return settings.CHAT_PRESENCA_TTL * 10
+
+
+async def registrar_conexao(canal_id, channel_name, info):
+    """Registra um socket do usuário no canal (ou renova o heartbeat dele)."""
+    conexoes, usuarios, _, _ = _chaves(canal_id)
+    r = get_redis_async()
+    async with r.pipeline(transaction=True) as pipe:
+        pipe.zadd(conexoes, {_membro(info['user_id'], channel_name): time.time()})
+        pipe.hset(usuarios, info['user_id'], json.dumps(info))
+        pipe.expire(conexoes, _ttl_chaves())
+        pipe.expire(usuarios, _ttl_chaves())
+        await pipe.execute()
+
+
+async def renovar_conexao(canal_id, user_id, channel_name):
+    """
+    Heartbeat: atualiza o horário da conexão, sem recriar uma já expirada.
+    Retorna (renovada, expiradas): renovada False indica que a conexão já tinha
+    expirado e precisa ser registrada de novo; expiradas é o número de conexões
+    do canal com o heartbeat vencido, ainda não descartadas por um diff.
+    """
+    conexoes, usuarios, _, _ = _chaves(canal_id)
+    r = get_redis_async()
+    agora = time.time()
+    async with r.pipeline(transaction=True) as pipe:
+        pipe.zadd(conexoes, {_membro(user_id, channel_name): agora}, xx=True, ch=True)
+        pipe.zcount(conexoes, '-inf', agora - settings.CHAT_PRESENCA_TTL)
+        pipe.expire(conexoes, _ttl_chaves())
+        pipe.expire(usuarios, _ttl_chaves())
+        renovada, expiradas, _, _ = await pipe.execute()
+    return bool(renovada), expiradas
+
+
+async def remover_conexao(canal_id, user_id, channel_name):
+    """Remove o socket do registro (as demais abas do usuário continuam contando)."""
+    conexoes, _, _, _ = _chaves(canal_id)
+    await get_redis_async().zrem(conexoes, _membro(user_id, channel_name))
+
+
+async def usuarios_online(canal_id):
+    """
+    Retorna {user_id: info} dos usuários com ao menos uma conexão viva no canal.
+    Descarta as conexões cujo heartbeat expirou.
+    """
+    conexoes, usuarios, _, _ = _chaves(canal_id)
+    r = get_redis_async()
+    limite = time.time() - settings.CHAT_PRESENCA_TTL
+
+    async with r.pipeline(transaction=True) as pipe:
+        pipe.zremrangebyscore(conexoes, '-inf', limite)
+        pipe.zrange(conexoes, 0, -1)
+        _, membros = await pipe.execute()
+
+    ids = sorted({membro.split('|', 1)[0] for membro in membros})
+    if not ids:
+        return {}
+
+    infos = await r.hmget(usuarios, ids)
+    return {
+        user_id: json.loads(info) if info else {'user_id': user_id}
+        for user_id, info in zip(ids, infos)
+    }
+
+
+async def calcular_diff(canal_id):
+    """
+    Compara os usuários online agora com os já anunciados ao grupo e atualiza
+    o conjunto anunciado. Entradas e saídas que se anulam dentro da janela de
+    debounce (reload, troca de rede) não aparecem no diff.
+    """
+    _, _, anunciados_key, _ = _chaves(canal_id)
+    r = get_redis_async()
+
+    online = await usuarios_online(canal_id)
+    anunciados = await r.smembers(anunciados_key)
+
+    entraram = [online[user_id] for user_id in sorted(online.keys() - anunciados)]
+    sairam = sorted(anunciados - online.keys())
+
+    if entraram or sairam:
+        async with r.pipeline(transaction=True) as pipe:
+            pipe.delete(anunciados_key)
+            if online:
+                pipe.sadd(anunciados_key, *online.keys())
+                pipe.expire(anunciados_key, _ttl_chaves())
+            await pipe.execute()
+
+    return entraram, sairam
+
+
+async def agendar_diff(channel_layer, canal_id, group_name):
+    """
+    Agenda a publicação de um diff agregado para o grupo do canal.
+    Só um diff fica agendado por janela: quem não obtém a trava sabe que o
+    diff pendente será calculado depois da sua mudança e a incluirá.
+    """
+    _, _, _, flush_key = _chaves(canal_id)
+    debounce = settings.CHAT_PRESENCA_DEBOUNCE
+    reservado = await get_redis_async().set(flush_key, '1', nx=True, ex=debounce * 5)
+    if reservado:
+        # A tarefa não referencia o consumer: ela precisa sobreviver ao socket que saiu.
+        asyncio.ensure_future(_publicar_diff(channel_layer, canal_id, group_name, debounce))
+
+
+async def _publicar_diff(channel_layer, canal_id, group_name, debounce):
+    _, _, _, flush_key = _chaves(canal_id)
+    await asyncio.sleep(debounce)
+
+    # Libera a trava ANTES de calcular: mudanças a partir daqui agendam outro diff.
+    await get_redis_async().delete(flush_key)
+    entraram, sairam = await calcular_diff(canal_id)
+
+    if entraram or sairam:
+        await channel_layer.group_send(
+            group_name,
+            {
+                'type': 'presence.diff',
+                'entraram': entraram,
+                'sairam': sairam,
+            }
+        )
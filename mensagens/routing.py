@@ -8,4 +8,7 @@ websocket_urlpatterns = [
     # Mapeia a URL /ws/chat/ID_DO_CANAL/ para o ChatConsumer.
     # O <canal_id> é capturado e passado como argumento no escopo do Consumer.
     re_path(r'ws/chat/(?P<canal_id>\d+)/$', consumers.ChatConsumer.as_asgi()),
+
+    # Notificações do usuário logado (badges de não lidas em todas as páginas).
+    re_path(r'ws/notificacoes/$', consumers.NotificacaoConsumer.as_asgi()),
 ]
\ No newline at end of file
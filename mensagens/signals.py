@@ -1,11 +1,13 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.core.exceptions import ObjectDoesNotExist
 
 # Importa o modelo de Grupo do app 'users'
-from users.models import Grupo
+from users.models import Grupo, CustomUser
+from users.grupos import membros_grupo_alterados
 # Importa o modelo de Canal do app 'mensagens'
 from .models import Canal
+from . import notificacoes
 
 @receiver(post_save, sender=Grupo)
 def criar_ou_atualizar_canal_chat(sender, instance, created, **kwargs):
@@ -62,4 +64,29 @@ def deletar_canal_chat(sender, instance, **kwargs):
         # Se o Canal já foi deletado (via CASCADE), apenas registra.
         print(f"SINAL: Canal de Chat não encontrado para exclusão (já deletado via CASCADE para o Grupo {instance.auth_group.name}).")
     except Exception as e:
-        print(f"SINAL ERRO: Falha ao tentar deletar Canal associado ao Grupo {instance.auth_group.name}: {e}")
\ No newline at end of file
+        print(f"SINAL ERRO: Falha ao tentar deletar Canal associado ao Grupo {instance.auth_group.name}: {e}")
+
+
+@receiver(m2m_changed, sender=CustomUser.groups.through)
+def invalidar_cache_membros(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Invalida o cache de membros (Redis) usado no envio das notificações de
+    não lidas quando usuários entram ou saem de um AuthGroup.
+    """
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    if reverse:
+        # instance é o AuthGroup: apenas o cache dele muda.
+        notificacoes.invalidar_membros([instance.pk])
+    elif action == 'pre_clear':
+        # No clear o pk_set não vem preenchido: usa os grupos atuais do usuário.
+        notificacoes.invalidar_membros(list(instance.groups.values_list('id', flat=True)))
+    else:
+        notificacoes.invalidar_membros(pk_set or [])
+
+
+@receiver(membros_grupo_alterados)
+def invalidar_cache_membros_em_massa(sender, auth_group_id, **kwargs):
+    """Mesma invalidação, para as operações em massa de users/grupos.py (uma por operação)."""
+    notificacoes.invalidar_membros([auth_group_id])
@@ -14,6 +14,7 @@ let messageInput = null;
 let messageSubmit = null;
 let sidebar = null;
 let sidebarToggle = null;
+let heartbeatTimer = null;
 
 /**
  * Scroll automático para o fim das mensagens
@@ -63,39 +64,47 @@ function createMessageElement(data, isMe) {
 }
 
 /**
- * Gerenciamento de Membros na Sidebar
+ * Presença na Sidebar
+ * Os membros já vêm renderizados pelo template; aqui só alternamos o indicador.
  */
-function updateMemberStatus(data, action) {
+function setMemberOnline(userId, online) {
     if (!sidebar) return;
-    const membersList = sidebar.querySelector('.overflow-y-auto');
-    if (!membersList) return;
+    const memberElem = sidebar.querySelector(`[data-user-id="${userId}"]`);
+    if (!memberElem) return;
+
+    const indicator = memberElem.querySelector('[data-presenca]');
+    if (!indicator) return;
+
+    indicator.dataset.presenca = online ? 'online' : 'offline';
+    const dot = indicator.querySelector('span');
+    if (dot) {
+        dot.classList.toggle('bg-green-500', online);
+        dot.classList.toggle('animate-pulse', online);
+        dot.classList.toggle('bg-gray-300', !online);
+    }
+    indicator.lastChild.textContent = online ? ' Online' : ' Offline';
+}
 
-    if (action === 'join') {
-        const existing = membersList.querySelector(`[data-user-id="${data.user_id}"]`);
-        if (!existing) {
-            const isMe = String(data.user_id) === String(currentUserId);
-            const memberDiv = document.createElement('div');
-            memberDiv.dataset.userId = data.user_id;
-            memberDiv.className = `flex items-center gap-3 p-2 rounded-lg transition-colors ${isMe ? 'bg-primary/10 border border-primary/20' : 'hover:bg-gray-50'}`;
-            memberDiv.innerHTML = `
-                <div class="w-10 h-10 rounded-full bg-verde-petroleo flex items-center justify-center text-white font-bold shrink-0 shadow-sm text-sm">
-                    ${(data.display_name || 'U')[0].toUpperCase()}
-                </div>
-                <div class="flex-grow min-w-0">
-                    <span class="block text-sm font-semibold text-text-main truncate">
-                        ${data.display_name} ${isMe ? '<span class="text-xs text-primary font-normal">(Você)</span>' : ''}
-                    </span>
-                    <span class="flex items-center gap-1.5 text-[10px] text-gray-400">
-                        <span class="w-2 h-2 rounded-full bg-green-500 animate-pulse"></span> Online
-                    </span>
-                </div>
-            `;
-            membersList.appendChild(memberDiv);
+function applyPresenceState(data) {
+    if (!sidebar) return;
+    const onlineIds = new Set((data.online || []).map(u => String(u.user_id)));
+    sidebar.querySelectorAll('[data-user-id]').forEach(elem => {
+        setMemberOnline(elem.dataset.userId, onlineIds.has(String(elem.dataset.userId)));
+    });
+
+    // Heartbeat mantém a conexão viva no registro de presença do servidor
+    if (heartbeatTimer) clearInterval(heartbeatTimer);
+    const intervalo = (data.heartbeat || 20) * 1000;
+    heartbeatTimer = setInterval(() => {
+        if (chatSocket && chatSocket.readyState === WebSocket.OPEN) {
+            chatSocket.send(JSON.stringify({ 'type': 'heartbeat' }));
         }
-    } else if (action === 'leave') {
-        const memberElem = membersList.querySelector(`[data-user-id="${data.user_id}"]`);
-        if (memberElem) memberElem.remove();
-    }
+    }, intervalo);
+}
+
+function applyPresenceDiff(data) {
+    (data.entraram || []).forEach(u => setMemberOnline(u.user_id, true));
+    (data.sairam || []).forEach(userId => setMemberOnline(userId, false));
 }
 
 /**
@@ -118,14 +127,15 @@ function connectWebSocket() {
             const msgElement = createMessageElement(data, isMe);
             chatMessagesList.appendChild(msgElement);
             scrollToBottom();
-        } else if (data.type === 'user_join') {
-            updateMemberStatus(data, 'join');
-        } else if (data.type === 'user_leave') {
-            updateMemberStatus(data, 'leave');
+        } else if (data.type === 'presence_state') {
+            applyPresenceState(data);
+        } else if (data.type === 'presence_diff') {
+            applyPresenceDiff(data);
         }
     };
 
     chatSocket.onclose = () => {
+        if (heartbeatTimer) clearInterval(heartbeatTimer);
         if (messageInput) {
             messageInput.disabled = true;
             messageInput.placeholder = "Conexão perdida. Recarregue a página.";
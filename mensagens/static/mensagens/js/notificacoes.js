@@ -0,0 +1,78 @@
+/**
+ * Arquivo: mensagens/js/notificacoes.js
+ * Badges de não lidas (chat e suporte) atualizados em tempo real via WebSocket.
+ * O servidor envia o snapshot ao conectar e depois apenas o novo total de cada chave.
+ */
+
+(function () {
+    const contagens = {};
+    let tentativas = 0;
+
+    function totalGeral() {
+        return Object.values(contagens).reduce((soma, total) => soma + total, 0);
+    }
+
+    function renderBadges() {
+        const total = totalGeral();
+        document.querySelectorAll('[data-notificacoes-badge]').forEach(badge => {
+            badge.textContent = total > 99 ? '99+' : String(total);
+            badge.classList.toggle('hidden', total === 0);
+        });
+
+        // Badges por canal/tópico (opcionais), ex: data-notificacao-chave="canal:3"
+        document.querySelectorAll('[data-notificacao-chave]').forEach(elem => {
+            const valor = contagens[elem.dataset.notificacaoChave] || 0;
+            elem.textContent = String(valor);
+            elem.classList.toggle('hidden', valor === 0);
+        });
+    }
+
+    function mostrarAviso(data) {
+        const aviso = document.createElement('div');
+        aviso.className = 'fixed bottom-4 right-4 z-50 max-w-sm p-4 rounded-lg border bg-blue-100 text-blue-800 border-blue-200 shadow-lg text-sm';
+        aviso.textContent = data.mensagem;
+        if (data.url) {
+            const link = document.createElement('a');
+            link.href = data.url;
+            link.className = 'block mt-2 font-bold underline';
+            link.textContent = 'Baixar';
+            aviso.appendChild(link);
+        }
+        aviso.addEventListener('click', () => aviso.remove());
+        document.body.appendChild(aviso);
+    }
+
+    function conectar() {
+        const protocol = window.location.protocol === "https:" ? "wss" : "ws";
+        const socket = new WebSocket(`${protocol}://${window.location.host}/ws/notificacoes/`);
+
+        socket.onopen = () => { tentativas = 0; };
+
+        socket.onmessage = function (e) {
+            const data = JSON.parse(e.data);
+
+            if (data.type === 'notificacoes_estado') {
+                Object.keys(contagens).forEach(chave => delete contagens[chave]);
+                Object.assign(contagens, data.contagens || {});
+            } else if (data.type === 'aviso') {
+                mostrarAviso(data);
+                return;
+            } else if (data.type === 'notificacao') {
+                if (data.total > 0) {
+                    contagens[data.chave] = data.total;
+                } else {
+                    delete contagens[data.chave];
+                }
+            }
+            renderBadges();
+        };
+
+        // Reconecta com backoff (o snapshot inicial ressincroniza os totais)
+        socket.onclose = () => {
+            tentativas += 1;
+            setTimeout(conectar, Math.min(30000, 1000 * 2 ** tentativas));
+        };
+    }
+
+    document.addEventListener('DOMContentLoaded', conectar);
+})();
@@ -0,0 +1,55 @@
+import datetime
+import logging
+
+from celery import shared_task
+from django.conf import settings
+from django.core.mail import send_mail
+from django.urls import reverse
+
+from . import exportacao
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def exportar_mensagens_csv_task(canal_ids, data_inicial, data_final, user_id, base_url):
+    """
+    Exportação de auditoria para períodos grandes: grava o CSV em gzip no storage
+    e avisa o admin (WebSocket de notificações + e-mail) com o link de download.
+    O arquivo expira em EXPORTACOES_VALIDADE (limpar_exportacoes_task).
+    """
+    from users.models import CustomUser
+    from .notificacoes import avisar_usuario
+
+    data_inicial = datetime.date.fromisoformat(data_inicial) if data_inicial else None
+    data_final = datetime.date.fromisoformat(data_final) if data_final else None
+
+    queryset = exportacao.mensagens_do_periodo(canal_ids, data_inicial, data_final)
+    nome_salvo, total = exportacao.gravar_csv_gzip(queryset, exportacao.novo_nome_arquivo())
+
+    url = base_url.rstrip('/') + reverse('admin:mensagens_canal_exportacao', args=[nome_salvo])
+    logger.info(f"Exportação de mensagens concluída: {nome_salvo} ({total} linhas)")
+
+    mensagem = f"A exportação de mensagens ({total} linhas) está pronta para download."
+    avisar_usuario(user_id, mensagem, url)
+
+    usuario = CustomUser.objects.filter(pk=user_id).only('email').first()
+    if usuario and usuario.email:
+        send_mail(
+            "Exportação de mensagens concluída",
+            f"{mensagem}\n\n{url}",
+            settings.DEFAULT_FROM_EMAIL,
+            [usuario.email],
+            fail_silently=True,
+        )
+
+    return nome_salvo
+
+
+@shared_task
+def limpar_exportacoes_task():
+    """Periódica (CELERY_BEAT_SCHEDULE): apaga as exportações vencidas."""
+    apagados = exportacao.limpar_exportacoes()
+    if apagados:
+        logger.info(f"Exportações de mensagens vencidas apagadas: {apagados}")
+    return apagados
@@ -1,3 +1,367 @@
-from django.test import TestCase
+import gzip
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import redis
+import redis.asyncio
+
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth.models import Group as AuthGroup
+from django.core.cache import cache
+from django.db import connections
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from config.redis_conf import get_redis, redis_disponivel
+from core import massa_dados
+from core.orcamento import OrcamentoQueriesMixin
+
+from . import exportacao, notificacoes, presenca, tasks
+from .consumers import ChatConsumer, NotificacaoConsumer
+from .models import Canal
+
+CACHE_LOCAL = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+CANAIS_EM_MEMORIA = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+# ==============================================================================
+# ORÇAMENTO DE QUERIES DOS CANAIS (core/orcamento.py)
+# ==============================================================================
+# Muitos canais com histórico longo e um usuário em todos eles.
+
+@override_settings(CACHES=CACHE_LOCAL)
+class OrcamentoCanaisTests(OrcamentoQueriesMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        grupos = massa_dados.criar_grupos(15)
+        cls.usuarios = massa_dados.criar_usuarios(10, grupos)
+        for canal in Canal.objects.all():
+            massa_dados.criar_mensagens(canal, cls.usuarios, 40)
+        cls.admin = massa_dados.criar_usuario('diretoria', is_staff=True, is_superuser=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_lista_de_canais(self):
+        self.entrar(self.usuarios[0])
+        response = self.assertOrcamentoDaUrl(reverse('mensagens:chat_list'))
+        # Os 15 grupos e o 'free', em que todo usuário entra no cadastro
+        self.assertEqual(len(response.context['canais']), Canal.objects.count())
+        self.assertTrue(all(canal.ultima_mensagem for canal in response.context['canais']))
+
+    def test_changelists_do_admin(self):
+        self.entrar(self.admin)
+        for modelo in ('canal', 'mensagem', 'ultimaleiturausuario'):
+            with self.subTest(modelo=modelo):
+                self.assertOrcamentoDaUrl(reverse(f'admin:mensagens_{modelo}_changelist'))
+
+
+# ==============================================================================
+# ORÇAMENTO DE QUERIES DOS CONSUMERS
+# ==============================================================================
+# O consumer roda no event loop de outra thread e o banco é acessado pelo
+# database_sync_to_async, que fecha as conexões antigas: por isso o
+# TransactionTestCase e a conexão da thread do teste nas medições.
+
+@skipUnless(redis_disponivel(), 'Redis indisponível')
+@override_settings(CACHES=CACHE_LOCAL, CHANNEL_LAYERS=CANAIS_EM_MEMORIA)
+class OrcamentoConsumersTests(OrcamentoQueriesMixin, TransactionTestCase):
+
+    def setUp(self):
+        from config.asgi import application
+
+        self.application = application
+        grupo = massa_dados.criar_grupos(1)[0]
+        self.usuarios = massa_dados.criar_usuarios(30, [grupo])
+        self.canal = Canal.objects.get(grupo=grupo)
+        massa_dados.criar_mensagens(self.canal, self.usuarios, 200)
+
+        # Estado do Redis de execuções anteriores (os ids se repetem entre testes)
+        get_redis().delete(
+            notificacoes.chave_membros(grupo.auth_group_id),
+            *presenca._chaves(self.canal.id),
+            *[notificacoes.chave_usuario(usuario.pk) for usuario in self.usuarios],
+        )
+        self.conexao = connections['default']
+
+    def comunicador(self, usuario, caminho):
+        cliente = self.entrar(usuario, self.client_class())
+        cookie = f'{settings.SESSION_COOKIE_NAME}={cliente.cookies[settings.SESSION_COOKIE_NAME].value}'
+        return WebsocketCommunicator(self.application, caminho, headers=[(b'cookie', cookie.encode())])
+
+    def test_chat(self):
+        autor, leitor = self.usuarios[:2]
+        chat = self.comunicador(autor, f'/ws/chat/{self.canal.id}/')
+        avisos = self.comunicador(leitor, '/ws/notificacoes/')
+
+        async def conversar():
+            with self.assertOrcamento(NotificacaoConsumer, 'connect', conexao=self.conexao):
+                conectado, _ = await avisos.connect()
+                estado = await avisos.receive_json_from()
+            self.assertTrue(conectado)
+            nao_lidas = estado['contagens'][f'canal:{self.canal.id}']
+
+            with self.assertOrcamento(ChatConsumer, 'connect', conexao=self.conexao):
+                conectado, _ = await chat.connect()
+                await chat.receive_json_from()  # presence_state
+            self.assertTrue(conectado)
+
+            # O ciclo termina quando o leitor recebe o novo total de não lidas
+            with self.assertOrcamento(ChatConsumer, 'receive_json', conexao=self.conexao):
+                await chat.send_json_to({'type': 'message', 'message': 'Reunião de pais na sexta'})
+                mensagem = await chat.receive_json_from()
+                aviso = await avisos.receive_json_from()
+            self.assertEqual(mensagem['conteudo'], 'Reunião de pais na sexta')
+            self.assertEqual(aviso['total'], nao_lidas + 1)
+
+            with self.assertOrcamento(ChatConsumer, 'disconnect', conexao=self.conexao):
+                await chat.disconnect()
+            await avisos.disconnect()
+
+        async_to_sync(conversar)()
+
+
+# ==============================================================================
+# RECARGA DOS CONTADORES PELO BANCO (notificacoes.contagens_usuario)
+# ==============================================================================
+
+@skipUnless(redis_disponivel(), 'Redis indisponível')
+@override_settings(CACHES=CACHE_LOCAL, CHANNEL_LAYERS=CANAIS_EM_MEMORIA)
+class RecargaContagensTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        from suporte.admin import grupo_suporte
+
+        grupo = massa_dados.criar_grupos(1)[0]
+        cls.leitor, autor = massa_dados.criar_usuarios(2, [grupo])
+        cls.canal = Canal.objects.get(grupo=grupo)
+        massa_dados.criar_mensagens(cls.canal, [autor], 3)
+        suporte = massa_dados.criar_usuario('atendente')
+        suporte.groups.add(AuthGroup.objects.create(name=grupo_suporte))
+        # Duas respostas do suporte e duas do próprio criador
+        cls.topico = massa_dados.criar_topicos(cls.leitor, 1, suporte)[0]
+
+    def setUp(self):
+        get_redis().delete(notificacoes.chave_usuario(self.leitor.pk))
+        self.addCleanup(get_redis().delete, notificacoes.chave_usuario(self.leitor.pk))
+
+    def recarregar(self):
+        # HASH expirado ou despejado pelo Redis
+        get_redis().delete(notificacoes.chave_usuario(self.leitor.pk))
+        return notificacoes.contagens_usuario(self.leitor)
+
+    def test_topicos_de_suporte_entram_na_recarga(self):
+        self.assertEqual(self.recarregar(), {f'canal:{self.canal.pk}': 3, f'suporte:{self.topico.pk}': 2})
+
+        self.client.force_login(self.leitor)
+        self.client.get(reverse('suporte:topico_detail', args=[self.topico.pk]))
+        self.assertEqual(self.recarregar(), {f'canal:{self.canal.pk}': 3})
+
+
+# ==============================================================================
+# PRESENÇA: CONEXÕES QUE PARARAM DE BATER (presenca.py)
+# ==============================================================================
+# O worker de um membro morre sem disconnect: a saída dele é anunciada no
+# primeiro heartbeat de quem continua online depois do TTL.
+
+@skipUnless(redis_disponivel(), 'Redis indisponível')
+@override_settings(CACHES=CACHE_LOCAL, CHANNEL_LAYERS=CANAIS_EM_MEMORIA, CHAT_PRESENCA_DEBOUNCE=1)
+class PresencaExpiradaTests(TransactionTestCase):
+
+    def setUp(self):
+        from config.asgi import application
+
+        self.application = application
+        grupo = massa_dados.criar_grupos(1)[0]
+        self.usuarios = massa_dados.criar_usuarios(2, [grupo])
+        self.canal = Canal.objects.get(grupo=grupo)
+        get_redis().delete(*presenca._chaves(self.canal.id))
+        self.addCleanup(get_redis().delete, *presenca._chaves(self.canal.id))
+
+    def comunicador(self, usuario):
+        cliente = Client()
+        cliente.force_login(usuario)
+        cookie = f'{settings.SESSION_COOKIE_NAME}={cliente.cookies[settings.SESSION_COOKIE_NAME].value}'
+        return WebsocketCommunicator(
+            self.application, f'/ws/chat/{self.canal.id}/', headers=[(b'cookie', cookie.encode())]
+        )
+
+    def test_heartbeat_anuncia_saida_de_conexao_expirada(self):
+        caido, online = self.usuarios
+        conexoes = presenca._chaves(self.canal.id)[0]
+        sockets = [self.comunicador(caido), self.comunicador(online)]
+
+        async def conversar():
+            for socket in sockets:
+                await socket.connect()
+                await socket.receive_json_from()  # presence_state
+            diff = await sockets[1].receive_json_from(timeout=3)
+            self.assertEqual({info['user_id'] for info in diff['entraram']}, {str(caido.pk), str(online.pk)})
+
+            # Worker do primeiro usuário morreu: o heartbeat dele venceu e não há disconnect
+            membro = next(m for m in get_redis().zrange(conexoes, 0, -1) if m.startswith(f'{caido.pk}|'))
+            get_redis().zadd(conexoes, {membro: time.time() - settings.CHAT_PRESENCA_TTL - 1})
+
+            await sockets[1].send_json_to({'type': 'heartbeat'})
+            diff = await sockets[1].receive_json_from(timeout=3)
+            self.assertEqual(diff, {'type': 'presence_diff', 'entraram': [], 'sairam': [str(caido.pk)]})
+
+            for socket in sockets:
+                await socket.disconnect()
+
+        async_to_sync(conversar)()
+
+
+# ==============================================================================
+# REDIS FORA DO AR (notificacoes.py)
+# ==============================================================================
+# As views que zeram ou incrementam contadores continuam respondendo, e o
+# dashboard calcula as não lidas pelo banco.
+
+@override_settings(CACHES=CACHE_LOCAL, CHANNEL_LAYERS=CANAIS_EM_MEMORIA)
+class RedisForaDoArTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        from suporte.admin import grupo_suporte
+
+        grupo = massa_dados.criar_grupos(1)[0]
+        cls.leitor, autor = massa_dados.criar_usuarios(2, [grupo])
+        cls.canal = Canal.objects.get(grupo=grupo)
+        massa_dados.criar_mensagens(cls.canal, [autor], 3)
+        cls.suporte = massa_dados.criar_usuario('atendente')
+        cls.suporte.groups.add(AuthGroup.objects.create(name=grupo_suporte))
+        cls.topico = massa_dados.criar_topicos(cls.leitor, 1, cls.suporte)[0]
+
+    def setUp(self):
+        # Porta sem servidor: toda operação levanta redis.ConnectionError
+        parado = redis.Redis(port=1, decode_responses=True, socket_connect_timeout=0.1, retry_on_error=[])
+        patcher = mock.patch.object(notificacoes, 'get_redis', return_value=parado)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_envio_pelo_chat_sem_contadores(self):
+        parado = redis.asyncio.Redis(port=1, decode_responses=True, socket_connect_timeout=0.1, retry_on_error=[])
+        with mock.patch.object(notificacoes, 'get_redis_async', return_value=parado), \
+                self.assertLogs(notificacoes.logger, 'WARNING'):
+            async_to_sync(notificacoes.notificar_mensagem_canal)(
+                mock.AsyncMock(), Canal.objects.select_related('grupo').get(pk=self.canal.pk), self.suporte.pk
+            )
+
+    def test_dashboard_conta_pelo_banco(self):
+        self.client.force_login(self.leitor)
+        with self.assertLogs(notificacoes.logger, 'WARNING'):
+            response = self.client.get(reverse('users:dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([canal.nao_lidas for canal in response.context['canais_nao_lidos']], [3])
+
+    def test_chat_e_suporte(self):
+        self.client.force_login(self.leitor)
+        with self.assertLogs(notificacoes.logger, 'WARNING'):
+            response = self.client.get(reverse('mensagens:canal_chat', args=[self.canal.slug]))
+        self.assertEqual(response.status_code, 200)
+        with self.assertLogs(notificacoes.logger, 'WARNING'):
+            response = self.client.get(reverse('suporte:topico_detail', args=[self.topico.pk]))
+        self.assertEqual(response.status_code, 200)
+
+        self.client.force_login(self.suporte)
+        with self.assertLogs(notificacoes.logger, 'WARNING'):
+            response = self.client.post(reverse('suporte:topico_responder', args=[self.topico.pk]),
+                                        {'conteudo': 'Pode reenviar o boletim?'})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(self.topico.mensagens.filter(conteudo='Pode reenviar o boletim?').exists())
+
+
+# ==============================================================================
+# EXPORTAÇÃO CSV EM STREAMING (exportacao.py)
+# ==============================================================================
+
+@override_settings(CACHES=CACHE_LOCAL)
+class ExportacaoCsvTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        grupo = massa_dados.criar_grupos(1)[0]
+        cls.canal = Canal.objects.get(grupo=grupo)
+        massa_dados.criar_mensagens(cls.canal, massa_dados.criar_usuarios(3, [grupo]), 400)
+        cls.admin = massa_dados.criar_usuario('diretoria', is_staff=True, is_superuser=True)
+
+    async def test_stream_assincrono_em_lotes(self):
+        await self.async_client.aforce_login(self.admin)
+        with mock.patch.object(exportacao, 'CHUNK_SIZE', 100):
+            response = await self.async_client.post(reverse('admin:mensagens_canal_changelist'), {
+                'action': 'exportar_mensagens_dos_canais_csv', 'apply': '1',
+                '_selected_action': [self.canal.pk],
+            })
+            self.assertTrue(response.is_async)
+            blocos = [bloco async for bloco in response.streaming_content]
+
+        linhas = b''.join(blocos).decode().splitlines()
+        # Cabeçalho e depois um bloco por lote de CHUNK_SIZE linhas
+        self.assertEqual(len(linhas), 1 + 400)
+        self.assertEqual(len(blocos), 1 + 4)
+
+
+# ==============================================================================
+# EXPORTAÇÃO EM SEGUNDO PLANO: ARQUIVO PRIVADO (exportacao.py e tasks.py)
+# ==============================================================================
+
+@override_settings(CACHES=CACHE_LOCAL, CHANNEL_LAYERS=CANAIS_EM_MEMORIA)
+class ExportacaoArquivoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        grupo = massa_dados.criar_grupos(1)[0]
+        cls.canal = Canal.objects.get(grupo=grupo)
+        massa_dados.criar_mensagens(cls.canal, massa_dados.criar_usuarios(2, [grupo]), 30)
+        cls.admin = massa_dados.criar_usuario('diretoria', is_staff=True, is_superuser=True)
+
+    def setUp(self):
+        self.pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.pasta, ignore_errors=True)
+        configuracao = self.settings(EXPORTACOES_ROOT=self.pasta)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def exportar(self):
+        return tasks.exportar_mensagens_csv_task.run([self.canal.pk], None, None, self.admin.pk, 'http://testserver/')
+
+    def baixar(self, nome_arquivo):
+        return self.client.get(reverse('admin:mensagens_canal_exportacao', args=[nome_arquivo]))
+
+    def test_arquivo_fora_do_media_com_nome_aleatorio(self):
+        nome_arquivo = self.exportar()
+
+        self.assertRegex(nome_arquivo, exportacao.NOME_ARQUIVO)
+        self.assertNotEqual(nome_arquivo, self.exportar())
+        self.assertTrue(os.path.isfile(os.path.join(self.pasta, nome_arquivo)))
+
+        # Só o admin entrega o arquivo
+        self.assertEqual(self.baixar(nome_arquivo).status_code, 302)
+        self.client.force_login(self.admin)
+        response = self.baixar(nome_arquivo)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()), 1 + 30)
+
+    def test_nomes_fora_do_padrao(self):
+        self.client.force_login(self.admin)
+        os.mkdir(os.path.join(self.pasta, 'relatorio_auditoria_canais_20260101_000000_' + '0' * 32 + '.csv.gz'))
+        for nome_arquivo in ('.', '..', 'relatorio_auditoria_canais_20260101_000000.csv.gz',
+                             'relatorio_auditoria_canais_20260101_000000_' + '0' * 32 + '.csv.gz'):
+            with self.subTest(nome_arquivo=nome_arquivo):
+                self.assertEqual(self.baixar(nome_arquivo).status_code, 404)
+
+    def test_limpeza_apaga_so_as_vencidas(self):
+        vencida, recente = self.exportar(), self.exportar()
+        antigo = time.time() - settings.EXPORTACOES_VALIDADE - 60
+        os.utime(os.path.join(self.pasta, vencida), (antigo, antigo))
+
+        self.assertEqual(tasks.limpar_exportacoes_task.run(), 1)
+        self.assertEqual(os.listdir(self.pasta), [recente])
@@ -2,15 +2,17 @@ import json
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
-from django.db.models import Prefetch, Max
+from django.db.models import OuterRef, Prefetch, Max, Subquery
 # 🚨 NOVO: Importa timezone para usar o horário exato da leitura
 from django.utils import timezone
 
 # Importa modelos do app `mensagens`
 # 🚨 ATUALIZAÇÃO: Adicionado UltimaLeituraUsuario
 from .models import Canal, Mensagem, UltimaLeituraUsuario
+from . import notificacoes
 # Importa modelos de usuários/grupos (assumindo que o Grupo está em users.models)
 from users.models import Grupo
+from core.orcamento import orcamento_queries
 
 # Importa o modelo de usuário customizado
 from django.contrib.auth import get_user_model
@@ -18,6 +20,7 @@ from django.contrib.auth import get_user_model
 CustomUser = get_user_model()
 
 
+@orcamento_queries(3)
 @login_required
 def lista_canais_view(request):
     """
@@ -36,15 +39,18 @@ def lista_canais_view(request):
         ativo=True
     ).select_related('grupo', 'grupo__auth_group').order_by('nome')
 
-    # 4. Busca a última mensagem para cada canal (para preview)
+    # 4. Busca a última mensagem de cada canal (para preview): o id vem anotado
+    # na consulta dos canais e as mensagens, com o autor, em uma segunda consulta
+    ultima = Mensagem.objects.filter(canal=OuterRef('pk')).order_by('-data_envio', '-pk')
+    canais = list(canais.annotate(ultima_mensagem_id=Subquery(ultima.values('pk')[:1])))
+    mensagens = Mensagem.objects.select_related('autor').in_bulk(
+        [canal.ultima_mensagem_id for canal in canais if canal.ultima_mensagem_id]
+    )
+
     canais_com_preview = []
     for canal in canais:
-        # Busca a mensagem mais recente (apenas conteúdo e data_envio para ser rápido)
-        ultima_mensagem = Mensagem.objects.filter(canal=canal).order_by('-data_envio').only('conteudo', 'data_envio',
-                                                                                            'autor__username').first()
-
         # Anexa como atributo temporário ao objeto Canal
-        canal.ultima_mensagem = ultima_mensagem
+        canal.ultima_mensagem = mensagens.get(canal.ultima_mensagem_id)
         canais_com_preview.append(canal)
 
     context = {
@@ -97,6 +103,8 @@ def chat_canal_view(request, slug): # 🚨 ATUALIZAÇÃO: Recebe 'slug' no lugar
     )
     # Este passo é crucial, pois ao salvar, o campo auto_now=True garante que o
     # dashboard não mostrará mais notificação para este canal.
+    # Zera também o contador em tempo real (Redis) e atualiza o badge das outras abas.
+    notificacoes.marcar_lido(request.user.id, f'canal:{canal.id}')
     # ==============================================================================
 
     # 3. BUSCA EXPLÍCITA DOS MEMBROS
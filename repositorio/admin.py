@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.contrib.auth import get_user_model
+from core.admin import filtro_com_relacoes
+from users.models import RELACOES_REGISTRO_USUARIO, relacoes_usuario
 from .models import Imagem, Galeria, WatermarkConfig
 
 User = get_user_model()
@@ -26,7 +28,10 @@ class ImagemAdmin(admin.ModelAdmin):
     Configurações de exibição para o modelo Imagem no Admin.
     """
     # Campos exibidos na listagem
-    list_display = ('nome_arquivo_original', 'status_processamento', 'galeria', 'criado_em')
+    list_display = ('nome_arquivo_original', 'status_processamento', 'etapa_processamento', 'galeria', 'criado_em')
+    # galeria é anulável: o select_related automático do admin não a inclui
+    list_select_related = ('galeria',)
+    orcamento_queries = 6
 
     # Filtros laterais
     list_filter = ('status_processamento', 'galeria')
@@ -35,7 +40,8 @@ class ImagemAdmin(admin.ModelAdmin):
     search_fields = ('nome_arquivo_original', 'galeria__nome')
 
     # Define campos somente leitura
-    readonly_fields = ('criado_em', 'arquivo_original_url', 'arquivo_processado_url')
+    readonly_fields = ('criado_em', 'arquivo_original_url', 'arquivo_processado_url',
+                       'etapa_processamento', 'erros_por_etapa')
 
     def arquivo_original_url(self, obj):
         """
@@ -76,7 +82,11 @@ class GaleriaAdmin(admin.ModelAdmin):
 
     # Filtros laterais
     # CORRIGIDO: Adiciona 'acesso_publico' aos filtros
-    list_filter = ('status', 'acesso_publico', 'fotografo', 'data_do_evento')
+    list_select_related = ('capa', 'watermark_config', *relacoes_usuario('fotografo'))
+    list_filter = (
+        'status', 'acesso_publico', ('fotografo', filtro_com_relacoes(*RELACOES_REGISTRO_USUARIO)), 'data_do_evento'
+    )
+    orcamento_queries = 6
 
     # Campos pesquisáveis
     search_fields = ('nome', 'descricao')
@@ -0,0 +1,111 @@
+from django.core.cache import cache
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.urls import reverse
+
+from core.cache_pagina import purgar
+
+from .models import Galeria
+
+
+# ==============================================================================
+# CACHE DO BLOCO DE GALERIAS DO DASHBOARD
+# ==============================================================================
+# O bloco (3 públicas + 3 últimas de cada grupo do usuário) é cacheado por
+# usuário. A chave inclui uma versão global, incrementada sempre que uma
+# galeria é salva (publicar/arquivar passam por save), e os grupos do usuário,
+# então entrar/sair de um grupo também gera uma chave nova.
+
+CHAVE_VERSAO = 'galerias:versao'
+GALERIAS_POR_GRUPO = 3
+TIMEOUT_DASHBOARD = 60 * 60
+
+
+def versao_galerias():
+    versao = cache.get(CHAVE_VERSAO)
+    if versao is None:
+        cache.add(CHAVE_VERSAO, 1, timeout=None)
+        versao = cache.get(CHAVE_VERSAO, 1)
+    return versao
+
+
+def invalidar_galerias():
+    """
+    Invalida todos os blocos cacheados (chamado no post_save/post_delete de Galeria)
+    e as páginas anônimas das galerias públicas (core/cache_pagina.py).
+    """
+    try:
+        cache.incr(CHAVE_VERSAO)
+    except ValueError:
+        cache.set(CHAVE_VERSAO, 1, timeout=None)
+    purgar('galerias')
+
+
+def _capa_proxy_url(galeria):
+    if galeria.capa_id and galeria.capa.arquivo_processado:
+        return reverse(
+            'galerias:private_media_proxy',
+            kwargs={'path': galeria.capa.arquivo_processado.name}
+        )
+    return None
+
+
+def _resumo(galeria):
+    """Somente o que o template usa (dict simples, seguro para o cache)."""
+    return {
+        'pk': galeria.pk,
+        'nome': galeria.nome,
+        'data_do_evento': galeria.data_do_evento,
+        'capa_proxy_url': _capa_proxy_url(galeria),
+        'capa_placeholder': galeria.capa.placeholder if galeria.capa_id else '',
+    }
+
+
+def _montar_bloco(grupo_ids):
+    ultimas_galerias_publicas = Galeria.objects.filter(
+        acesso_publico=True,
+        status='PB'
+    ).select_related('capa').order_by('-data_do_evento', '-criado_em')[:3]
+
+    # Top-3 por grupo em uma única query: numera as galerias de cada grupo
+    # (partição) na tabela intermediária e filtra pelas primeiras posições.
+    GaleriaGrupo = Galeria.grupos_acesso.through
+    linhas = GaleriaGrupo.objects.filter(
+        grupo__auth_group_id__in=grupo_ids,
+        galeria__status='PB',
+    ).annotate(
+        posicao=Window(
+            RowNumber(),
+            partition_by=[F('grupo_id')],
+            order_by=[F('galeria__data_do_evento').desc(), F('galeria__criado_em').desc()],
+        )
+    ).filter(
+        posicao__lte=GALERIAS_POR_GRUPO
+    ).select_related(
+        'grupo__auth_group', 'galeria__capa'
+    ).order_by('grupo__auth_group__name', 'posicao')
+
+    grupos_com_galerias = []
+    for linha in linhas:
+        nome_grupo = linha.grupo.auth_group.name
+        if not grupos_com_galerias or grupos_com_galerias[-1]['nome_grupo'] != nome_grupo:
+            grupos_com_galerias.append({'nome_grupo': nome_grupo, 'galerias': []})
+        grupos_com_galerias[-1]['galerias'].append(_resumo(linha.galeria))
+
+    return {
+        'ultimas_galerias_publicas': [_resumo(g) for g in ultimas_galerias_publicas],
+        'grupos_com_galerias': grupos_com_galerias,
+    }
+
+
+def bloco_galerias_dashboard(user):
+    """Retorna o contexto de galerias do dashboard, cacheado por usuário."""
+    grupo_ids = sorted(user.groups.values_list('id', flat=True))
+    chave = 'dashboard:galerias:{}:{}:{}'.format(
+        user.pk, versao_galerias(), '-'.join(map(str, grupo_ids))
+    )
+    bloco = cache.get(chave)
+    if bloco is None:
+        bloco = _montar_bloco(grupo_ids)
+        cache.set(chave, bloco, TIMEOUT_DASHBOARD)
+    return bloco
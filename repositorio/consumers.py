@@ -1,5 +1,6 @@
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
+from core import metricas
 
 
 class GaleriaConsumer(AsyncWebsocketConsumer):
@@ -26,8 +27,10 @@ class GaleriaConsumer(AsyncWebsocketConsumer):
             await self.channel_layer.group_add(self.specific_group, self.channel_name)
 
         await self.accept()
+        metricas.websocket_aberto(self)
 
     async def disconnect(self, close_code):
+        metricas.websocket_fechado(self)
         if hasattr(self, 'global_group'):
             await self.channel_layer.group_discard(self.global_group, self.channel_name)
         if hasattr(self, 'specific_group') and self.specific_group:
@@ -42,6 +45,15 @@ class GaleriaConsumer(AsyncWebsocketConsumer):
             'status_code': event.get('status_code')
         }))
 
+    async def marca_dagua_progresso(self, event):
+        """Progresso da reaplicação da marca d'água em uma galeria."""
+        await self.send(text_data=json.dumps({
+            'type': 'marca_dagua_progresso',
+            'galeria_id': event.get('galeria_id'),
+            'feitas': event.get('feitas'),
+            'total': event.get('total')
+        }))
+
     async def notificar_progresso(self, event):
         """
         Envia progresso individual da imagem com suporte a URLs forçadas (cache-bust).
@@ -47,7 +47,10 @@ class GaleriaForm(forms.ModelForm):
     class Meta:
         model = Galeria
         # Campos definidos conforme seu models.py
-        fields = ['nome', 'data_do_evento', 'descricao', 'status', 'acesso_publico', 'grupos_acesso', 'watermark_config']
+        fields = [
+            'nome', 'data_do_evento', 'descricao', 'status', 'acesso_publico', 'grupos_acesso', 'watermark_config',
+            'reducao_lado_maximo', 'reducao_qualidade',
+        ]
 
         widgets = {
             'data_do_evento': forms.DateInput(attrs={'type': 'date'}),
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:35
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repositorio', '0016_alter_imagem_arquivo_processado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='galeria',
+            name='reducao_lado_maximo',
+            field=models.PositiveIntegerField(blank=True, help_text='Lado máximo das fotos reduzidas no navegador antes do upload. Vazio: envia o original.', null=True, verbose_name='Reduzir Fotos Para (px)'),
+        ),
+        migrations.AddField(
+            model_name='galeria',
+            name='reducao_qualidade',
+            field=models.PositiveSmallIntegerField(default=85, help_text='De 50 a 100. Usada apenas quando a redução está ativa.', validators=[django.core.validators.MinValueValidator(50), django.core.validators.MaxValueValidator(100)], verbose_name='Qualidade JPEG da Redução'),
+        ),
+        migrations.AddField(
+            model_name='imagem',
+            name='reducao_lado_maximo',
+            field=models.PositiveIntegerField(blank=True, help_text='Lado máximo aplicado pelo navegador antes do upload. Vazio: arquivo original.', null=True, verbose_name='Lado Máximo Recebido (px)'),
+        ),
+        migrations.AddField(
+            model_name='imagem',
+            name='reducao_qualidade',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Qualidade JPEG do Upload'),
+        ),
+        migrations.AddField(
+            model_name='imagem',
+            name='tamanho_enviado_bytes',
+            field=models.PositiveBigIntegerField(blank=True, null=True, verbose_name='Tamanho Enviado (bytes)'),
+        ),
+        migrations.AddField(
+            model_name='imagem',
+            name='tamanho_original_bytes',
+            field=models.PositiveBigIntegerField(blank=True, null=True, verbose_name='Tamanho do Arquivo Original (bytes)'),
+        ),
+    ]
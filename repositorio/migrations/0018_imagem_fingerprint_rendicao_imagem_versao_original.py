@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repositorio', '0017_galeria_reducao_lado_maximo_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagem',
+            name='fingerprint_rendicao',
+            field=models.CharField(blank=True, default='', help_text='Hash das entradas usadas no último processamento concluído.', max_length=64, verbose_name='Fingerprint da Rendição'),
+        ),
+        migrations.AddField(
+            model_name='imagem',
+            name='versao_original',
+            field=models.PositiveIntegerField(default=1, help_text='Incrementada sempre que o arquivo original é regravado (ex: rotação).', verbose_name='Versão da Original'),
+        ),
+    ]
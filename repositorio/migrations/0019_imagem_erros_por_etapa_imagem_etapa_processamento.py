@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repositorio', '0018_imagem_fingerprint_rendicao_imagem_versao_original'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagem',
+            name='erros_por_etapa',
+            field=models.JSONField(blank=True, default=dict, help_text='Contagem acumulada de falhas de cada etapa do processamento.', verbose_name='Erros por Etapa'),
+        ),
+        migrations.AddField(
+            model_name='imagem',
+            name='etapa_processamento',
+            field=models.CharField(blank=True, choices=[('BAIXAR', 'Download da Original'), ('DECODIFICAR', 'Decodificação'), ('MINIATURA', 'Miniatura da Grade'), ('RENDICAO', "Rendição com Marca D'água"), ('ENVIO', 'Envio da Rendição'), ('FINALIZAR', 'Finalização')], default='', max_length=20, verbose_name='Última Etapa Concluída'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repositorio', '0019_imagem_erros_por_etapa_imagem_etapa_processamento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagem',
+            name='altura',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Altura da Rendição (px)'),
+        ),
+        migrations.AddField(
+            model_name='imagem',
+            name='largura',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Largura da Rendição (px)'),
+        ),
+        migrations.AddField(
+            model_name='imagem',
+            name='placeholder',
+            field=models.TextField(blank=True, default='', help_text='Data URI de um JPEG de ~20px, gerado no processamento.', verbose_name='Placeholder (LQIP)'),
+        ),
+    ]
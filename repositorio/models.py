@@ -1,4 +1,5 @@
 from django.db import models
+from django.core.validators import MinValueValidator, MaxValueValidator
 from django.conf import settings
 from django.core.files.storage import storages
 from config.storages_conf import PublicMediaStorage, PrivateMediaStorage
@@ -89,6 +90,16 @@ class Imagem(models.Model):
         ('ERRO', 'Erro no Processamento'),
     ]
 
+    # Etapas do processar_imagem_task, na ordem (checkpoint para as retentativas)
+    ETAPAS_PROCESSAMENTO = [
+        ('BAIXAR', 'Download da Original'),
+        ('DECODIFICAR', 'Decodificação'),
+        ('MINIATURA', 'Miniatura da Grade'),
+        ('RENDICAO', 'Rendição com Marca D\'água'),
+        ('ENVIO', 'Envio da Rendição'),
+        ('FINALIZAR', 'Finalização'),
+    ]
+
     fotografo = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -147,6 +158,68 @@ class Imagem(models.Model):
         verbose_name='Status do Processamento'
     )
 
+    # NOVO: Redução feita no navegador antes do upload (vazio = original da câmera)
+    reducao_lado_maximo = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Lado Máximo Recebido (px)',
+        help_text='Lado máximo aplicado pelo navegador antes do upload. Vazio: arquivo original.'
+    )
+    reducao_qualidade = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Qualidade JPEG do Upload'
+    )
+    tamanho_original_bytes = models.PositiveBigIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Tamanho do Arquivo Original (bytes)'
+    )
+    tamanho_enviado_bytes = models.PositiveBigIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Tamanho Enviado (bytes)'
+    )
+
+    # NOVO: Placeholder e dimensões da rendição (layout sem saltos na grade)
+    placeholder = models.TextField(
+        blank=True,
+        default='',
+        verbose_name='Placeholder (LQIP)',
+        help_text='Data URI de um JPEG de ~20px, gerado no processamento.'
+    )
+    largura = models.PositiveIntegerField(null=True, blank=True, verbose_name='Largura da Rendição (px)')
+    altura = models.PositiveIntegerField(null=True, blank=True, verbose_name='Altura da Rendição (px)')
+
+    # NOVO: Checkpoint do processamento (retentativas retomam da próxima etapa)
+    etapa_processamento = models.CharField(
+        max_length=20,
+        choices=ETAPAS_PROCESSAMENTO,
+        blank=True,
+        default='',
+        verbose_name='Última Etapa Concluída'
+    )
+    erros_por_etapa = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Erros por Etapa',
+        help_text='Contagem acumulada de falhas de cada etapa do processamento.'
+    )
+
+    # NOVO: Controle de reprocessamento (ver repositorio/rendicao.py)
+    versao_original = models.PositiveIntegerField(
+        default=1,
+        verbose_name='Versão da Original',
+        help_text='Incrementada sempre que o arquivo original é regravado (ex: rotação).'
+    )
+    fingerprint_rendicao = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        verbose_name='Fingerprint da Rendição',
+        help_text='Hash das entradas usadas no último processamento concluído.'
+    )
+
     criado_em = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -255,6 +328,20 @@ class Galeria(models.Model):
         verbose_name='Marca D\'água Padrão'
     )
 
+    # NOVO: Política de redução no navegador antes do upload
+    reducao_lado_maximo = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Reduzir Fotos Para (px)',
+        help_text='Lado máximo das fotos reduzidas no navegador antes do upload. Vazio: envia o original.'
+    )
+    reducao_qualidade = models.PositiveSmallIntegerField(
+        default=85,
+        validators=[MinValueValidator(50), MaxValueValidator(100)],
+        verbose_name='Qualidade JPEG da Redução',
+        help_text='De 50 a 100. Usada apenas quando a redução está ativa.'
+    )
+
     status = models.CharField(
         max_length=2,
         choices=STATUS_CHOICES,
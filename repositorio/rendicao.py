@@ -0,0 +1,90 @@
+import base64
+import hashlib
+import io
+import json
+
+from PIL import Image
+
+
+# ==============================================================================
+# PARÂMETROS DA RENDIÇÃO (miniatura + visualização com marca d'água)
+# ==============================================================================
+# Qualquer mudança aqui altera o fingerprint de todas as imagens e faz o próximo
+# salvamento de cada galeria reprocessá-las. VERSAO_RENDICAO cobre mudanças no
+# código do processamento que não aparecem nos números abaixo.
+
+# 2: placeholder (LQIP) e dimensões gravados na Imagem
+VERSAO_RENDICAO = 2
+
+THUMBNAIL_SIZE = (800, 600)
+THUMBNAIL_QUALITY = 85
+GRID_THUMB_SIZE = (300, 300)
+GRID_THUMB_QUALITY = 70
+MARCA_DAGUA_LARGURA = 0.15
+MARCA_DAGUA_MARGEM = 20
+# Placeholder inline (LQIP): JPEG minúsculo em data URI, esticado pelo navegador
+PLACEHOLDER_LADO = 20
+PLACEHOLDER_QUALIDADE = 40
+
+PARAMETROS = {
+    'versao': VERSAO_RENDICAO,
+    'visualizacao': [*THUMBNAIL_SIZE, THUMBNAIL_QUALITY],
+    'grid': [*GRID_THUMB_SIZE, GRID_THUMB_QUALITY],
+    'marca_dagua': [MARCA_DAGUA_LARGURA, MARCA_DAGUA_MARGEM],
+    'placeholder': [PLACEHOLDER_LADO, PLACEHOLDER_QUALIDADE],
+    'resample': Image.Resampling.LANCZOS.name,
+    # A orientação EXIF é aplicada na rendição; rotações manuais gravam uma
+    # nova original e incrementam Imagem.versao_original.
+    'orientacao': 'exif_transpose',
+}
+
+
+def gerar_placeholder(img):
+    """Data URI de um JPEG de ~20px da imagem, para pintar a grade antes da miniatura chegar."""
+    miniatura = img.copy()
+    miniatura.thumbnail((PLACEHOLDER_LADO, PLACEHOLDER_LADO), Image.Resampling.BILINEAR)
+    saida = io.BytesIO()
+    miniatura.save(saida, format='JPEG', quality=PLACEHOLDER_QUALIDADE)
+    return 'data:image/jpeg;base64,' + base64.b64encode(saida.getvalue()).decode('ascii')
+
+
+# ==============================================================================
+# FINGERPRINT
+# ==============================================================================
+
+def _marca_dagua(galeria):
+    config = galeria.watermark_config if galeria else None
+    if not config or not config.arquivo_marca_dagua:
+        return None
+    return [config.pk, config.atualizado_em.isoformat()]
+
+
+def calcular_fingerprint(imagem, galeria=None):
+    """
+    Hash das entradas que definem os arquivos gerados para a imagem: versão da
+    original, marca d'água da galeria (id + atualizado_em) e parâmetros da rendição.
+    Espera a galeria com watermark_config carregado (select_related).
+    """
+    galeria = galeria if galeria is not None else imagem.galeria
+    entradas = {
+        'original': [imagem.arquivo_original.name, imagem.versao_original],
+        'marca_dagua': _marca_dagua(galeria),
+        'rendicao': PARAMETROS,
+    }
+    texto = json.dumps(entradas, sort_keys=True, default=str)
+    return hashlib.sha256(texto.encode()).hexdigest()
+
+
+def esta_atualizada(imagem, galeria=None):
+    """True se os arquivos gerados já correspondem às entradas atuais."""
+    return (
+        imagem.status_processamento == 'PROCESSADA'
+        and bool(imagem.arquivo_processado)
+        and bool(imagem.thumbnail)
+        and imagem.fingerprint_rendicao == calcular_fingerprint(imagem, galeria)
+    )
+
+
+def ids_para_processar(imagens, galeria):
+    """Filtra os ids das imagens cujas entradas mudaram desde o último processamento."""
+    return [imagem.pk for imagem in imagens if not esta_atualizada(imagem, galeria)]
@@ -0,0 +1,69 @@
+from django.conf import settings
+
+from config.redis_conf import get_redis
+
+
+# ==============================================================================
+# ROTAÇÕES PENDENTES (Redis)
+# ==============================================================================
+# Chaves por imagem:
+#   rotacao:imagem:<id>:graus     INT  ângulo líquido ainda não aplicado (soma dos cliques)
+#   rotacao:imagem:<id>:agendada  STR  trava: existe uma girar_imagem_task cuidando da imagem
+#
+# Cada clique só soma o ângulo. Quem obtém a trava enfileira a task; os cliques
+# seguintes apenas acumulam e são aplicados pela mesma task, que retira o
+# ângulo líquido ao começar e confere de novo antes de liberar a trava.
+
+
+def _chaves(imagem_id):
+    base = f'rotacao:imagem:{imagem_id}'
+    return f'{base}:graus', f'{base}:agendada'
+
+
+def _ttl_trava():
+    # Se o worker morrer com a trava, ela expira junto com o limite da task.
+    return settings.CELERY_TASK_TIME_LIMIT
+
+
+def solicitar_rotacao(imagem_id, graus):
+    """
+    Acumula a rotação pedida. Retorna True se quem chamou deve enfileirar a
+    task (nenhuma estava agendada para a imagem).
+    """
+    chave_graus, chave_trava = _chaves(imagem_id)
+    r = get_redis()
+    with r.pipeline(transaction=True) as pipe:
+        pipe.incrby(chave_graus, graus)
+        pipe.expire(chave_graus, _ttl_trava() * 4)
+        pipe.set(chave_trava, '1', nx=True, ex=_ttl_trava())
+        _, _, reservado = pipe.execute()
+    return bool(reservado)
+
+
+def retirar_pendente(imagem_id):
+    """Retira o ângulo líquido acumulado (normalizado em 0..359)."""
+    chave_graus, _ = _chaves(imagem_id)
+    r = get_redis()
+    with r.pipeline(transaction=True) as pipe:
+        pipe.get(chave_graus)
+        pipe.delete(chave_graus)
+        graus, _ = pipe.execute()
+    return int(graus or 0) % 360
+
+
+def liberar(imagem_id):
+    """
+    Libera a trava. Retorna True se chegaram cliques depois da última retirada
+    e a trava foi retomada: a task deve continuar em vez de terminar.
+    """
+    chave_graus, chave_trava = _chaves(imagem_id)
+    r = get_redis()
+    r.delete(chave_trava)
+    if not r.exists(chave_graus):
+        return False
+    return bool(r.set(chave_trava, '1', nx=True, ex=_ttl_trava()))
+
+
+def descartar(imagem_id):
+    """Em caso de erro: descarta os cliques pendentes e libera a trava."""
+    get_redis().delete(*_chaves(imagem_id))
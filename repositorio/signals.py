@@ -1,8 +1,10 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
-from .models import Imagem, Galeria
+from django.db import transaction
+from .models import Imagem, Galeria, WatermarkConfig
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
+from .cache import invalidar_galerias
 
 @receiver(post_save, sender=Imagem)
 def verificar_status_galeria_apos_processamento(sender, instance, **kwargs):
@@ -42,4 +44,30 @@ def verificar_status_galeria_apos_processamento(sender, instance, **kwargs):
                     "status_code": 'RV',
                     "status_display": galeria.get_status_display(),
                 }
-            )
\ No newline at end of file
+            )
+
+
+@receiver(post_save, sender=Galeria)
+@receiver(post_delete, sender=Galeria)
+def invalidar_cache_galerias(sender, instance, **kwargs):
+    """Publicar/arquivar (ou editar) uma galeria invalida os blocos do dashboard."""
+    invalidar_galerias()
+
+
+@receiver(m2m_changed, sender=Galeria.grupos_acesso.through)
+def invalidar_cache_galerias_grupos(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidar_galerias()
+
+
+@receiver(post_save, sender=WatermarkConfig)
+def reaplicar_marca_dagua(sender, instance, created, **kwargs):
+    """
+    Editar uma marca d'água agenda a re-renderização das imagens que a usam,
+    em lotes na fila de baixa prioridade (ver reaplicar_marca_dagua_task).
+    """
+    if created:
+        return
+    from .tasks import reaplicar_marca_dagua_task
+    versao = instance.atualizado_em.isoformat()
+    transaction.on_commit(lambda: reaplicar_marca_dagua_task.delay(instance.pk, versao))
@@ -0,0 +1,418 @@
+/**
+ * Arquivo: repositorio/js/upload.js
+ * Upload direto para o S3 com agendador concorrente e adaptativo.
+ *
+ * - Janela de concorrência (quantos arquivos sobem ao mesmo tempo) ajustada por
+ *   AIMD: cresce +1 enquanto a vazão medida melhora sem erros e cai pela metade
+ *   quando uma etapa falha.
+ * - Cada etapa (assinar, enviar ao S3, confirmar) tem retry próprio com backoff
+ *   exponencial: uma falha na confirmação não reenvia o arquivo.
+ * - As assinaturas dos próximos arquivos são pedidas enquanto os atuais sobem.
+ * - Opcionalmente, cada foto é reduzida/recodificada no navegador antes do envio
+ *   (política da galeria ou escolhida na página); o servidor registra o que recebeu.
+ *
+ * Os endpoints são idempotentes: o upload_id reaproveita a assinatura em um retry
+ * e a confirmação só enfileira o processamento uma vez.
+ */
+
+(function () {
+    'use strict';
+
+    const form = document.getElementById('upload-form');
+    const fileInput = document.querySelector('input[type="file"]');
+    const uploadArea = document.getElementById('file-upload-area');
+    const fileCountText = document.getElementById('file-count-text');
+    const submitButton = document.getElementById('submit-button');
+
+    const progressContainer = document.getElementById('progress-container');
+    const totalBar = document.getElementById('total-bar');
+    const totalPercent = document.getElementById('total-percent');
+    const currentBar = document.getElementById('current-bar');
+    const currentPercent = document.getElementById('current-percent');
+    const currentFileName = document.getElementById('current-file-name');
+
+    if (!form || !fileInput || !uploadArea || !submitButton) return;
+
+    const SIGN_URL = form.dataset.signUrl;
+    const CONFIRM_URL = form.dataset.confirmUrl;
+    const REDIRECT_URL = form.dataset.redirectUrl;
+    const GALERIA_ID = form.dataset.galeriaId || '';
+
+    const JANELA_INICIAL = parseInt(form.dataset.concorrenciaInicial || '3', 10);
+    const JANELA_MAXIMA = parseInt(form.dataset.concorrenciaMaxima || '8', 10);
+    const MAX_TENTATIVAS = 4;
+    const BACKOFF_BASE_MS = 1000;
+
+    function getCookie(name) {
+        let cookieValue = null;
+        if (document.cookie && document.cookie !== '') {
+            const cookies = document.cookie.split(';');
+            for (let i = 0; i < cookies.length; i++) {
+                const cookie = cookies[i].trim();
+                if (cookie.substring(0, name.length + 1) === (name + '=')) {
+                    cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+                    break;
+                }
+            }
+        }
+        return cookieValue;
+    }
+    const csrftoken = getCookie('csrftoken');
+
+    uploadArea.addEventListener('click', () => fileInput.click());
+    fileInput.addEventListener('change', handleFileSelect);
+
+    function handleFileSelect(e) {
+        const count = e.target.files.length;
+        if (count > 0) {
+            fileCountText.innerHTML = `<span class="text-primary">${count}</span> arquivo(s) prontos para upload.`;
+            submitButton.disabled = false;
+        }
+    }
+
+    // ==========================================================================
+    // Utilitários de rede
+    // ==========================================================================
+
+    const esperar = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+    function novoUploadId() {
+        if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+        return `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+    }
+
+    /**
+     * Executa uma etapa com retry e backoff exponencial (com jitter).
+     * Erros 4xx (exceto 408/429) não são repetidos: o servidor recusou o pedido.
+     */
+    async function comRetry(etapa, fn) {
+        let ultimoErro = null;
+        for (let tentativa = 1; tentativa <= MAX_TENTATIVAS; tentativa++) {
+            try {
+                return await fn();
+            } catch (erro) {
+                ultimoErro = erro;
+                agendador.registrarErro();
+                if (erro.definitivo || tentativa === MAX_TENTATIVAS) break;
+                const atraso = BACKOFF_BASE_MS * 2 ** (tentativa - 1);
+                await esperar(atraso + Math.random() * atraso / 2);
+            }
+        }
+        const erroFinal = new Error(`${etapa}: ${ultimoErro && ultimoErro.message}`);
+        erroFinal.causa = ultimoErro;
+        throw erroFinal;
+    }
+
+    async function postForm(url, dados) {
+        const res = await fetch(url, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/x-www-form-urlencoded', 'X-CSRFToken': csrftoken},
+            body: new URLSearchParams(dados)
+        });
+        if (!res.ok) {
+            const erro = new Error(`HTTP ${res.status}`);
+            erro.definitivo = res.status >= 400 && res.status < 500 && res.status !== 408 && res.status !== 429;
+            throw erro;
+        }
+        return res.json();
+    }
+
+    function uploadToS3(url, formData, onProgress) {
+        return new Promise((resolve, reject) => {
+            const xhr = new XMLHttpRequest();
+            xhr.open('POST', url);
+
+            xhr.upload.onprogress = (e) => {
+                if (e.lengthComputable) onProgress(e.loaded);
+            };
+
+            xhr.onload = () => {
+                if (xhr.status >= 200 && xhr.status < 300) return resolve();
+                const erro = new Error(`S3 ${xhr.status} ${xhr.statusText}`);
+                // 403 costuma ser assinatura expirada: o retry assina de novo
+                erro.assinaturaInvalida = xhr.status === 403;
+                reject(erro);
+            };
+            xhr.onerror = () => reject(new Error("Erro de conexão"));
+            xhr.send(formData);
+        });
+    }
+
+    // ==========================================================================
+    // Agendador (janela de concorrência AIMD)
+    // ==========================================================================
+
+    const agendador = {
+        janela: Math.max(1, Math.min(JANELA_INICIAL, JANELA_MAXIMA)),
+        ativos: 0,
+        sucessosNaJanela: 0,
+        ultimaVazao: 0,
+        bytesEnviados: 0,
+        inicioMedicao: 0,
+
+        registrarBytes(delta) {
+            this.bytesEnviados += delta;
+        },
+
+        vazaoAtual() {
+            const segundos = (performance.now() - this.inicioMedicao) / 1000;
+            return segundos > 0 ? this.bytesEnviados / segundos : 0;
+        },
+
+        registrarSucesso() {
+            this.sucessosNaJanela += 1;
+            if (this.sucessosNaJanela < this.janela) return;
+
+            // Uma "rodada" completa: compara a vazão com a rodada anterior
+            const vazao = this.vazaoAtual();
+            if (vazao >= this.ultimaVazao * 0.95 && this.janela < JANELA_MAXIMA) {
+                this.janela += 1;
+            }
+            this.ultimaVazao = vazao;
+            this.sucessosNaJanela = 0;
+            this.bytesEnviados = 0;
+            this.inicioMedicao = performance.now();
+        },
+
+        registrarErro() {
+            this.janela = Math.max(1, Math.floor(this.janela / 2));
+            this.sucessosNaJanela = 0;
+        },
+    };
+
+    // ==========================================================================
+    // Redução no navegador (opcional, antes da assinatura)
+    // ==========================================================================
+
+    const selectLado = document.getElementById('reducao-lado-maximo');
+    const inputQualidade = document.getElementById('reducao-qualidade');
+
+    function politicaReducao() {
+        const lado = parseInt((selectLado && selectLado.value) || '0', 10);
+        const qualidade = parseInt((inputQualidade && inputQualidade.value) || '85', 10);
+        return {lado: lado > 0 ? lado : null, qualidade: Math.min(100, Math.max(50, qualidade))};
+    }
+
+    function canvasParaBlob(canvas, qualidade) {
+        if (canvas.convertToBlob) {
+            return canvas.convertToBlob({type: 'image/jpeg', quality: qualidade / 100});
+        }
+        return new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', qualidade / 100));
+    }
+
+    // Uma redução por vez: decodificar várias fotos de 24MP em paralelo esgota a memória da aba
+    let filaReducao = Promise.resolve();
+
+    function preparar(item, politica) {
+        const original = {blob: item.file, nome: item.file.name, tipo: item.file.type || 'image/jpeg', reduzida: false};
+        if (!politica.lado || !window.createImageBitmap) return Promise.resolve(original);
+
+        const tarefa = filaReducao.then(async () => {
+            try {
+                const bitmap = await createImageBitmap(item.file, {imageOrientation: 'from-image'});
+                const escala = Math.min(1, politica.lado / Math.max(bitmap.width, bitmap.height));
+                if (escala === 1) {
+                    bitmap.close();
+                    return original;
+                }
+
+                const largura = Math.round(bitmap.width * escala);
+                const altura = Math.round(bitmap.height * escala);
+                const canvas = window.OffscreenCanvas
+                    ? new OffscreenCanvas(largura, altura)
+                    : Object.assign(document.createElement('canvas'), {width: largura, height: altura});
+                const ctx = canvas.getContext('2d');
+                ctx.imageSmoothingQuality = 'high';
+                ctx.drawImage(bitmap, 0, 0, largura, altura);
+                bitmap.close();
+
+                const blob = await canvasParaBlob(canvas, politica.qualidade);
+                // Se a recodificação não ganhou nada, envia o original
+                if (!blob || blob.size >= item.file.size) return original;
+
+                return {
+                    blob,
+                    nome: item.file.name.replace(/\.[^.]+$/, '') + '.jpg',
+                    tipo: 'image/jpeg',
+                    reduzida: true,
+                };
+            } catch (erro) {
+                console.warn(`Redução falhou para ${item.file.name}, enviando original.`, erro);
+                return original;
+            }
+        });
+        filaReducao = tarefa;
+        return tarefa;
+    }
+
+    // ==========================================================================
+    // Pipeline por arquivo: (reduzir) -> assinar -> enviar -> confirmar
+    // ==========================================================================
+
+    async function assinar(item) {
+        const envio = await item.preparo;
+        item.tamanho = envio.blob.size;
+        return comRetry('assinatura', () => postForm(SIGN_URL, {
+            'nome_arquivo': envio.nome,
+            'tipo_mime': envio.tipo,
+            'galeria_id': GALERIA_ID,
+            'upload_id': item.uploadId,
+            'reducao_lado_maximo': envio.reduzida ? item.politica.lado : '',
+            'reducao_qualidade': envio.reduzida ? item.politica.qualidade : '',
+            'tamanho_original': item.file.size,
+            'tamanho_enviado': envio.blob.size,
+        }));
+    }
+
+    async function processarItem(item, total) {
+        let assinatura = await item.assinatura;
+
+        await comRetry('envio', async () => {
+            const formData = new FormData();
+            Object.entries(assinatura.campos_assinados).forEach(([key, value]) => {
+                formData.append(key, value);
+            });
+            formData.append('file', (await item.preparo).blob);
+
+            item.enviado = 0;
+            try {
+                await uploadToS3(assinatura.url_assinada, formData, (loaded) => {
+                    agendador.registrarBytes(loaded - item.enviado);
+                    item.enviado = loaded;
+                    atualizarProgresso();
+                });
+            } catch (erro) {
+                item.enviado = 0;
+                atualizarProgresso();
+                if (erro.assinaturaInvalida) assinatura = await assinar(item);
+                throw erro;
+            }
+        });
+
+        await comRetry('confirmação', () => postForm(CONFIRM_URL, {
+            'imagem_id': assinatura.imagem_id,
+            'total_files': total,
+            'current_index': item.indice,
+        }));
+    }
+
+    // ==========================================================================
+    // Progresso
+    // ==========================================================================
+
+    let itens = [];
+    let concluidos = 0;
+    let falhas = [];
+
+    function atualizarProgresso() {
+        // Cada arquivo pesa igual: com a redução, o tamanho final só é conhecido depois de preparado
+        const feitos = itens.reduce((soma, item) => {
+            if (item.concluido) return soma + 1;
+            return soma + (item.tamanho ? Math.min(1, item.enviado / item.tamanho) : 0);
+        }, 0);
+        const percentual = itens.length ? (feitos / itens.length) * 100 : 0;
+        totalBar.style.width = `${percentual}%`;
+        totalPercent.textContent = `${Math.round(percentual)}%`;
+
+        const arquivosPercent = itens.length ? (concluidos / itens.length) * 100 : 0;
+        currentBar.style.width = `${arquivosPercent}%`;
+        currentPercent.textContent = `${concluidos}/${itens.length}`;
+        currentFileName.textContent =
+            `Enviando ${agendador.ativos} arquivo(s) em paralelo (janela ${agendador.janela})`;
+    }
+
+    // ==========================================================================
+    // Execução
+    // ==========================================================================
+
+    submitButton.addEventListener('click', async () => {
+        // Primeiro clique monta a fila; depois de falhas, o botão reenvia só o que faltou
+        if (!itens.length) {
+            const files = Array.from(fileInput.files);
+            if (files.length === 0) return;
+            const politica = politicaReducao();
+            itens = files.map((file, i) => ({
+                file, indice: i + 1, uploadId: novoUploadId(), enviado: 0, tamanho: 0,
+                concluido: false, assinatura: null, politica, preparo: null,
+            }));
+            if (selectLado) selectLado.disabled = true;
+            if (inputQualidade) inputQualidade.disabled = true;
+        }
+
+        const pendentes = itens.filter(item => !item.concluido);
+        const total = itens.length;
+        pendentes.forEach(item => { item.assinatura = null; item.enviado = 0; });
+        concluidos = total - pendentes.length;
+        falhas = [];
+
+        submitButton.disabled = true;
+        uploadArea.style.pointerEvents = 'none';
+        uploadArea.style.opacity = '0.5';
+        progressContainer.classList.remove('hidden');
+        currentFileName.classList.remove('text-red-500');
+        agendador.inicioMedicao = performance.now();
+
+        let proximo = 0;
+        let proximaAssinatura = 0;
+
+        // Assina à frente: mantém os próximos arquivos já assinados enquanto os atuais sobem
+        function preAssinar() {
+            const limite = Math.min(pendentes.length, proximo + agendador.janela * 2);
+            while (proximaAssinatura < limite) {
+                const item = pendentes[proximaAssinatura++];
+                if (!item.preparo) item.preparo = preparar(item, item.politica);
+                item.assinatura = assinar(item);
+                // Evita "unhandled rejection" antes do worker aguardar a promessa
+                item.assinatura.catch(() => {});
+            }
+        }
+
+        await new Promise(resolveTudo => {
+            let finalizados = 0;
+
+            function despachar() {
+                preAssinar();
+                while (agendador.ativos < agendador.janela && proximo < pendentes.length) {
+                    const item = pendentes[proximo++];
+                    if (!item.preparo) item.preparo = preparar(item, item.politica);
+                    if (!item.assinatura) item.assinatura = assinar(item);
+                    agendador.ativos += 1;
+
+                    processarItem(item, total).then(() => {
+                        item.concluido = true;
+                        concluidos += 1;
+                        agendador.registrarSucesso();
+                    }).catch(erro => {
+                        console.error(erro);
+                        falhas.push(item.file.name);
+                    }).finally(() => {
+                        agendador.ativos -= 1;
+                        finalizados += 1;
+                        atualizarProgresso();
+                        if (finalizados === pendentes.length) {
+                            resolveTudo();
+                        } else {
+                            despachar();
+                        }
+                    });
+                }
+                atualizarProgresso();
+            }
+            despachar();
+        });
+
+        if (falhas.length) {
+            currentFileName.textContent = `Falha em ${falhas.length} arquivo(s): ${falhas.join(', ')}. Clique para reenviar.`;
+            currentFileName.classList.add('text-red-500');
+            submitButton.disabled = false;
+            return;
+        }
+
+        totalBar.style.width = '100%';
+        totalPercent.textContent = '100%';
+
+        setTimeout(() => {
+            window.location.href = REDIRECT_URL;
+        }, 800);
+    });
+})();
@@ -1,5 +1,6 @@
 import os
 import io
+import shutil
 import logging
 import time
 from PIL import Image, ImageOps
@@ -7,16 +8,17 @@ from django.core.files.base import ContentFile
 from celery import shared_task
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
+from django.db.models import F
 from django.urls import reverse
+from core import metricas
 from .models import Imagem, WatermarkConfig, Galeria
+from .rendicao import (
+    THUMBNAIL_SIZE, THUMBNAIL_QUALITY, GRID_THUMB_SIZE, GRID_THUMB_QUALITY,
+    MARCA_DAGUA_LARGURA, MARCA_DAGUA_MARGEM, calcular_fingerprint, esta_atualizada, gerar_placeholder,
+)
 
 logger = logging.getLogger(__name__)
 
-# Configurações otimizadas
-THUMBNAIL_SIZE = (800, 600)
-THUMBNAIL_QUALITY = 85
-GRID_THUMB_SIZE = (300, 300)
-
 
 def enviar_progresso_websocket(imagem_id, progresso, status, galeria=None, fotografo_id=None, url_thumb=None,
                                arquivo_processado=None):
@@ -60,79 +62,227 @@ def enviar_progresso_websocket(imagem_id, progresso, status, galeria=None, fotog
     # Envia para o grupo de lista geral (para resolver erro de rota na listagem)
     async_to_sync(channel_layer.group_send)(lista_geral_group, data)
 
+    metricas.GROUP_SEND.labels('progresso_imagem').inc(3)
+
+
+# ==============================================================================
+# PROCESSAMENTO EM ETAPAS (checkpoint)
+# ==============================================================================
+# BAIXAR -> DECODIFICAR -> MINIATURA -> RENDICAO -> ENVIO -> FINALIZAR
+#
+# A última etapa concluída fica em Imagem.etapa_processamento. Os artefatos
+# intermediários (original baixada, rendição ainda não enviada) ficam no
+# rascunho local PROCESSAMENTO_DIR_TEMPORARIO/<id>_<fingerprint>: uma
+# retentativa no mesmo worker reaproveita tudo; em outro worker, refaz só o
+# que precisa para chegar à primeira etapa pendente. A miniatura e a rendição
+# enviadas ficam no storage, então MINIATURA e ENVIO nunca são repetidas.
+#
+# Um worker morto (OOM, SIGKILL) deixa o rascunho para trás. Uma execução nova
+# apaga os rascunhos de outros fingerprints da mesma imagem, e
+# limpar_rascunhos_task apaga os parados há mais de PROCESSAMENTO_RASCUNHO_VALIDADE.
+
+ETAPAS = [codigo for codigo, _ in Imagem.ETAPAS_PROCESSAMENTO]
+PROGRESSO_ETAPA = {
+    'BAIXAR': 10, 'DECODIFICAR': 25, 'MINIATURA': 40,
+    'RENDICAO': 60, 'ENVIO': 80, 'FINALIZAR': 95,
+}
+# Etapa concluída de uma execução que falhou antes de escrever no storage
+ETAPAS_SEM_ESCRITA = ('', 'BAIXAR')
+
+
+class _Checkpoint:
+    """Estado de uma execução: etapa concluída (banco) e rascunho local (disco)."""
+
+    def __init__(self, imagem, fingerprint):
+        from django.conf import settings
+        self.imagem = imagem
+        self.etapa_atual = None
+        self.pasta = os.path.join(settings.PROCESSAMENTO_DIR_TEMPORARIO, f"{imagem.pk}_{fingerprint[:16]}")
+        os.makedirs(self.pasta, exist_ok=True)
+
+    def caminho(self, nome):
+        return os.path.join(self.pasta, nome)
+
+    def descartar_anteriores(self):
+        """Apaga os rascunhos da imagem com outro fingerprint (execuções interrompidas)."""
+        raiz, atual = os.path.split(self.pasta)
+        prefixo = f"{self.imagem.pk}_"
+        for nome in os.listdir(raiz):
+            if nome.startswith(prefixo) and nome != atual:
+                shutil.rmtree(os.path.join(raiz, nome), ignore_errors=True)
+
+    def concluida(self, etapa):
+        atual = self.imagem.etapa_processamento
+        return bool(atual) and ETAPAS.index(atual) >= ETAPAS.index(etapa)
+
+    def executar(self, etapa, funcao):
+        """Executa a etapa, registrando-a como concluída (sem voltar o checkpoint)."""
+        self.etapa_atual = etapa
+        imagem = self.imagem
+        enviar_progresso_websocket(imagem.pk, PROGRESSO_ETAPA[etapa], 'PROCESSANDO', imagem.galeria, imagem.fotografo_id)
+        with metricas.ETAPA_DURACAO.labels(etapa).time():
+            resultado = funcao()
+        if not self.concluida(etapa):
+            imagem.etapa_processamento = etapa
+            imagem.save(update_fields=['etapa_processamento'])
+        return resultado
+
+    def registrar_erro(self):
+        etapa = self.etapa_atual or 'BAIXAR'
+        erros = dict(self.imagem.erros_por_etapa or {})
+        erros[etapa] = erros.get(etapa, 0) + 1
+        self.imagem.erros_por_etapa = erros
+        self.imagem.save(update_fields=['erros_por_etapa'])
+        return etapa
+
+    def limpar(self):
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+
+def _baixar_original(imagem, checkpoint):
+    destino = checkpoint.caminho('original')
+    if not os.path.exists(destino):
+        def baixar():
+            temporario = destino + '.parcial'
+            with imagem.arquivo_original.open('rb') as origem, open(temporario, 'wb') as f:
+                shutil.copyfileobj(origem, f, 1024 * 1024)
+            os.replace(temporario, destino)
+        checkpoint.executar('BAIXAR', baixar)
+    return destino
+
+
+def _decodificar(imagem, checkpoint):
+    """Original normalizada (orientação EXIF, RGB). Fica só em memória: refazer a partir do disco é barato."""
+    caminho = _baixar_original(imagem, checkpoint)
+
+    def decodificar():
+        img_original = Image.open(caminho)
+        if imagem.reducao_lado_maximo:
+            # Recebida já reduzida/recodificada pelo navegador (orientação aplicada no canvas)
+            logger.info(
+                f"Imagem {imagem.pk} recebida reduzida para {imagem.reducao_lado_maximo}px "
+                f"(q={imagem.reducao_qualidade}, {imagem.tamanho_enviado_bytes} de {imagem.tamanho_original_bytes} bytes)"
+            )
+        img_original = ImageOps.exif_transpose(img_original)
 
-@shared_task(bind=True, max_retries=3)
-def processar_imagem_task(self, imagem_id, total_arquivos=1, indice_atual=1):
-    try:
-        imagem = Imagem.objects.select_related('galeria__watermark_config').get(pk=imagem_id)
-        galeria = imagem.galeria
+        if img_original.mode != 'RGB':
+            img_original = img_original.convert('RGB')
+        return img_original
 
-        enviar_progresso_websocket(imagem_id, 10, 'PROCESSANDO', galeria, imagem.fotografo.id)
+    return checkpoint.executar('DECODIFICAR', decodificar)
 
-        imagem.status_processamento = 'PROCESSANDO'
-        imagem.save(update_fields=['status_processamento'])
 
-        with imagem.arquivo_original.open('rb') as f:
-            content = f.read()
+def _gerar_miniatura(imagem, img_original):
+    # GRID THUMBNAIL
+    img_grid = img_original.copy()
+    img_grid.thumbnail(GRID_THUMB_SIZE, Image.Resampling.LANCZOS)
+    out_grid = io.BytesIO()
+    img_grid.save(out_grid, format='JPEG', quality=GRID_THUMB_QUALITY, optimize=True)
 
-        img_original = Image.open(io.BytesIO(content))
-        img_original = ImageOps.exif_transpose(img_original)
+    if imagem.thumbnail:
+        imagem.thumbnail.delete(save=False)
 
-        if img_original.mode != 'RGB':
-            img_original = img_original.convert('RGB')
+    thumb_name = f"thumb_{imagem.pk}.jpg"
+    imagem.thumbnail.save(thumb_name, ContentFile(out_grid.getvalue()), save=False)
+    imagem.placeholder = gerar_placeholder(img_grid)
+    imagem.save(update_fields=['thumbnail', 'placeholder'])
 
-        enviar_progresso_websocket(imagem_id, 40, 'PROCESSANDO', galeria, imagem.fotografo.id)
 
-        # GRID THUMBNAIL
-        img_grid = img_original.copy()
-        img_grid.thumbnail(GRID_THUMB_SIZE, Image.Resampling.LANCZOS)
-        out_grid = io.BytesIO()
-        img_grid.save(out_grid, format='JPEG', quality=70, optimize=True)
+def _renderizar(imagem, img_original, destino):
+    galeria = imagem.galeria
 
-        if imagem.thumbnail:
-            imagem.thumbnail.delete(save=False)
+    # IMAGE PROCESSADA
+    img_proc = img_original.copy()
+    img_proc.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
 
-        thumb_name = f"thumb_{imagem.pk}.jpg"
-        imagem.thumbnail.save(thumb_name, ContentFile(out_grid.getvalue()), save=False)
+    # WATERMARK
+    if galeria and hasattr(galeria, 'watermark_config') and galeria.watermark_config and galeria.watermark_config.arquivo_marca_dagua:
+        config = galeria.watermark_config
+        with config.arquivo_marca_dagua.open('rb') as f_wm:
+            wm_img = Image.open(io.BytesIO(f_wm.read())).convert("RGBA")
 
-        # IMAGE PROCESSADA
-        img_proc = img_original.copy()
-        img_proc.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+        base_w = img_proc.size[0]
+        wm_w = int(base_w * MARCA_DAGUA_LARGURA)
+        w_ratio = wm_w / float(wm_img.size[0])
+        wm_h = int(float(wm_img.size[1]) * float(w_ratio))
+        wm_img = wm_img.resize((wm_w, wm_h), Image.Resampling.LANCZOS)
 
-        # WATERMARK
-        if galeria and hasattr(galeria, 'watermark_config') and galeria.watermark_config and galeria.watermark_config.arquivo_marca_dagua:
-            config = galeria.watermark_config
-            with config.arquivo_marca_dagua.open('rb') as f_wm:
-                wm_img = Image.open(io.BytesIO(f_wm.read())).convert("RGBA")
+        alpha = wm_img.split()[3]
+        alpha = alpha.point(lambda p: p * (config.opacidade if hasattr(config, 'opacidade') else 0.5))
+        wm_img.putalpha(alpha)
 
-            base_w = img_proc.size[0]
-            wm_w = int(base_w * 0.15)
-            w_ratio = wm_w / float(wm_img.size[0])
-            wm_h = int(float(wm_img.size[1]) * float(w_ratio))
-            wm_img = wm_img.resize((wm_w, wm_h), Image.Resampling.LANCZOS)
+        pos = (img_proc.size[0] - wm_w - MARCA_DAGUA_MARGEM, img_proc.size[1] - wm_h - MARCA_DAGUA_MARGEM)
+        temp_img = img_proc.convert("RGBA")
+        temp_img.paste(wm_img, pos, wm_img)
+        img_proc = temp_img.convert("RGB")
 
-            alpha = wm_img.split()[3]
-            alpha = alpha.point(lambda p: p * (config.opacidade if hasattr(config, 'opacidade') else 0.5))
-            wm_img.putalpha(alpha)
+    temporario = destino + '.parcial'
+    img_proc.save(temporario, format='JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+    os.replace(temporario, destino)
 
-            pos = (img_proc.size[0] - wm_w - 20, img_proc.size[1] - wm_h - 20)
-            temp_img = img_proc.convert("RGBA")
-            temp_img.paste(wm_img, pos, wm_img)
-            img_proc = temp_img.convert("RGB")
+    # Dimensões finais: width/height no <img> evitam saltos de layout
+    imagem.largura, imagem.altura = img_proc.size
+    imagem.save(update_fields=['largura', 'altura'])
 
-        enviar_progresso_websocket(imagem_id, 80, 'PROCESSANDO', galeria, imagem.fotografo.id)
 
-        output = io.BytesIO()
-        img_proc.save(output, format='JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+def _enviar_rendicao(imagem, origem):
+    if imagem.arquivo_processado:
+        imagem.arquivo_processado.delete(save=False)
 
-        if imagem.arquivo_processado:
-            imagem.arquivo_processado.delete(save=False)
+    file_name = f"proc_{imagem.pk}.jpg"
+    with open(origem, 'rb') as f:
+        imagem.arquivo_processado.save(file_name, ContentFile(f.read()), save=False)
+    imagem.save(update_fields=['arquivo_processado'])
 
-        file_name = f"proc_{imagem.pk}.jpg"
-        imagem.arquivo_processado.save(file_name, ContentFile(output.getvalue()), save=False)
 
-        imagem.status_processamento = 'PROCESSADA'
-        imagem.save(update_fields=['status_processamento', 'arquivo_processado', 'thumbnail'])
+@shared_task(bind=True, max_retries=3)
+def processar_imagem_task(self, imagem_id, total_arquivos=1, indice_atual=1, forcar=False):
+    checkpoint = None
+    try:
+        imagem = Imagem.objects.select_related('galeria__watermark_config').get(pk=imagem_id)
+        galeria = imagem.galeria
+        retentativa = bool(self.request.retries) and not self.request.called_directly
+
+        # Nada mudou desde o último processamento (mesma original, marca d'água e parâmetros)
+        if not retentativa and not forcar and esta_atualizada(imagem, galeria):
+            logger.info(f"Imagem {imagem_id} já está atualizada; processamento ignorado.")
+            return
+
+        # Calculado antes de ler os arquivos: é o estado que esta execução vai renderizar
+        fingerprint = calcular_fingerprint(imagem, galeria)
+        checkpoint = _Checkpoint(imagem, fingerprint)
+
+        if not retentativa:
+            # Execução nova: as entradas podem ter mudado, o checkpoint anterior não vale
+            checkpoint.descartar_anteriores()
+            imagem.status_processamento = 'PROCESSANDO'
+            imagem.etapa_processamento = ''
+            imagem.save(update_fields=['status_processamento', 'etapa_processamento'])
+        else:
+            logger.info(f"Retentativa {self.request.retries} da imagem {imagem_id} após a etapa "
+                        f"'{imagem.etapa_processamento or '-'}'.")
+
+        img_original = None
+
+        if not checkpoint.concluida('MINIATURA'):
+            img_original = _decodificar(imagem, checkpoint)
+            checkpoint.executar('MINIATURA', lambda: _gerar_miniatura(imagem, img_original))
+
+        if not checkpoint.concluida('ENVIO'):
+            rendicao = checkpoint.caminho('processada.jpg')
+            if not os.path.exists(rendicao):
+                if img_original is None:
+                    img_original = _decodificar(imagem, checkpoint)
+                checkpoint.executar('RENDICAO', lambda: _renderizar(imagem, img_original, rendicao))
+            checkpoint.executar('ENVIO', lambda: _enviar_rendicao(imagem, rendicao))
+
+        def finalizar():
+            imagem.status_processamento = 'PROCESSADA'
+            imagem.fingerprint_rendicao = fingerprint
+            imagem.save(update_fields=['status_processamento', 'fingerprint_rendicao'])
+
+        checkpoint.executar('FINALIZAR', finalizar)
+        checkpoint.limpar()
 
         # Gera a URL atualizada para o front-end
         nova_url = reverse('private_media_proxy', kwargs={'path': imagem.thumbnail.name})
@@ -144,47 +294,219 @@ def processar_imagem_task(self, imagem_id, total_arquivos=1, indice_atual=1):
         )
 
     except Exception as e:
-        logger.error(f"Erro na task {imagem_id}: {str(e)}")
+        etapa = checkpoint.registrar_erro() if checkpoint else None
+        logger.error(f"Erro na task {imagem_id} (etapa {etapa}): {str(e)}")
+
+        if not self.request.called_directly and self.request.retries < self.max_retries:
+            # Ainda há retentativas: a imagem continua 'PROCESSANDO' e retoma da etapa pendente
+            raise self.retry(exc=e, countdown=60)
+
+        if checkpoint:
+            checkpoint.limpar()
         Imagem.objects.filter(pk=imagem_id).update(status_processamento='ERRO')
         enviar_progresso_websocket(imagem_id, 0, 'ERRO')
-        raise self.retry(exc=e, countdown=60)
+        raise
+
+
+@shared_task(ignore_result=True)
+def limpar_rascunhos_task():
+    """Periódica (CELERY_BEAT_SCHEDULE): apaga os rascunhos de processamento abandonados."""
+    from django.conf import settings
+
+    raiz = settings.PROCESSAMENTO_DIR_TEMPORARIO
+    if not os.path.isdir(raiz):
+        return 0
+    limite = time.time() - settings.PROCESSAMENTO_RASCUNHO_VALIDADE
+    apagados = 0
+    for entrada in os.scandir(raiz):
+        if entrada.is_dir(follow_symlinks=False) and entrada.stat().st_mtime < limite:
+            shutil.rmtree(entrada.path, ignore_errors=True)
+            apagados += 1
+    if apagados:
+        logger.info(f"Rascunhos de processamento abandonados apagados: {apagados}")
+    return apagados
 
 
 @shared_task(bind=True)
-def girar_imagem_task(self, imagem_id, graus):
+def girar_imagem_task(self, imagem_id, graus=0):
     """
     Task para girar a imagem original e disparar o re-processamento da visualização.
+    Aplica o ângulo líquido acumulado em rotacao.py: vários cliques seguidos
+    viram uma única rotação e um único re-processamento.
     """
-    try:
-        imagem = Imagem.objects.select_related('galeria').get(pk=imagem_id)
-        enviar_progresso_websocket(imagem_id, 20, 'PROCESSANDO', imagem.galeria, imagem.fotografo.id)
-
-        # 1. Abre a original
-        with imagem.arquivo_original.open('rb') as f:
-            img = Image.open(io.BytesIO(f.read()))
-
-        # 2. Gira
-        img = img.rotate(graus, expand=True)
-
-        # 3. Salva de volta na original (S3/Local)
-        buffer = io.BytesIO()
-        format_img = 'JPEG' if imagem.arquivo_original.name.lower().endswith(('jpg', 'jpeg')) else 'PNG'
-        img.save(buffer, format=format_img, quality=100)
-
-        nome_original = os.path.basename(imagem.arquivo_original.name)
-        imagem.arquivo_original.delete(save=False)
-        imagem.arquivo_original.save(
-            nome_original,
-            ContentFile(buffer.getvalue()),
-            save=False
-        )
+    from . import rotacao
 
-        enviar_progresso_websocket(imagem_id, 50, 'PROCESSANDO', imagem.galeria, imagem.fotografo.id)
+    if graus:
+        # Mensagens antigas (enfileiradas com o ângulo) somam ao pendente
+        rotacao.solicitar_rotacao(imagem_id, graus)
 
-        # 4. Chama o processamento de visualização (Watermark/Thumb) de forma síncrona/imediata
-        processar_imagem_task.run(imagem_id)
+    try:
+        imagem = Imagem.objects.select_related('galeria').get(pk=imagem_id)
+        girou = False
+        processou = False
+
+        while True:
+            graus_pendentes = rotacao.retirar_pendente(imagem_id)
+            if graus_pendentes:
+                enviar_progresso_websocket(imagem_id, 20, 'PROCESSANDO', imagem.galeria, imagem.fotografo.id)
+                _girar_original(imagem, graus_pendentes)
+                girou = True
+                continue
+
+            if girou:
+                enviar_progresso_websocket(imagem_id, 50, 'PROCESSANDO', imagem.galeria, imagem.fotografo.id)
+                # Chama o processamento de visualização (Watermark/Thumb) de forma síncrona/imediata
+                processar_imagem_task.run(imagem_id, forcar=True)
+                girou = False
+                processou = True
+                # Confere se chegaram cliques durante o processamento
+                continue
+
+            if not rotacao.liberar(imagem_id):
+                break
+
+        if not processou:
+            # Os cliques se anularam (ex: 4 x 90°): só devolve o estado anterior à tela
+            imagem.refresh_from_db(fields=['status_processamento', 'arquivo_processado', 'thumbnail'])
+            if imagem.arquivo_processado and imagem.thumbnail:
+                imagem.status_processamento = 'PROCESSADA'
+                imagem.save(update_fields=['status_processamento'])
+                enviar_progresso_websocket(
+                    imagem_id, 100, 'PROCESSADA', imagem.galeria, imagem.fotografo.id,
+                    url_thumb=reverse('private_media_proxy', kwargs={'path': imagem.thumbnail.name}),
+                    arquivo_processado=reverse('private_media_proxy', kwargs={'path': imagem.arquivo_processado.name}),
+                )
+            else:
+                processar_imagem_task.run(imagem_id)
 
     except Exception as e:
         logger.error(f"Erro ao girar imagem {imagem_id}: {str(e)}")
+        rotacao.descartar(imagem_id)
         Imagem.objects.filter(pk=imagem_id).update(status_processamento='ERRO')
-        enviar_progresso_websocket(imagem_id, 0, 'ERRO')
\ No newline at end of file
+        enviar_progresso_websocket(imagem_id, 0, 'ERRO')
+
+
+def _girar_original(imagem, graus):
+    """Gira o arquivo original e o grava de volta no storage (nova versão da original)."""
+    # 1. Abre a original
+    with imagem.arquivo_original.open('rb') as f:
+        img = Image.open(io.BytesIO(f.read()))
+
+    # 2. Gira
+    img = img.rotate(graus, expand=True)
+
+    # 3. Salva de volta na original (S3/Local)
+    buffer = io.BytesIO()
+    format_img = 'JPEG' if imagem.arquivo_original.name.lower().endswith(('jpg', 'jpeg')) else 'PNG'
+    img.save(buffer, format=format_img, quality=100)
+
+    nome_original = os.path.basename(imagem.arquivo_original.name)
+    imagem.arquivo_original.delete(save=False)
+    imagem.arquivo_original.save(
+        nome_original,
+        ContentFile(buffer.getvalue()),
+        save=False
+    )
+    # Nova original: invalida o fingerprint da rendição atual
+    imagem.versao_original = F('versao_original') + 1
+    imagem.save(update_fields=['arquivo_original', 'versao_original'])
+    imagem.refresh_from_db(fields=['versao_original'])
+
+# ==============================================================================
+# REAPLICAÇÃO DA MARCA D'ÁGUA (fila baixa_prioridade)
+# ==============================================================================
+# Disparada pelo post_save do WatermarkConfig (signals.py). Cada execução
+# processa um lote, na ordem (galeria_id, pk), e reagenda a si mesma a partir
+# do cursor. Se o worker cair, o acks_late devolve a mensagem à fila e o lote
+# recomeça: as imagens já renderizadas com a configuração nova têm o
+# fingerprint atualizado e são puladas (processar_imagem_task não faz nada).
+#
+# Com muitos uploads recentes na fila, o lote é adiado; depois de
+# MARCA_DAGUA_REAPLICACAO_MAX_ADIAMENTOS adiamentos seguidos ele roda assim mesmo.
+
+def enviar_progresso_marca_dagua(galeria_id, slug, feitas, total):
+    channel_layer = get_channel_layer()
+    data = {
+        "type": "marca_dagua_progresso",
+        "galeria_id": galeria_id,
+        "feitas": feitas,
+        "total": total,
+    }
+    async_to_sync(channel_layer.group_send)(f"galeria_{slug or galeria_id}", data)
+    async_to_sync(channel_layer.group_send)("galerias_status_updates", data)
+
+
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True, ignore_result=True)
+def reaplicar_marca_dagua_task(self, config_id, versao, galeria_id=0, imagem_id=0, adiamentos=0):
+    """
+    Re-renderiza, em lotes limitados, as imagens das galerias que usam o
+    WatermarkConfig. 'versao' é o atualizado_em que disparou a cadeia: se a
+    configuração for editada de novo, a cadeia antiga para e a nova assume.
+    """
+    from datetime import timedelta
+
+    from django.conf import settings
+    from django.db.models import Count, Q
+    from django.utils import timezone
+
+    config = WatermarkConfig.objects.filter(pk=config_id).only('atualizado_em').first()
+    if config is None or config.atualizado_em.isoformat() != versao:
+        logger.info(f"Reaplicação da marca d'água {config_id} ({versao}) substituída ou cancelada.")
+        return
+
+    intervalo = settings.MARCA_DAGUA_REAPLICACAO_INTERVALO
+
+    # Uploads têm prioridade: com a fila de processamento cheia, só reagenda
+    recentes = timezone.now() - timedelta(seconds=settings.MARCA_DAGUA_REAPLICACAO_JANELA_FILA)
+    pendentes = Imagem.objects.filter(
+        status_processamento__in=['UPLOADED', 'PROCESSANDO'], criado_em__gte=recentes
+    ).count()
+    if pendentes > settings.MARCA_DAGUA_REAPLICACAO_LIMITE_FILA:
+        if adiamentos < settings.MARCA_DAGUA_REAPLICACAO_MAX_ADIAMENTOS:
+            self.apply_async(args=(config_id, versao, galeria_id, imagem_id, adiamentos + 1), countdown=intervalo * 2)
+            return
+        logger.warning(
+            f"Reaplicação da marca d'água {config_id}: {pendentes} imagens na fila após {adiamentos} "
+            f"adiamentos; o lote segue assim mesmo."
+        )
+
+    lote = list(
+        Imagem.objects.filter(
+            galeria__watermark_config_id=config_id,
+            status_processamento='PROCESSADA',
+        ).filter(
+            Q(galeria_id__gt=galeria_id) | Q(galeria_id=galeria_id, pk__gt=imagem_id)
+        ).order_by('galeria_id', 'pk').values_list('galeria_id', 'pk')[:settings.MARCA_DAGUA_REAPLICACAO_LOTE]
+    )
+    if not lote:
+        logger.info(f"Reaplicação da marca d'água {config_id} concluída.")
+        return
+
+    ultimo_por_galeria = {}
+    for lote_galeria_id, lote_imagem_id in lote:
+        try:
+            processar_imagem_task.run(lote_imagem_id)
+        except Exception as e:
+            # processar_imagem_task deixa a imagem em ERRO. Falha em BAIXAR ou
+            # DECODIFICAR (etapa concluída vazia ou BAIXAR) não tocou na miniatura nem
+            # na rendição: a imagem volta a PROCESSADA com o fingerprint antigo e é
+            # refeita no próximo salvamento da galeria. Das etapas seguintes em diante
+            # a miniatura ou a rendição já podem ter sido trocadas: fica em ERRO.
+            logger.error(f"Reaplicação da marca d'água: falha na imagem {lote_imagem_id}: {e}")
+            Imagem.objects.filter(
+                pk=lote_imagem_id, status_processamento='ERRO', etapa_processamento__in=ETAPAS_SEM_ESCRITA
+            ).update(status_processamento='PROCESSADA')
+        ultimo_por_galeria[lote_galeria_id] = lote_imagem_id
+
+    # Progresso por galeria: posição do cursor dentro de cada galeria tocada no lote
+    progresso = Galeria.objects.filter(pk__in=ultimo_por_galeria).annotate(
+        total=Count('imagens', filter=Q(imagens__status_processamento='PROCESSADA')),
+    ).values_list('pk', 'slug', 'total')
+    for pk, slug, total in progresso:
+        feitas = Imagem.objects.filter(
+            galeria_id=pk, status_processamento='PROCESSADA', pk__lte=ultimo_por_galeria[pk]
+        ).count()
+        enviar_progresso_marca_dagua(pk, slug, feitas, total)
+
+    ultimo_galeria_id, ultimo_imagem_id = lote[-1]
+    self.apply_async(args=(config_id, versao, ultimo_galeria_id, ultimo_imagem_id), countdown=intervalo)
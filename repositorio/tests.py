@@ -1,3 +1,366 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from config.redis_conf import redis_disponivel
+from core import benchmark, massa_dados
+from core.orcamento import OrcamentoQueriesMixin
+
+from . import rotacao, tasks
+from .models import Galeria, Imagem, WatermarkConfig
+from .rendicao import calcular_fingerprint
+
+CACHE_LOCAL = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+CANAIS_EM_MEMORIA = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+class S3LocalMixin:
+    """
+    Bucket em memória do benchmark (core/benchmark.py), com nome e credenciais
+    fixos: URLs e assinaturas não dependem das variáveis AWS_* do deploy.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.s3 = cls.enterClassContext(benchmark.s3_local())
+        super().setUpClass()
+
+
+# ==============================================================================
+# ORÇAMENTO DE QUERIES DO ADMIN DO REPOSITÓRIO (core/orcamento.py)
+# ==============================================================================
+# Dezenas de galerias de fotógrafos diferentes, com centenas de imagens.
+
+@override_settings(CACHES=CACHE_LOCAL)
+class OrcamentoRepositorioTests(S3LocalMixin, OrcamentoQueriesMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        grupos = massa_dados.criar_grupos(3)
+        fotografos = massa_dados.criar_usuarios(5, prefixo='fotografo')
+        for i in range(30):
+            massa_dados.criar_galeria(fotografos[i % len(fotografos)], f'Evento {i + 1}', grupos=grupos, imagens=10)
+        cls.admin = massa_dados.criar_usuario('diretoria', is_staff=True, is_superuser=True)
+
+    def setUp(self):
+        cache.clear()
+        self.entrar(self.admin)
+
+    def test_changelists_do_admin(self):
+        for modelo in ('galeria', 'imagem'):
+            with self.subTest(modelo=modelo):
+                self.assertOrcamentoDaUrl(reverse(f'admin:repositorio_{modelo}_changelist'))
+
+
+# ==============================================================================
+# ASSINATURA DE UPLOAD: GALERIA DE OUTRO FOTÓGRAFO
+# ==============================================================================
+
+@override_settings(CACHES=CACHE_LOCAL)
+class AssinarUploadGaleriaTests(S3LocalMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dono = massa_dados.criar_usuario('fotografo1', is_fotografo=True)
+        cls.outro = massa_dados.criar_usuario('fotografo2', is_fotografo=True)
+        cls.master = massa_dados.criar_usuario('master', is_fotografo_master=True)
+        cls.galeria = massa_dados.criar_galeria(cls.dono, 'Festa Junina', imagens=0)
+
+    def assinar(self, usuario, galeria_id):
+        self.client.force_login(usuario)
+        antes = Imagem.objects.count()
+        response = self.client.post(reverse('repositorio:assinar_upload'), {
+            'nome_arquivo': 'foto.jpg', 'tipo_mime': 'image/jpeg', 'galeria_id': galeria_id,
+        })
+        return response, Imagem.objects.count() - antes
+
+    def test_galeria_de_outro_fotografo(self):
+        response, criadas = self.assinar(self.outro, self.galeria.pk)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(criadas, 0)
+
+    def test_galeria_inexistente_ou_invalida(self):
+        for galeria_id, status in ((self.galeria.pk + 1000, 403), ('abc', 400)):
+            with self.subTest(galeria_id=galeria_id):
+                response, criadas = self.assinar(self.dono, galeria_id)
+                self.assertEqual(response.status_code, status)
+                self.assertEqual(criadas, 0)
+
+    def test_dono_e_master(self):
+        for usuario in (self.dono, self.master):
+            with self.subTest(usuario=usuario.username):
+                response, criadas = self.assinar(usuario, self.galeria.pk)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(criadas, 1)
+                imagem = Imagem.objects.get(pk=response.json()['imagem_id'])
+                self.assertEqual(imagem.galeria_id, self.galeria.pk)
+
+
+# ==============================================================================
+# REAPLICAÇÃO DA MARCA D'ÁGUA (reaplicar_marca_dagua_task)
+# ==============================================================================
+
+@override_settings(
+    CACHES=CACHE_LOCAL, MARCA_DAGUA_REAPLICACAO_LIMITE_FILA=2, MARCA_DAGUA_REAPLICACAO_MAX_ADIAMENTOS=3,
+)
+class ReaplicacaoMarcaDaguaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        fotografo = massa_dados.criar_usuario('fotografo', is_fotografo=True)
+        cls.config = WatermarkConfig.objects.create(nome='Escola', arquivo_marca_dagua='watermarks/escola.png')
+        cls.galeria = massa_dados.criar_galeria(fotografo, 'Formatura', imagens=3)
+        Galeria.objects.filter(pk=cls.galeria.pk).update(watermark_config=cls.config)
+        # Uploads de outra galeria aguardando processamento
+        cls.fila = massa_dados.criar_galeria(fotografo, 'Uploads', imagens=3)
+        Imagem.objects.filter(galeria=cls.fila).update(status_processamento='PROCESSANDO')
+
+    def reaplicar(self, adiamentos=0, falha=None):
+        """Executa um lote; devolve (ids processados, args do reagendamento)."""
+        processadas = []
+
+        def processar(imagem_id):
+            processadas.append(imagem_id)
+            if falha is not None:
+                Imagem.objects.filter(pk=imagem_id).update(status_processamento='ERRO', etapa_processamento=falha)
+                raise RuntimeError('S3 indisponível')
+
+        with mock.patch.object(tasks.processar_imagem_task, 'run', side_effect=processar), \
+                mock.patch.object(tasks.reaplicar_marca_dagua_task, 'apply_async') as reagendar, \
+                mock.patch.object(tasks, 'enviar_progresso_marca_dagua'):
+            tasks.reaplicar_marca_dagua_task(
+                self.config.pk, self.config.atualizado_em.isoformat(), adiamentos=adiamentos
+            )
+        return processadas, reagendar.call_args.kwargs['args'] if reagendar.called else None
+
+    def test_fila_cheia_adia_o_lote(self):
+        processadas, args = self.reaplicar()
+        self.assertEqual(processadas, [])
+        self.assertEqual(args[-1], 1)
+
+    def test_adiamentos_tem_limite(self):
+        processadas, args = self.reaplicar(adiamentos=3)
+        self.assertEqual(len(processadas), 3)
+        # Depois de um lote processado, a contagem de adiamentos recomeça
+        self.assertEqual(len(args), 4)
+
+    def test_imagens_presas_antigas_nao_seguram_a_fila(self):
+        Imagem.objects.filter(galeria=self.fila).update(criado_em=timezone.now() - timedelta(days=2))
+        processadas, _ = self.reaplicar()
+        self.assertEqual(len(processadas), 3)
+
+    def test_falha_so_volta_a_processada_antes_da_miniatura(self):
+        Imagem.objects.filter(galeria=self.fila).update(status_processamento='PROCESSADA')
+        # Última etapa concluída -> status depois da falha na etapa seguinte
+        esperado = {
+            '': 'PROCESSADA', 'BAIXAR': 'PROCESSADA',
+            'DECODIFICAR': 'ERRO', 'MINIATURA': 'ERRO', 'RENDICAO': 'ERRO',
+        }
+        for etapa, status in esperado.items():
+            with self.subTest(etapa=etapa):
+                Imagem.objects.filter(galeria=self.galeria).update(status_processamento='PROCESSADA')
+                self.reaplicar(falha=etapa)
+                self.assertEqual(
+                    set(Imagem.objects.filter(galeria=self.galeria).values_list('status_processamento', flat=True)),
+                    {status},
+                )
+
+
+# ==============================================================================
+# PROCESSAMENTO: FINGERPRINT E RETOMADA PELO CHECKPOINT (processar_imagem_task)
+# ==============================================================================
+# Processamento real (Pillow) sobre o S3 em memória. As etapas que gravam no
+# storage são embrulhadas (wraps) só para contar as execuções.
+
+@override_settings(CACHES=CACHE_LOCAL, CHANNEL_LAYERS=CANAIS_EM_MEMORIA)
+class ProcessamentoImagemTests(S3LocalMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        fotografo = massa_dados.criar_usuario('fotografo', is_fotografo=True)
+        cls.galeria = massa_dados.criar_galeria(fotografo, 'Passeio', imagens=0)
+        cls.imagem = Imagem.objects.create(
+            fotografo=fotografo, galeria=cls.galeria, nome_arquivo_original='passeio.jpg',
+            arquivo_original='repo/originais/passeio.jpg', status_processamento='UPLOADED',
+        )
+
+    def setUp(self):
+        self.s3.put('repo/originais/passeio.jpg', benchmark.foto_de_teste(640, 480), 'image/jpeg')
+        self.rascunhos = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.rascunhos, ignore_errors=True)
+        configuracao = self.settings(PROCESSAMENTO_DIR_TEMPORARIO=self.rascunhos)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+        self.etapas = {}
+        for nome in ('_baixar_original', '_gerar_miniatura', '_renderizar', '_enviar_rendicao'):
+            patcher = mock.patch.object(tasks, nome, wraps=getattr(tasks, nome))
+            self.etapas[nome] = patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def execucoes(self):
+        return {nome: etapa.call_count for nome, etapa in self.etapas.items()}
+
+    def processar(self, **kwargs):
+        tasks.processar_imagem_task.apply(args=[self.imagem.pk], kwargs=kwargs)
+        self.imagem.refresh_from_db()
+        return self.imagem
+
+    def test_fingerprint_pula_imagem_atualizada(self):
+        imagem = self.processar()
+        self.assertEqual(imagem.status_processamento, 'PROCESSADA')
+        self.assertEqual(imagem.fingerprint_rendicao, calcular_fingerprint(imagem, self.galeria))
+        self.assertEqual(self.execucoes()['_enviar_rendicao'], 1)
+
+        # Mesmas entradas: nada é refeito
+        self.processar()
+        self.assertEqual(self.execucoes()['_enviar_rendicao'], 1)
+
+        # Nova versão da original (rotação) ou forcar=True: processa de novo
+        Imagem.objects.filter(pk=imagem.pk).update(versao_original=2)
+        self.processar()
+        self.processar(forcar=True)
+        self.assertEqual(self.execucoes()['_enviar_rendicao'], 3)
+
+    def test_retentativa_no_mesmo_worker_retoma_do_envio(self):
+        enviar = self.etapas['_enviar_rendicao']._mock_wraps
+        falhas = [OSError('conexão com o S3 interrompida')]
+
+        def enviar_falhando(*args):
+            if falhas:
+                raise falhas.pop()
+            return enviar(*args)
+
+        self.etapas['_enviar_rendicao'].side_effect = enviar_falhando
+        # Celery eager: a retentativa roda na hora, com request.retries = 1
+        imagem = self.processar()
+
+        self.assertEqual(imagem.status_processamento, 'PROCESSADA')
+        self.assertEqual(imagem.erros_por_etapa, {'ENVIO': 1})
+        # Original e rendição reaproveitadas do rascunho local; miniatura não repetida
+        self.assertEqual(self.execucoes(), {
+            '_baixar_original': 1, '_gerar_miniatura': 1, '_renderizar': 1, '_enviar_rendicao': 2,
+        })
+        self.assertEqual(os.listdir(self.rascunhos), [])
+
+    def test_execucao_nova_apaga_rascunho_de_worker_morto(self):
+        # Execução anterior (outro fingerprint) interrompida por OOM no meio da RENDICAO
+        abandonado = os.path.join(self.rascunhos, f'{self.imagem.pk}_0123456789abcdef')
+        os.makedirs(abandonado)
+        open(os.path.join(abandonado, 'original'), 'wb').close()
+        de_outra_imagem = os.path.join(self.rascunhos, f'{self.imagem.pk}0_0123456789abcdef')
+        os.makedirs(de_outra_imagem)
+
+        self.processar()
+        self.assertEqual(os.listdir(self.rascunhos), [os.path.basename(de_outra_imagem)])
+
+    def test_varredura_apaga_rascunhos_parados(self):
+        parado, recente = (os.path.join(self.rascunhos, nome) for nome in ('7_aaaa', '8_bbbb'))
+        for pasta in (parado, recente):
+            os.makedirs(pasta)
+        antigo = time.time() - settings.PROCESSAMENTO_RASCUNHO_VALIDADE - 60
+        os.utime(parado, (antigo, antigo))
+
+        self.assertEqual(tasks.limpar_rascunhos_task(), 1)
+        self.assertEqual(os.listdir(self.rascunhos), ['8_bbbb'])
+
+    def test_retentativa_em_outro_worker_nao_repete_miniatura_nem_envio(self):
+        self.processar()
+        inicio = self.execucoes()
+
+        # Estado de uma execução que caiu depois do ENVIO, sem rascunho local
+        Imagem.objects.filter(pk=self.imagem.pk).update(
+            status_processamento='PROCESSANDO', etapa_processamento='ENVIO', fingerprint_rendicao='',
+        )
+        tasks.processar_imagem_task.apply(args=[self.imagem.pk], retries=1)
+        self.imagem.refresh_from_db()
+
+        self.assertEqual(self.imagem.status_processamento, 'PROCESSADA')
+        self.assertEqual(self.imagem.etapa_processamento, 'FINALIZAR')
+        self.assertEqual(self.execucoes(), inicio)
+
+    def test_retentativa_apos_miniatura_refaz_so_a_rendicao(self):
+        Imagem.objects.filter(pk=self.imagem.pk).update(
+            status_processamento='PROCESSANDO', etapa_processamento='MINIATURA',
+            thumbnail='repo/thumbs/thumb_existente.jpg',
+        )
+        tasks.processar_imagem_task.apply(args=[self.imagem.pk], retries=1)
+        self.imagem.refresh_from_db()
+
+        self.assertEqual(self.imagem.status_processamento, 'PROCESSADA')
+        self.assertEqual(self.imagem.thumbnail.name, 'repo/thumbs/thumb_existente.jpg')
+        self.assertEqual(self.execucoes(), {
+            '_baixar_original': 1, '_gerar_miniatura': 0, '_renderizar': 1, '_enviar_rendicao': 1,
+        })
+
+
+# ==============================================================================
+# ROTAÇÕES AGRUPADAS (rotacao.py e girar_imagem_task)
+# ==============================================================================
+
+@skipUnless(redis_disponivel(), 'Redis indisponível')
+@override_settings(CACHES=CACHE_LOCAL, CHANNEL_LAYERS=CANAIS_EM_MEMORIA)
+class RotacaoAgrupadaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        fotografo = massa_dados.criar_usuario('fotografo', is_fotografo=True)
+        galeria = massa_dados.criar_galeria(fotografo, 'Feira de Ciências', imagens=1)
+        cls.imagem = galeria.imagens.get()
+
+    def setUp(self):
+        rotacao.descartar(self.imagem.pk)
+        self.addCleanup(rotacao.descartar, self.imagem.pk)
+        self.giros = []
+        self.processamentos = 0
+
+        girar = mock.patch.object(tasks, '_girar_original', side_effect=lambda imagem, graus: self.giros.append(graus))
+        processar = mock.patch.object(tasks.processar_imagem_task, 'run', side_effect=self.processar)
+        for patcher in (girar, processar):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def processar(self, imagem_id, **kwargs):
+        self.processamentos += 1
+
+    def clicar(self, *angulos):
+        return [rotacao.solicitar_rotacao(self.imagem.pk, graus) for graus in angulos]
+
+    def test_cliques_seguidos_viram_uma_rotacao(self):
+        self.assertEqual(self.clicar(90, 90, 90), [True, False, False])
+        tasks.girar_imagem_task.run(self.imagem.pk)
+
+        self.assertEqual((self.giros, self.processamentos), ([270], 1))
+        # Trava liberada: o próximo clique agenda uma nova task
+        self.assertEqual(self.clicar(90), [True])
+
+    def test_cliques_que_se_anulam_nao_reprocessam(self):
+        self.clicar(90, 90, 90, 90)
+        tasks.girar_imagem_task.run(self.imagem.pk)
+
+        self.assertEqual((self.giros, self.processamentos), ([], 0))
+        self.imagem.refresh_from_db()
+        self.assertEqual(self.imagem.status_processamento, 'PROCESSADA')
+
+    def test_cliques_durante_o_processamento_ficam_na_mesma_task(self):
+        def processar_recebendo_clique(imagem_id, **kwargs):
+            self.processar(imagem_id)
+            if self.processamentos == 1:
+                # Chega enquanto a task processa: só acumula, sem nova task
+                self.assertEqual(self.clicar(-90), [False])
+
+        tasks.processar_imagem_task.run.side_effect = processar_recebendo_clique
+        self.clicar(180)
+        tasks.girar_imagem_task.run(self.imagem.pk)
+
+        self.assertEqual((self.giros, self.processamentos), ([180, 270], 2))
+        self.assertEqual(self.clicar(90), [True])
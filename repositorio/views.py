@@ -7,8 +7,8 @@ from django.http import JsonResponse, HttpResponseRedirect
 from django.db import transaction
 from django import forms
 from django.db import models
-import boto3
 from django.conf import settings
+from django.core.cache import cache
 import uuid
 import os
 from botocore.exceptions import ClientError, NoCredentialsError, PartialCredentialsError
@@ -24,7 +24,10 @@ from channels.layers import get_channel_layer
 
 from .models import Imagem, Galeria, WatermarkConfig
 from .tasks import processar_imagem_task, girar_imagem_task  # Importação da nova task
+from .rendicao import esta_atualizada, ids_para_processar
+from .rotacao import solicitar_rotacao
 from .forms import GaleriaForm
+from config.storages_conf import get_s3_client
 
 User = get_user_model()
 
@@ -45,6 +48,14 @@ class FotografoRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
         )
 
 
+def galerias_do_usuario(user):
+    """Galerias em que o usuário pode enviar fotos: as próprias (master e superuser: todas)."""
+    galerias = Galeria.objects.all()
+    if not (user.is_superuser or user.is_fotografo_master):
+        galerias = galerias.filter(fotografo=user)
+    return galerias
+
+
 # --------------------------------------------------------------------------
 # 1. Formulário Customizado para Upload Múltiplo (MANTIDO AQUI)
 # --------------------------------------------------------------------------
@@ -82,6 +93,10 @@ class ImagemUploadForm(forms.Form):
 # 2. View para Upload de Imagens (Apenas GET para renderizar)
 # --------------------------------------------------------------------------
 
+# Lados máximos oferecidos na página de upload (as renditions do site têm até 800px)
+OPCOES_REDUCAO_UPLOAD = [4096, 3072, 2560, 1920]
+
+
 class UploadImagemView(FotografoRequiredMixin, View):
     """
     Renderiza o template de upload.
@@ -91,7 +106,22 @@ class UploadImagemView(FotografoRequiredMixin, View):
     template_name = 'repositorio/upload_imagem.html'
 
     def get(self, request):
-        return render(request, self.template_name, {'form': self.form_class()})
+        # Upload a partir de uma galeria (?galeria=<pk>): usa a política de redução dela
+        galeria = None
+        galeria_id = request.GET.get('galeria')
+        if galeria_id and galeria_id.isdigit():
+            galeria = galerias_do_usuario(request.user).filter(pk=galeria_id).first()
+
+        return render(request, self.template_name, {
+            'form': self.form_class(),
+            'galeria': galeria,
+            'opcoes_reducao': OPCOES_REDUCAO_UPLOAD,
+            'reducao_lado_maximo': galeria.reducao_lado_maximo if galeria else settings.UPLOAD_REDUCAO_LADO_MAXIMO,
+            'reducao_qualidade': galeria.reducao_qualidade if galeria else settings.UPLOAD_REDUCAO_QUALIDADE,
+            # Janela de uploads simultâneos do agendador JS (ajustada pela vazão medida)
+            'concorrencia_inicial': settings.UPLOAD_CONCORRENCIA_INICIAL,
+            'concorrencia_maxima': settings.UPLOAD_CONCORRENCIA_MAXIMA,
+        })
 
     def post(self, request):
         messages.info(request, "O upload direto está sendo processado. Acompanhe o status.")
@@ -107,39 +137,72 @@ class AssinarUploadView(FotografoRequiredMixin, View):
     Gera URL pré-assinada e cria o registro com status inicial.
     """
 
+    # Tempo de validade da assinatura (e da chave de idempotência no cache)
+    EXPIRACAO_ASSINATURA = 3600
+
+    @staticmethod
+    def _dados_reducao(dados):
+        def inteiro(campo):
+            valor = dados.get(campo)
+            return int(valor) if valor and valor.isdigit() else None
+
+        lado_maximo = inteiro('reducao_lado_maximo')
+        return {
+            'reducao_lado_maximo': lado_maximo,
+            'reducao_qualidade': inteiro('reducao_qualidade') if lado_maximo else None,
+            'tamanho_original_bytes': inteiro('tamanho_original'),
+            'tamanho_enviado_bytes': inteiro('tamanho_enviado'),
+        }
+
     def post(self, request):
         try:
             nome_arquivo_original = request.POST.get('nome_arquivo')
             mime_type = request.POST.get('tipo_mime')
             galeria_id = request.POST.get('galeria_id')
-
-            ext = os.path.splitext(nome_arquivo_original)[1]
-            nome_unico = f"{uuid.uuid4()}{ext}"
-            caminho_s3 = f"repo/originais/{nome_unico}"
-
-            s3_client = boto3.client(
-                's3',
-                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                region_name=settings.AWS_S3_REGION_NAME,
-                config=boto3.session.Config(signature_version='s3v4')
-            )
+            # Chave gerada pelo JS por arquivo: um retry da assinatura (timeout,
+            # rede instável) reaproveita o mesmo registro em vez de duplicá-lo.
+            upload_id = request.POST.get('upload_id')
+
+            if galeria_id:
+                if not galeria_id.isdigit():
+                    return JsonResponse({'erro': 'Galeria inválida.'}, status=400)
+                # Mesma regra do GET: só as galerias do fotógrafo (master e superuser: todas)
+                if not galerias_do_usuario(request.user).filter(pk=galeria_id).exists():
+                    return JsonResponse({'erro': 'Sem permissão para enviar fotos a esta galeria.'}, status=403)
+
+            imagem = None
+            chave_cache = f'upload:assinatura:{request.user.pk}:{upload_id}' if upload_id else None
+            if chave_cache:
+                imagem_id = cache.get(chave_cache)
+                if imagem_id:
+                    imagem = Imagem.objects.filter(
+                        pk=imagem_id, fotografo=request.user, status_processamento='UPLOAD_PENDENTE'
+                    ).first()
+
+            if imagem is None:
+                ext = os.path.splitext(nome_arquivo_original)[1]
+                nome_unico = f"{uuid.uuid4()}{ext}"
+                caminho_s3 = f"repo/originais/{nome_unico}"
+
+                imagem = Imagem.objects.create(
+                    nome_arquivo_original=nome_arquivo_original,
+                    arquivo_original=caminho_s3,
+                    status_processamento='UPLOAD_PENDENTE',
+                    fotografo=request.user,
+                    galeria_id=galeria_id if galeria_id else None,
+                    # Política de redução aplicada pelo navegador (vazio = original)
+                    **self._dados_reducao(request.POST)
+                )
+                if chave_cache:
+                    cache.set(chave_cache, imagem.pk, self.EXPIRACAO_ASSINATURA)
 
             # CORREÇÃO: Estrutura correta para o FormData do JS
-            post_data = s3_client.generate_presigned_post(
+            post_data = get_s3_client().generate_presigned_post(
                 Bucket=settings.AWS_STORAGE_BUCKET_NAME,
-                Key=caminho_s3,
+                Key=imagem.arquivo_original.name,
                 Fields={"Content-Type": mime_type},
                 Conditions=[{"Content-Type": mime_type}],
-                ExpiresIn=3600
-            )
-
-            imagem = Imagem.objects.create(
-                nome_arquivo_original=nome_arquivo_original,
-                arquivo_original=caminho_s3,
-                status_processamento='UPLOAD_PENDENTE',
-                fotografo=request.user,
-                galeria_id=galeria_id if galeria_id else None
+                ExpiresIn=self.EXPIRACAO_ASSINATURA
             )
 
             return JsonResponse({
@@ -158,6 +221,8 @@ class AssinarUploadView(FotografoRequiredMixin, View):
 class ConfirmarUploadView(FotografoRequiredMixin, View):
     """
     REFORMULADA: Recebe confirmação do JS e dispara Celery com SEGURANÇA.
+    Idempotente: com vários uploads simultâneos e retries no cliente, a mesma
+    imagem pode ser confirmada mais de uma vez, mas só enfileira uma task.
     """
 
     def post(self, request):
@@ -170,29 +235,30 @@ class ConfirmarUploadView(FotografoRequiredMixin, View):
 
         try:
             with transaction.atomic():
-                imagem = get_object_or_404(
-                    Imagem,
+                # UPDATE condicional: só uma confirmação muda o status e dispara a task
+                confirmadas = Imagem.objects.filter(
                     pk=imagem_id,
                     fotografo=request.user,
                     status_processamento='UPLOAD_PENDENTE'
-                )
-
-                imagem.status_processamento = 'UPLOADED'
-                imagem.save(update_fields=['status_processamento'])
-
-                # CORREÇÃO: Passagem explícita de argumentos na lambda para evitar closure issues
-                transaction.on_commit(
-                    lambda i_id=imagem.id, t=total_arquivos, idx=indice_atual:
-                    processar_imagem_task.delay(
-                        imagem_id=i_id,
-                        total_arquivos=t,
-                        indice_atual=idx
+                ).update(status_processamento='UPLOADED')
+
+                if confirmadas:
+                    # CORREÇÃO: Passagem explícita de argumentos na lambda para evitar closure issues
+                    transaction.on_commit(
+                        lambda i_id=int(imagem_id), t=total_arquivos, idx=indice_atual:
+                        processar_imagem_task.delay(
+                            imagem_id=i_id,
+                            total_arquivos=t,
+                            indice_atual=idx
+                        )
                     )
-                )
+                elif not Imagem.objects.filter(pk=imagem_id, fotografo=request.user).exists():
+                    return JsonResponse({'erro': 'Imagem não encontrada.'}, status=404)
 
             return JsonResponse({
                 'sucesso': True,
-                'imagem_id': imagem.id,
+                'imagem_id': int(imagem_id),
+                'ja_confirmada': not confirmadas,
                 'mensagem': f'Arquivo {indice_atual}/{total_arquivos} pronto para processamento.'
             })
 
@@ -341,10 +407,11 @@ class GerenciarImagensGaleriaView(FotografoRequiredMixin, View):
     def post(self, request, pk):
         user = request.user
 
+        galeria_qs = Galeria.objects.select_related('watermark_config')
         if user.is_superuser or user.is_fotografo_master:
-            galeria = get_object_or_404(Galeria, pk=pk)
+            galeria = get_object_or_404(galeria_qs, pk=pk)
         else:
-            galeria = get_object_or_404(Galeria, pk=pk, fotografo=user)
+            galeria = get_object_or_404(galeria_qs, pk=pk, fotografo=user)
 
         imagens_selecionadas_pks = request.POST.getlist('imagens')
         imagens_selecionadas_pks = [int(p) for p in imagens_selecionadas_pks if p.isdigit()]
@@ -360,7 +427,13 @@ class GerenciarImagensGaleriaView(FotografoRequiredMixin, View):
             status_processamento__in=status_permitidos
         ).filter(proprietario_filter)
 
-        imagens_selecionadas_pks_finais = list(imagens_permitidas.values_list('pk', flat=True))
+        imagens_selecionadas = list(imagens_permitidas.only(
+            'pk', 'arquivo_original', 'versao_original', 'status_processamento',
+            'arquivo_processado', 'thumbnail', 'fingerprint_rendicao',
+        ))
+        imagens_selecionadas_pks_finais = [imagem.pk for imagem in imagens_selecionadas]
+        # Só reprocessa o que mudou (original, marca d'água da galeria ou parâmetros)
+        ids_a_processar = ids_para_processar(imagens_selecionadas, galeria)
 
         with transaction.atomic():
             imagens_a_desvincular_qs = Imagem.objects.filter(galeria=galeria).exclude(
@@ -376,7 +449,7 @@ class GerenciarImagensGaleriaView(FotografoRequiredMixin, View):
                 for img_id in ids:
                     processar_imagem_task.delay(img_id)
 
-            transaction.on_commit(lambda: disparar_tasks(imagens_selecionadas_pks_finais))
+            transaction.on_commit(lambda: disparar_tasks(ids_a_processar))
 
         messages.success(request, f'Imagens da galeria "{galeria.nome}" atualizadas com sucesso.')
         return redirect('repositorio:gerenciar_imagens_galeria', pk=galeria.pk)
@@ -394,10 +467,11 @@ class DefinirCapaGaleriaView(FotografoRequiredMixin, View):
             imagem_filter['fotografo'] = user
 
         try:
+            galeria_qs = Galeria.objects.select_related('watermark_config')
             if user.is_superuser or user.is_fotografo_master:
-                galeria = get_object_or_404(Galeria, pk=galeria_pk)
+                galeria = get_object_or_404(galeria_qs, pk=galeria_pk)
             else:
-                galeria = get_object_or_404(Galeria, pk=galeria_pk, fotografo=user)
+                galeria = get_object_or_404(galeria_qs, pk=galeria_pk, fotografo=user)
 
             imagem = get_object_or_404(Imagem, **imagem_filter)
 
@@ -411,7 +485,8 @@ class DefinirCapaGaleriaView(FotografoRequiredMixin, View):
                 with transaction.atomic():
                     imagem.galeria = galeria
                     imagem.save(update_fields=['galeria'])
-                    transaction.on_commit(lambda i_id=imagem.id: processar_imagem_task.delay(i_id))
+                    if not esta_atualizada(imagem, galeria):
+                        transaction.on_commit(lambda i_id=imagem.id: processar_imagem_task.delay(i_id))
 
             galeria.capa = imagem
             galeria.save(update_fields=['capa', 'alterado_em'])
@@ -445,12 +520,13 @@ class GirarImagemView(FotografoRequiredMixin, View):
 
         imagem = get_object_or_404(Imagem, **proprietario_filter)
 
-        # Altera o status para mostrar as barras de progresso no frontend
-        imagem.status_processamento = 'PROCESSANDO'
-        imagem.save(update_fields=['status_processamento'])
-
-        # Dispara a task de rotação (90 graus sentido horário)
-        girar_imagem_task.delay(imagem_id=imagem.id, graus=-90)
+        # Acumula 90 graus (sentido horário) na rotação pendente da imagem. Só o
+        # primeiro clique enfileira a task; os seguintes são aplicados por ela.
+        if solicitar_rotacao(imagem.id, -90):
+            # Altera o status para mostrar as barras de progresso no frontend
+            imagem.status_processamento = 'PROCESSANDO'
+            imagem.save(update_fields=['status_processamento'])
+            girar_imagem_task.delay(imagem_id=imagem.id)
 
         return JsonResponse({
             'sucesso': True,
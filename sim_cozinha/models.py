@@ -1,6 +1,9 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+from core.cache_pagina import purgar_ao_salvar
+from core.navegacao import IndiceLivro
+
 
 class ProjSimCozinha(models.Model):
     """
@@ -48,4 +51,11 @@ class ProjSimCozinha(models.Model):
         ordering = ['ordem_exibicao']
 
     def __str__(self):
-        return f'{self.ordem_exibicao} - {self.titulo}'
\ No newline at end of file
+        return f'{self.ordem_exibicao} - {self.titulo}'
+
+
+# Índice cacheado do catálogo em formato de Livro Digital (core/navegacao.py)
+indice_catalogo = IndiceLivro(ProjSimCozinha, 'sim_cozinha', filtro={'link_video__isnull': False})
+
+# Páginas anônimas cacheadas do projeto (core/cache_pagina.py)
+purgar_ao_salvar(ProjSimCozinha, 'sim_cozinha')
@@ -1,17 +1,17 @@
-from django.shortcuts import render, get_object_or_404
+from django.shortcuts import render
 from django.views import View
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
-from django.db.models import F
-from django.db.models.expressions import Window
-from django.db.models.functions import Rank
-from .models import ProjSimCozinha
+from core.cache_pagina import cache_anonimo
+from core.navegacao import posicao_da_requisicao
+from .models import indice_catalogo
 
 # Define a quantidade máxima de itens por página (sempre 1 para o Livro Digital)
 ITENS_POR_PAGINA = 1
 
 
 # 🚨 NOVA VIEW PARA A PÁGINA INICIAL DO MÓDULO
+@method_decorator(cache_anonimo('sim_cozinha'), name='dispatch')
 class IndexSimCozinhaView(View):
     """
     View para a página inicial do módulo Simoninha na Cozinha.
@@ -36,30 +36,12 @@ class ProjSimCozinhaView(View):
 
     def get(self, request, *args, **kwargs):
         # 1. Determina a página/capítulo atual
-        # O parâmetro 'page' na URL representa a ordem_exibicao do capítulo
-        page_num = request.GET.get('page', 1)
+        # O parâmetro 'page' na URL é a posição (base 1) do capítulo no catálogo.
+        # O índice cacheado (core/navegacao.py) dá o total, o anterior e o próximo
+        # sem consultar o banco: só o capítulo atual é buscado, pela chave primária.
+        pagina = indice_catalogo.pagina(posicao_da_requisicao(request))
 
-        try:
-            # O índice base 1 do capítulo atual
-            page_index_base_1 = int(page_num)
-        except ValueError:
-            # Se o valor for inválido, volta para o primeiro capítulo
-            page_index_base_1 = 1
-
-        # 2. Consulta de Capítulos com Rank (necessário para navegação sequencial)
-        # Calcula a posição (rank) de cada objeto ProjSimCozinha baseado na ordem_exibicao
-        capitulos_anotados = ProjSimCozinha.objects.filter(link_video__isnull=False).annotate( # 🚨 Filtrado para ter video
-            # Adiciona uma coluna 'capitulo_index_base_1' (rank) ao queryset
-            capitulo_index_base_1=Window(
-                expression=Rank(),
-                order_by=F('ordem_exibicao').asc(),
-            )
-        ).order_by('ordem_exibicao') # 🚨 Adicionado order_by explícito para consistência
-
-        # 3. Determina o Capítulo Atual e o Total
-        total_capitulos = capitulos_anotados.count()
-
-        if total_capitulos == 0:
+        if pagina is None:
             # Não há conteúdo cadastrado
             context = {
                 'total_capitulos': 0,
@@ -67,40 +49,18 @@ class ProjSimCozinhaView(View):
             }
             return render(request, self.template_name, context)
 
-        # Garante que o índice não exceda o total ou seja menor que 1
-        page_index_base_1 = max(1, min(page_index_base_1, total_capitulos))
-
-        # Obtém o objeto do catálogo (capítulo) que corresponde ao índice
-        capitulo_atual = get_object_or_404(
-            capitulos_anotados,
-            capitulo_index_base_1=page_index_base_1
-        )
-
-        # 4. Determina os Capítulos de Navegação (Anterior e Próximo)
-        capitulo_anterior = None
-        if page_index_base_1 > 1:
-            capitulo_anterior = capitulos_anotados.filter(
-                capitulo_index_base_1=(page_index_base_1 - 1)
-            ).first()
-
-        proximo_capitulo = None
-        if page_index_base_1 < total_capitulos:
-            proximo_capitulo = capitulos_anotados.filter(
-                capitulo_index_base_1=(page_index_base_1 + 1)
-            ).first()
-
-        # 5. Contexto para o Template
+        # 2. Contexto para o Template
         context = {
             # Títulos
             'catalogo_titulo': 'Simoninha na Cozinha - Catálogo de Eventos',
-            'titulo_pagina': capitulo_atual.titulo,
+            'titulo_pagina': pagina.objeto.titulo,
 
             # Navegação
-            'capitulo': capitulo_atual,
-            'capitulo_ordem': page_index_base_1,
-            'total_capitulos': total_capitulos,
-            'capitulo_anterior': capitulo_anterior,
-            'proximo_capitulo': proximo_capitulo,
+            'capitulo': pagina.objeto,
+            'capitulo_ordem': pagina.posicao,
+            'total_capitulos': pagina.total,
+            'capitulo_anterior': pagina.anterior,
+            'proximo_capitulo': pagina.proximo,
         }
 
-        return render(request, self.template_name, context)
\ No newline at end of file
+        return render(request, self.template_name, context)
@@ -2,6 +2,8 @@ from django.contrib import admin
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.models import Group
 
+from core.admin import filtro_com_relacoes
+from users.models import RELACOES_REGISTRO_USUARIO, relacoes_usuario
 from .models import Topico, MensagemSuporte, TopicoStatus
 
 # ==============================================================================
@@ -34,6 +36,8 @@ class MensagemSuporteInline(admin.TabularInline):
 @admin.register(Topico)
 class TopicoAdmin(admin.ModelAdmin):
     list_display = ('id', 'assunto_preview', 'criador', 'status', 'admin_responsavel', 'criado_em')
+    list_select_related = (*relacoes_usuario('criador'), *relacoes_usuario('admin_responsavel'))
+    orcamento_queries = 8
     list_display_links = ('assunto_preview',)
     list_filter = ('status', 'criado_em', 'admin_responsavel__username')
     search_fields = ('assunto', 'criador__username', 'mensagens__conteudo')
@@ -100,7 +104,10 @@ class TopicoAdmin(admin.ModelAdmin):
 @admin.register(MensagemSuporte)
 class MensagemSuporteAdmin(admin.ModelAdmin):
     list_display = ('topico_id', 'autor', 'conteudo_preview', 'timestamp')
-    list_filter = ('topico__assunto', 'autor')
+    # O __str__ (checkbox das ações) lê o tópico
+    list_select_related = ('topico', *relacoes_usuario('autor'))
+    list_filter = ('topico__assunto', ('autor', filtro_com_relacoes(*RELACOES_REGISTRO_USUARIO)))
+    orcamento_queries = 9
     search_fields = ('conteudo', 'topico__assunto', 'autor__username')
     date_hierarchy = 'timestamp'
 
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-19 20:03
+
+from django.db import migrations, models
+from django.db.models.functions import Now
+
+
+def marcar_topicos_existentes(apps, schema_editor):
+    # Sem histórico de leitura: as respostas antigas não voltam como não lidas
+    # quando o HASH de contadores for recarregado do banco.
+    apps.get_model('suporte', 'Topico').objects.update(criador_leu_em=Now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suporte', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='topico',
+            name='criador_leu_em',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Lido pelo Criador Em'),
+        ),
+        migrations.RunPython(marcar_topicos_existentes, migrations.RunPython.noop),
+    ]
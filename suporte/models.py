@@ -73,6 +73,14 @@ class Topico(models.Model):
         auto_now=True
     )
 
+    # Última vez que o criador abriu o tópico: base do contador de não lidas
+    # quando o HASH do Redis é recarregado (mensagens/notificacoes.py).
+    criador_leu_em = models.DateTimeField(
+        _("Lido pelo Criador Em"),
+        null=True,
+        blank=True
+    )
+
     class Meta:
         verbose_name = _("Tópico de Suporte")
         verbose_name_plural = _("Tópicos de Suporte")
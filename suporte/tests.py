@@ -1,3 +1,48 @@
-from django.test import TestCase
+from django.contrib.auth.models import Group as AuthGroup
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
 
-# Create your tests here.
+from core import massa_dados
+from core.orcamento import OrcamentoQueriesMixin
+
+from .admin import grupo_suporte
+
+CACHE_LOCAL = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+# ==============================================================================
+# ORÇAMENTO DE QUERIES DO SUPORTE (core/orcamento.py)
+# ==============================================================================
+# Vários usuários com dezenas de tópicos respondidos pela equipe de suporte.
+
+@override_settings(CACHES=CACHE_LOCAL)
+class OrcamentoSuporteTests(OrcamentoQueriesMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.suporte = massa_dados.criar_usuario('atendente')
+        cls.suporte.groups.add(AuthGroup.objects.create(name=grupo_suporte))
+        cls.usuarios = massa_dados.criar_usuarios(4)
+        for usuario in cls.usuarios:
+            massa_dados.criar_topicos(usuario, 30, cls.suporte)
+        cls.admin = massa_dados.criar_usuario('diretoria', is_staff=True, is_superuser=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_lista_de_topicos_do_usuario(self):
+        self.entrar(self.usuarios[0])
+        response = self.assertOrcamentoDaUrl(reverse('suporte:topico_list'))
+        self.assertEqual(len(response.context['topicos']), 30)
+
+    def test_lista_de_topicos_da_equipe(self):
+        self.entrar(self.suporte)
+        response = self.assertOrcamentoDaUrl(reverse('suporte:topico_list'))
+        self.assertEqual(len(response.context['topicos']), 30 * len(self.usuarios))
+
+    def test_changelists_do_admin(self):
+        self.entrar(self.admin)
+        for modelo in ('topico', 'mensagemsuporte'):
+            with self.subTest(modelo=modelo):
+                self.assertOrcamentoDaUrl(reverse(f'admin:suporte_{modelo}_changelist'))
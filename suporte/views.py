@@ -3,9 +3,10 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse_lazy
 from django.views.generic import ListView, CreateView, DetailView, View
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.db.models import Q
+from django.db.models import OuterRef, Q, Subquery
 from django.contrib import messages
 from django.http import HttpResponseRedirect
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from .models import Topico, MensagemSuporte, TopicoStatus
@@ -13,6 +14,7 @@ from .models import Topico, MensagemSuporte, TopicoStatus
 from .forms import TopicoCreateForm, MensagemSuporteForm, TopicoStatusForm
 from users.models import CustomUser  # Assumindo que seu CustomUser está em users.models
 from .admin import grupo_suporte
+from mensagens import notificacoes
 
 
 # ==============================================================================
@@ -68,6 +70,7 @@ class TopicoListView(LoginRequiredMixin, ListView):
     model = Topico
     template_name = 'suporte/topico_list.html'
     context_object_name = 'topicos'
+    orcamento_queries = 4
 
     def get_queryset(self):
         """
@@ -87,22 +90,33 @@ class TopicoListView(LoginRequiredMixin, ListView):
             # Usuário comum vê APENAS os seus tópicos
             queryset = Topico.objects.filter(criador=user).order_by('-atualizado_em')
 
+        # Autor da última mensagem de cada tópico, na mesma consulta da lista
+        ultima = MensagemSuporte.objects.filter(topico=OuterRef('pk')).order_by('-timestamp', '-pk')
+        queryset = queryset.annotate(ultimo_autor_id=Subquery(ultima.values('autor_id')[:1]))
+
+        # Quais desses autores são da equipe de suporte: uma consulta para todos
+        autores = {topico.ultimo_autor_id for topico in queryset if topico.ultimo_autor_id}
+        autores_suporte = set(
+            CustomUser.objects.filter(pk__in=autores)
+            .filter(Q(is_staff=True) | Q(groups__name=grupo_suporte))
+            .values_list('pk', flat=True)
+        )
+
         # Lógica de Notificação: Se o último autor da mensagem não foi o usuário,
         # e o status não for Resolvido/Fechado, o tópico pode ter uma nova resposta.
         for topico in queryset:
-            ultima_mensagem = topico.mensagens.last()
+            ultimo_autor_id = topico.ultimo_autor_id
 
             # Se a última mensagem existir e não for do próprio criador:
-            if ultima_mensagem and ultima_mensagem.autor != self.request.user:
+            if ultimo_autor_id and ultimo_autor_id != user.pk:
                 # E o status sugere que a bola está com o usuário
                 if topico.status in [TopicoStatus.EM_ATENDIMENTO, TopicoStatus.AGUARDANDO_INFO]:
                     # Lógica para usuários comuns: nova resposta se veio do suporte
-                    if not is_suporte_equipe and (ultima_mensagem.autor.is_staff or ultima_mensagem.autor.groups.filter(
-                            name=grupo_suporte).exists()):
+                    if not is_suporte_equipe and ultimo_autor_id in autores_suporte:
                         topico.tem_nova_resposta = True
                     # Lógica para equipe de suporte: nova resposta se veio do usuário comum
                     elif is_suporte_equipe and (
-                            topico.status == TopicoStatus.NOVO or topico.status == TopicoStatus.AGUARDANDO_INFO) and ultima_mensagem.autor == topico.criador:
+                            topico.status == TopicoStatus.NOVO or topico.status == TopicoStatus.AGUARDANDO_INFO) and ultimo_autor_id == topico.criador_id:
                         topico.tem_nova_resposta = True
                     else:
                         topico.tem_nova_resposta = False
@@ -157,6 +171,12 @@ class TopicoDetailView(LoginRequiredMixin, TopicoSecurityMixin, DetailView):
         # O formulário de resposta sempre estará disponível no detalhe
         context['form'] = MensagemSuporteForm()
 
+        # O criador leu as respostas do suporte: zera o contador deste tópico.
+        # update() evita o auto_now de atualizado_em (ordenação da lista).
+        if self.object.criador_id == self.request.user.id:
+            Topico.objects.filter(pk=self.object.pk).update(criador_leu_em=timezone.now())
+            notificacoes.marcar_lido(self.request.user.id, f'suporte:{self.object.pk}')
+
         # Filtra e ordena as mensagens para exibição
         context['mensagens'] = self.object.mensagens.all().select_related('autor')
 
@@ -213,6 +233,10 @@ class MensagemSuporteCreateView(LoginRequiredMixin, TopicoSecurityMixin, View):
 
             topico.save()
 
+            # Resposta do suporte: incrementa o badge de não lidas do criador (tempo real).
+            if is_suporte and request.user != topico.criador:
+                notificacoes.notificar_usuario(topico.criador_id, f'suporte:{topico.pk}')
+
             messages.success(request, _("Mensagem enviada com sucesso."))
 
         else:
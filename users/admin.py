@@ -1,25 +1,28 @@
 from django.contrib import admin
-import json
 from django.utils.translation import gettext_lazy as _
 from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin
-from django.db import transaction, connection
-from django.http import HttpResponseRedirect
+from django.db import transaction
+from django.http import FileResponse, Http404, HttpResponseRedirect
 from django.db.utils import IntegrityError
 from django.contrib.auth.models import Group as AuthGroup
 from django import forms
 from django.core.exceptions import ValidationError
 from django.contrib.admin.options import flatten_fieldsets
 from django.shortcuts import render
-from django.urls import reverse
+from django.urls import path, reverse
+from django.utils.html import format_html
 from django.contrib.admin import helpers
 
 # Importa todos os modelos necessários
 from .models import (
     CustomUser, Profile, RegistroAluno, Turma, Grupo, MembroGrupo, JSONUpload,
     RegistroProfessor, RegistroColaborador, RegistroResponsavel, RegistroURE,
-    RegistroOutrosVisitantes, CustomUserTipo
+    RegistroOutrosVisitantes, CustomUserTipo, RELACOES_REGISTRO_USUARIO, relacoes_usuario
+)
+from .grupos import (
+    adicionar_ao_grupo, remover_do_grupo, usuarios_da_turma, matricular_registros, registros_da_turma
 )
 
 User = get_user_model()
@@ -36,6 +39,72 @@ class GrupoSelectForm(forms.Form):
         label=_("Selecione o Grupo de Audiência"),
         required=True
     )
+    turma = forms.ModelChoiceField(
+        queryset=Turma.objects.filter(ativo=True),
+        label=_("Aplicar à Turma inteira (opcional)"),
+        required=False,
+        help_text=_("Se informada, a ação vale para todos os alunos da turma, no lugar da seleção.")
+    )
+
+
+class MatriculaGrupoForm(forms.Form):
+    """Formulário da matrícula em massa de Registros em um Grupo de Audiência."""
+    grupo = forms.ModelChoiceField(
+        queryset=Grupo.objects.filter(ativo=True),
+        label=_("Selecione o Grupo de Audiência"),
+        required=True
+    )
+    incluir_responsaveis = forms.BooleanField(
+        label=_("Incluir os responsáveis dos alunos"),
+        required=False,
+        initial=True
+    )
+
+
+class MatriculaGrupoMixin:
+    """Ação de matrícula em massa (users/grupos.py: matricular_registros)."""
+
+    def _matricular_em_grupo(self, request, queryset, action_name, registros_da_selecao):
+        if 'apply' in request.POST:
+            form = MatriculaGrupoForm(request.POST)
+
+            if form.is_valid():
+                grupo = form.cleaned_data['grupo']
+                registros = registros_da_selecao(queryset, form.cleaned_data['incluir_responsaveis'])
+                try:
+                    novos = matricular_registros(grupo, registros)
+                except ValidationError as e:
+                    self.message_user(request, '; '.join(e.messages), level=messages.ERROR)
+                    return None
+                self.message_user(request, _(
+                    "%(novos)s registros matriculados no Grupo de Audiência '%(grupo)s' "
+                    "(%(membros)s já eram membros)."
+                ) % {
+                    'novos': len(novos),
+                    'grupo': grupo.auth_group.name,
+                    'membros': len(set(registros)) - len(novos),
+                })
+                return None
+        else:
+            form = MatriculaGrupoForm()
+
+        total = queryset.count()
+        context = self.admin_site.each_context(request)
+        context.update({
+            'title': _("Matricular em um Grupo de Audiência"),
+            'queryset': queryset,
+            'total': total,
+            'action_name': action_name,
+            'form': form,
+            'opts': self.model._meta,
+            'media': self.media,
+            'action_button_name': 'apply',
+            'description': _(
+                'Total de %(total)s selecionados. Selecione o grupo de audiência da matrícula.'
+            ) % {'total': total},
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
+        return render(request, 'admin/action_confirmation.html', context)
 
 
 class CustomUserChangeForm(forms.ModelForm):
@@ -60,7 +129,10 @@ class CustomUserAdmin(UserAdmin):
     form = CustomUserChangeForm
 
     list_display = ('username', 'email', 'tipo_usuario', 'is_staff', 'get_groups')
-    list_filter = ('is_staff', 'is_superuser', 'is_active', 'groups', 'tipo_usuario')
+    # O checkbox das ações usa o __str__ de cada linha, que lê o registro vinculado
+    list_select_related = RELACOES_REGISTRO_USUARIO
+    list_filter = ('is_staff', 'is_superuser', 'is_active', 'groups', 'tipo_usuario', 'registro_aluno__turma')
+    orcamento_queries = 8
     search_fields = ('username', 'first_name', 'last_name', 'email')
 
     fieldsets = UserAdmin.fieldsets + (
@@ -74,36 +146,32 @@ class CustomUserAdmin(UserAdmin):
         }),
     )
 
-    actions = ['add_to_group_mass']
+    actions = ['add_to_group_mass', 'remove_from_group_mass']
 
     # --------------------------------------------------------------------------
     # MÉTODOS AUXILIARES
     # --------------------------------------------------------------------------
+    def get_queryset(self, request):
+        # Grupos de todas as linhas da página em uma consulta (coluna get_groups)
+        return super().get_queryset(request).prefetch_related('groups')
+
     def get_groups(self, obj):
         return ", ".join([g.name for g in obj.groups.all()])
 
     get_groups.short_description = _('Grupos de Audiência (Projeto)')
 
     # --------------------------------------------------------------------------
-    # 🎯 AÇÃO AUTOCONTIDA (IMPLEMENTAÇÃO ROBUSTA E COMPATÍVEL)
+    # 🎯 AÇÕES EM MASSA (users/grupos.py: um único comando por operação)
     # --------------------------------------------------------------------------
 
-    @transaction.atomic
-    def add_to_group_mass(self, request, queryset):
+    def _acao_grupo_em_massa(self, request, queryset, action_name, operacao, title, description):
         """
-        Ação em massa que lida com a confirmação e o processamento de forma autocontida.
-        Usa SQL Direto com o nome da tabela obtido dinamicamente.
+        Confirmação + processamento das ações de grupo. O queryset já vem com a
+        seleção completa quando o admin usa "selecionar todos" no changelist
+        filtrado; o campo turma troca a seleção pelos alunos da turma inteira.
         """
         opts = self.model._meta
-
-        # 1. Obter o nome real da tabela e colunas (CORREÇÃO CRUCIAL DO ERRO ProgrammingError)
-        ThroughModel = CustomUser.groups.through
-        groups_table = ThroughModel._meta.db_table  # Isso deve retornar 'users_customuser_groups'
-
-        # Obtém o nome da coluna FK do CustomUser (ex: 'customuser_id')
-        user_fk_column = ThroughModel._meta.get_field('customuser').column
-        # Obtém o nome da coluna FK do AuthGroup (ex: 'group_id')
-        group_fk_column = ThroughModel._meta.get_field('group').column
+        select_across = request.POST.get('select_across') == '1'
 
         # 1. VERIFICAÇÃO DE SUBMISSÃO (POST de Confirmação)
         if 'apply' in request.POST:
@@ -111,58 +179,58 @@ class CustomUserAdmin(UserAdmin):
 
             if form.is_valid():
                 grupo = form.cleaned_data['grupo']
-                auth_group = grupo.auth_group
-                added_count = 0
-
-                user_pks = queryset.values_list('pk', flat=True)
-
-                # Gravação Isolada e Robusta (SQL Direto)
-                with connection.cursor() as cursor:
-                    # SQL construído com nomes de tabela e colunas obtidos dinamicamente
-                    sql = f"""
-                        INSERT INTO {groups_table} ({user_fk_column}, {group_fk_column})
-                        VALUES (%s, %s)
-                        ON CONFLICT DO NOTHING;
-                    """
-                    auth_group_id = auth_group.pk
-
-                    for user_id in user_pks:
-                        # Passa user_id e group_id como parâmetros de segurança
-                        cursor.execute(sql, [user_id, auth_group_id])
-                        added_count += cursor.rowcount
-
-                self.message_user(request,
-                                  f"{added_count} CustomUsers associados com sucesso ao Grupo de Audiência '{grupo.auth_group.name}' (Processamento Concluído).")
-
-                # Invalida o cache do Django (necessário após SQL direto)
-                User.objects.all().update()
+                turma = form.cleaned_data.get('turma')
+                usuarios = usuarios_da_turma(turma) if turma else queryset
 
+                total = operacao(usuarios, grupo.auth_group)
+                self.message_user(request, _(
+                    "%(total)s vínculos alterados no Grupo de Audiência '%(grupo)s' (Processamento Concluído)."
+                ) % {'total': total, 'grupo': grupo.auth_group.name})
                 return None
-
-        # 2. RENDERIZAÇÃO DA TELA DE CONFIRMAÇÃO (GET ou POST com erro)
-
-        if 'apply' not in request.POST:
+        else:
             form = GrupoSelectForm()
-            # Se 'apply' estava presente, mas o form não era válido, usamos o form com erros
 
+        # 2. RENDERIZAÇÃO DA TELA DE CONFIRMAÇÃO (GET ou POST com erro)
+        total = queryset.count()
         context = self.admin_site.each_context(request)
         context.update({
-            'title': _("Associar CustomUsers Selecionados a um Grupo de Audiência"),
-            'queryset': queryset,
-            'action_name': 'add_to_group_mass',
+            'title': title,
+            # Com "selecionar todos" a seleção é refeita pelo filtro da URL: não
+            # é preciso repetir milhares de ids no formulário.
+            'queryset': queryset.none() if select_across else queryset,
+            'total': total,
+            'select_across': select_across,
+            'action_name': action_name,
             'form': form,
             'opts': opts,
             'media': self.media,
             'action_button_name': 'apply',
-            'description': _(
-                f'Total de {queryset.count()} usuários selecionados. Selecione o grupo de audiência para adicionar.'),
+            'description': _('Total de %(total)s usuários selecionados. %(descricao)s') % {
+                'total': total, 'descricao': description,
+            },
             'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
         })
 
         return render(request, 'admin/action_confirmation.html', context)
 
+    def add_to_group_mass(self, request, queryset):
+        return self._acao_grupo_em_massa(
+            request, queryset, 'add_to_group_mass', adicionar_ao_grupo,
+            _("Associar CustomUsers Selecionados a um Grupo de Audiência"),
+            _('Selecione o grupo de audiência para adicionar.'),
+        )
+
     add_to_group_mass.short_description = _("Associar CustomUsers selecionados a um Grupo de Audiência")
 
+    def remove_from_group_mass(self, request, queryset):
+        return self._acao_grupo_em_massa(
+            request, queryset, 'remove_from_group_mass', remover_do_grupo,
+            _("Remover CustomUsers Selecionados de um Grupo de Audiência"),
+            _('Selecione o grupo de audiência do qual remover.'),
+        )
+
+    remove_from_group_mass.short_description = _("Remover CustomUsers selecionados de um Grupo de Audiência")
+
     # --------------------------------------------------------------------------
     # MÉTODOS DE SALVAMENTO (Para Edição Individual)
     # --------------------------------------------------------------------------
@@ -176,7 +244,9 @@ class CustomUserAdmin(UserAdmin):
 
             if auth_group not in obj.groups.all():
                 obj.groups.add(auth_group)
-                messages.success(request, _(f"Usuário '{obj.username}' associado ao grupo '{auth_group.name}'."))
+                messages.success(request, _("Usuário '%(usuario)s' associado ao grupo '%(grupo)s'.") % {
+                    'usuario': obj.username, 'grupo': auth_group.name,
+                })
 
     def get_form(self, request, obj=None, **kwargs):
         form = super().get_form(request, obj, **kwargs)
@@ -200,14 +270,30 @@ class CustomUserAdmin(UserAdmin):
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'data_nascimento', 'cidade', 'estado')
+    list_select_related = relacoes_usuario('user')
+    orcamento_queries = 5
     search_fields = ('user__username', 'user__email')
 
 
 @admin.register(RegistroAluno)
-class RegistroAlunoAdmin(admin.ModelAdmin):
+class RegistroAlunoAdmin(MatriculaGrupoMixin, admin.ModelAdmin):
     list_display = ('nome_completo', 'ra_numero', 'turma')
+    list_select_related = ('turma',)
     search_fields = ('nome_completo', 'ra_numero')
     list_filter = ('turma__ano_letivo', 'turma')
+    orcamento_queries = 7
+    actions = ['matricular_em_grupo']
+
+    @staticmethod
+    def _registros(queryset, incluir_responsaveis):
+        alunos = list(queryset)
+        if not incluir_responsaveis:
+            return alunos
+        return alunos + list(RegistroResponsavel.objects.filter(alunos__in=queryset).distinct())
+
+    @admin.action(description=_("Matricular alunos selecionados em um Grupo de Audiência"))
+    def matricular_em_grupo(self, request, queryset):
+        return self._matricular_em_grupo(request, queryset, 'matricular_em_grupo', self._registros)
 
 
 @admin.register(RegistroColaborador)
@@ -259,18 +345,36 @@ class RegistroAlunoInline(admin.TabularInline):
     verbose_name_plural = _("Alunos da Turma")
 
 
-class TurmaAdmin(admin.ModelAdmin):
+class TurmaAdmin(MatriculaGrupoMixin, admin.ModelAdmin):
     list_display = ('nome', 'ano_letivo', 'ativo', 'professor_regente', 'display_adicionais')
+    list_select_related = ('professor_regente',)
     list_filter = ('ativo', 'ano_letivo')
+    orcamento_queries = 7
     search_fields = ('nome', 'professor_regente__nome_completo')
     inlines = [ProfessorAdicionalInline, RegistroAlunoInline]  # ADICIONADO RegistroAlunoInline
     fields = ('nome', 'ano_letivo', 'ativo', 'professor_regente')
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('professores_adicionais')
+
     def display_adicionais(self, obj):
         return ", ".join([prof.nome_completo for prof in obj.professores_adicionais.all()])
 
     display_adicionais.short_description = "Professores Adicionais"
 
+    actions = ['matricular_em_grupo']
+
+    @staticmethod
+    def _registros(queryset, incluir_responsaveis):
+        registros = []
+        for turma in queryset:
+            registros.extend(registros_da_turma(turma, incluir_responsaveis))
+        return registros
+
+    @admin.action(description=_("Matricular turmas selecionadas (alunos e responsáveis) em um Grupo de Audiência"))
+    def matricular_em_grupo(self, request, queryset):
+        return self._matricular_em_grupo(request, queryset, 'matricular_em_grupo', self._registros)
+
 
 @admin.register(RegistroProfessor)
 class RegistroProfessorAdmin(admin.ModelAdmin):
@@ -287,7 +391,9 @@ class RegistroProfessorAdmin(admin.ModelAdmin):
 class GrupoAdmin(admin.ModelAdmin):
     """Admin para o modelo Grupo, gerencia a criação do AuthGroup."""
     list_display = ('__str__', 'tipo', 'ativo', 'criado_em')
+    list_select_related = ('auth_group',)
     list_filter = ('tipo', 'ativo')
+    orcamento_queries = 5
     search_fields = ('auth_group__name', 'descricao')
 
     readonly_fields = ('criado_em', 'auth_group_name')
@@ -383,9 +489,17 @@ class GrupoAdmin(admin.ModelAdmin):
 
 @admin.register(JSONUpload)
 class JSONUploadAdmin(admin.ModelAdmin):
-    list_display = ('turma', 'json_file', 'uploaded_at')
-    fields = ('turma', 'json_file',)
-    list_filter = ('turma',)
+    list_display = ('turma', 'json_file', 'uploaded_at', 'status', 'progresso', 'erros', 'relatorio_link')
+    fields = ('turma', 'json_file', 'grupo')
+    list_filter = ('turma', 'status')
+    change_form_template = 'admin/users/jsonupload/change_form.html'
+    actions = ['retomar_importacao']
+
+    # Depois do envio, o registro só acompanha a importação (somente leitura)
+    campos_acompanhamento = (
+        'turma', 'grupo', 'status', 'progresso', 'criados', 'atualizados', 'inalterados',
+        'erros', 'mensagem', 'relatorio_link', 'enviado_por', 'uploaded_at', 'iniciado_em', 'concluido_em',
+    )
 
     def has_change_permission(self, request, obj=None):
         return False
@@ -393,80 +507,80 @@ class JSONUploadAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         return False
 
-    @transaction.atomic
-    def save_model(self, request, obj, form, change):
-        super().save_model(request, obj, form, change)
-
-        file_path = obj.json_file.path
-        create_count = 0
-        update_count = 0
-        error_count = 0
-
-        turma_selecionada = obj.turma
-
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            if not isinstance(data, list):
-                raise ValueError("O JSON deve ser uma lista de objetos (alunos).")
-
-            for item in data:
-                nome_completo = item.get('nome_completo')
-                ra_numero = item.get('ra_numero')
-                ra_digito_verificador = item.get('ra_digito_verificador')
-
-                if not ra_numero or not ra_digito_verificador:
-                    error_count += 1
-                    continue
-
-                try:
-                    # Atualiza ou cria o RegistroAluno
-                    aluno, created = RegistroAluno.objects.update_or_create(
-                        ra_numero=ra_numero,
-                        ra_digito_verificador=ra_digito_verificador,
-                        defaults={
-                            'nome_completo': nome_completo,
-                            'turma': turma_selecionada
-                        }
-                    )
-
-                    # CORREÇÃO APLICADA: NENHUM CustomUser ou Profile é criado aqui.
-
-                    if created:
-                        create_count += 1
-                    else:
-                        update_count += 1
-
-                except IntegrityError:
-                    messages.error(request, f"Erro de integridade ao processar RA '{ra_numero}'.")
-                    error_count += 1
-                except Exception as e:
-                    messages.error(request, f"Erro desconhecido ao processar RA '{ra_numero}': {e}")
-                    error_count += 1
-
-            msg = (f"Processamento concluído: {create_count} registros criados. "
-                   f"{update_count} registros atualizados (turma ou nome). "
-                   f"({error_count} erros)")
-            if error_count == 0:
-                messages.success(request, msg)
-            else:
-                messages.warning(request, msg)
+    def get_fields(self, request, obj=None):
+        if obj:
+            return self.campos_acompanhamento
+        return self.fields
 
+    def get_readonly_fields(self, request, obj=None):
+        if obj:
+            return self.campos_acompanhamento
+        return ()
+
+    @admin.display(description=_("Progresso"))
+    def progresso(self, obj):
+        if not obj.total:
+            return '-'
+        return f"{obj.processados}/{obj.total}"
+
+    @admin.display(description=_("Relatório de Erros"))
+    def relatorio_link(self, obj):
+        if not obj.relatorio_erros:
+            return '-'
+        url = reverse('admin:users_jsonupload_relatorio', args=[obj.pk])
+        return format_html('<a href="{}">{}</a>', url, _("Baixar CSV"))
+
+    def get_urls(self):
+        urls = super().get_urls()
+        extras = [
+            path(
+                '<path:object_id>/relatorio/',
+                self.admin_site.admin_view(self.relatorio_view),
+                name='users_jsonupload_relatorio',
+            ),
+        ]
+        return extras + urls
+
+    def relatorio_view(self, request, object_id):
+        upload = self.get_object(request, object_id)
+        if upload is None or not upload.relatorio_erros or not self.has_view_permission(request, upload):
+            raise Http404
+        return FileResponse(
+            upload.relatorio_erros.open('rb'),
+            as_attachment=True,
+            filename=f"erros_importacao_{upload.pk}.csv",
+        )
 
-        except json.JSONDecodeError:
-            messages.error(request, "Falha: O arquivo não é um JSON válido.")
-        except ValueError as ve:
-            messages.error(request, f"Falha na estrutura: {ve}")
-        except Exception as e:
-            messages.error(request, f"Erro inesperado no processamento do arquivo: {e}")
-        finally:
-            try:
-                obj.json_file.delete(save=False)
-            except Exception:
-                pass
+    def save_model(self, request, obj, form, change):
+        # A importação roda no Celery (users/tasks.py); aqui só registra o envio.
+        from .tasks import importar_alunos_json_task
 
-            obj.delete()
+        obj.enviado_por = request.user
+        obj.status = JSONUpload.Status.PENDENTE
+        super().save_model(request, obj, form, change)
+        transaction.on_commit(lambda: importar_alunos_json_task.delay(obj.pk))
+        messages.info(
+            request,
+            _("Importação enviada para processamento em segundo plano. "
+              "Acompanhe o progresso na página do envio.")
+        )
+
+    @admin.action(description=_("Retomar importações interrompidas"))
+    def retomar_importacao(self, request, queryset):
+        # Só as paradas em PROCESSANDO além do limite de tempo (worker morto):
+        # as demais já terminaram ou ainda podem estar rodando.
+        from .tasks import importar_alunos_json_task, interrompida
+
+        paradas = [upload.pk for upload in queryset.only('status', 'iniciado_em') if interrompida(upload)]
+        for upload_id in paradas:
+            importar_alunos_json_task.delay(upload_id)
+        self.message_user(request, _(
+            "%(total)s importações reenviadas para processamento."
+        ) % {'total': len(paradas)})
+
+    def response_add(self, request, obj, post_url_continue=None):
+        # Vai direto para a página de acompanhamento do envio
+        return HttpResponseRedirect(reverse('admin:users_jsonupload_change', args=[obj.pk]))
 
         return HttpResponseRedirect("../")
 
@@ -479,7 +593,9 @@ class JSONUploadAdmin(admin.ModelAdmin):
 class MembroGrupoAdmin(admin.ModelAdmin):
     """Admin simplificado, apenas para visualização e gerenciamento do link Registro -> Grupo."""
     list_display = ('grupo', 'display_registro')
+    list_select_related = ('grupo__auth_group', 'aluno', 'professor', 'colaborador', 'responsavel', 'ure', 'visitante')
     list_filter = ('grupo__auth_group__name',)
+    orcamento_queries = 6
     search_fields = ('grupo__auth_group__name', 'aluno__nome_completo', 'professor__nome_completo')
     raw_id_fields = ('aluno', 'professor', 'colaborador', 'responsavel', 'ure', 'visitante', 'grupo')
 
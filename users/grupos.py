@@ -0,0 +1,181 @@
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.dispatch import Signal
+from django.utils.translation import gettext as _
+
+from .models import (
+    CustomUser, MembroGrupo, RegistroAluno, RegistroProfessor, RegistroColaborador,
+    RegistroResponsavel, RegistroURE, RegistroOutrosVisitantes
+)
+
+# Enviado uma vez por operação em massa, no lugar dos m2m_changed/post_save por
+# linha. Argumentos: auth_group_id, acao ('adicionar' ou 'remover'), vinculos
+# (quantidade de linhas alteradas em CustomUser.groups) e membros (MembroGrupo
+# criados; vazio nas ações de CustomUser).
+membros_grupo_alterados = Signal()
+
+# Campo de MembroGrupo (e de CustomUser, com o prefixo registro_) de cada tipo de Registro
+CAMPOS_REGISTRO = {
+    RegistroAluno: 'aluno',
+    RegistroProfessor: 'professor',
+    RegistroColaborador: 'colaborador',
+    RegistroResponsavel: 'responsavel',
+    RegistroURE: 'ure',
+    RegistroOutrosVisitantes: 'visitante',
+}
+
+
+# ==============================================================================
+# ASSOCIAÇÃO EM MASSA A GRUPOS (tabela users_customuser_groups)
+# ==============================================================================
+# Usado pelas ações do CustomUserAdmin. Cada operação é um único comando
+# baseado em conjunto (INSERT ... SELECT / DELETE ... WHERE IN), qualquer que
+# seja o tamanho da seleção: a página atual, "selecionar todos" do changelist
+# filtrado ou uma Turma inteira.
+#
+# O SQL direto e o delete em massa não disparam o m2m_changed de
+# CustomUser.groups: cada operação envia um único membros_grupo_alterados, e o
+# cache de membros do Redis é invalidado por ele (mensagens/signals.py). O bloco
+# de galerias do dashboard (repositorio/cache.py) não precisa: a chave dele já
+# inclui os grupos do usuário.
+
+def _tabela():
+    through = CustomUser.groups.through
+    return (
+        through,
+        through._meta.db_table,
+        through._meta.get_field('customuser').column,
+        through._meta.get_field('group').column,
+    )
+
+
+def usuarios_da_turma(turma):
+    """Usuários vinculados aos alunos da turma (QuerySet, não avaliado)."""
+    return CustomUser.objects.filter(registro_aluno__turma=turma)
+
+
+def _avisar(auth_group_id, acao, vinculos, membros=()):
+    membros = list(membros)
+    transaction.on_commit(lambda: membros_grupo_alterados.send(
+        sender=MembroGrupo,
+        auth_group_id=auth_group_id,
+        acao=acao,
+        vinculos=vinculos,
+        membros=membros,
+    ))
+
+
+def _inserir_vinculos(usuarios, auth_group):
+    tabela, coluna_usuario, coluna_grupo = _tabela()[1:]
+    subquery, params = usuarios.order_by().values('pk').query.sql_with_params()
+    pk = CustomUser._meta.pk.column
+
+    sql = f"""
+        INSERT INTO {tabela} ({coluna_usuario}, {coluna_grupo})
+        SELECT u.{pk}, %s FROM {CustomUser._meta.db_table} u
+        WHERE u.{pk} IN ({subquery})
+        ON CONFLICT DO NOTHING
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [auth_group.pk, *params])
+        return cursor.rowcount
+
+
+def adicionar_ao_grupo(usuarios, auth_group):
+    """
+    Adiciona ao AuthGroup todos os usuários do QuerySet em um único
+    INSERT ... SELECT. Vínculos já existentes são ignorados (ON CONFLICT).
+    Retorna quantos vínculos foram criados.
+    """
+    with transaction.atomic():
+        criados = _inserir_vinculos(usuarios, auth_group)
+        if criados:
+            _avisar(auth_group.pk, 'adicionar', criados)
+    return criados
+
+
+def remover_do_grupo(usuarios, auth_group):
+    """
+    Remove do AuthGroup todos os usuários do QuerySet em um único DELETE.
+    Retorna quantos vínculos foram removidos.
+    """
+    through = _tabela()[0]
+    with transaction.atomic():
+        removidos = through.objects.filter(
+            group=auth_group,
+            customuser__in=usuarios.order_by().values('pk'),
+        ).delete()[0]
+        if removidos:
+            _avisar(auth_group.pk, 'remover', removidos)
+    return removidos
+
+
+# ==============================================================================
+# MATRÍCULA EM MASSA (MembroGrupo)
+# ==============================================================================
+# MembroGrupo.save() roda full_clean() e os receivers de post_save fazem um
+# user.groups.add() por linha. Aqui a validação é feita em memória, as linhas
+# saem em um bulk_create e os usuários vinculados entram no AuthGroup em um
+# único INSERT ... SELECT (nenhum dos dois dispara os receivers por linha).
+
+def registros_da_turma(turma, incluir_responsaveis=True):
+    """Alunos da turma e, opcionalmente, os responsáveis deles (duas consultas)."""
+    alunos = list(RegistroAluno.objects.filter(turma=turma))
+    if not incluir_responsaveis:
+        return alunos
+    responsaveis = RegistroResponsavel.objects.filter(alunos__turma=turma).distinct()
+    return alunos + list(responsaveis)
+
+
+def matricular_registros(grupo, registros):
+    """
+    Matricula os Registros (de qualquer tipo) no Grupo de Audiência.
+    Registros já matriculados são ignorados; os usuários vinculados a todos
+    eles são sincronizados com o AuthGroup do grupo.
+    Retorna a lista de MembroGrupo criados.
+    Lança ValidationError (sem gravar nada) se algum registro for inválido.
+    """
+    por_campo = {}
+    for registro in registros:
+        campo = CAMPOS_REGISTRO.get(type(registro))
+        if campo is None or registro.pk is None:
+            raise ValidationError(_('Registro inválido para matrícula: %(registro)r.') % {'registro': registro})
+        por_campo.setdefault(campo, {})[registro.pk] = registro
+
+    if not por_campo:
+        return []
+
+    filtro = Q()
+    for campo, registros_campo in por_campo.items():
+        filtro |= Q(**{f'{campo}__in': list(registros_campo)})
+
+    # Uma consulta para os vínculos já existentes, de todos os tipos
+    existentes = set()
+    campos_id = [f'{campo}_id' for campo in por_campo]
+    for valores in MembroGrupo.objects.filter(filtro, grupo=grupo).values_list(*campos_id):
+        for campo, pk in zip(por_campo, valores):
+            if pk is not None:
+                existentes.add((campo, pk))
+
+    novos = []
+    for campo, registros_campo in por_campo.items():
+        for pk, registro in registros_campo.items():
+            if (campo, pk) in existentes:
+                continue
+            membro = MembroGrupo(grupo=grupo, **{campo: registro})
+            membro.clean()
+            novos.append(membro)
+
+    usuarios = CustomUser.objects.filter(
+        Q(*[Q(**{f'registro_{campo}__in': list(registros_campo)})
+            for campo, registros_campo in por_campo.items()], _connector=Q.OR)
+    )
+
+    with transaction.atomic():
+        MembroGrupo.objects.bulk_create(novos)
+        vinculos = _inserir_vinculos(usuarios, grupo.auth_group)
+        if novos or vinculos:
+            _avisar(grupo.auth_group_id, 'adicionar', vinculos, novos)
+
+    return novos
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_alter_membrogrupo_aluno_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jsonupload',
+            name='atualizados',
+            field=models.PositiveIntegerField(default=0, verbose_name='Atualizados'),
+        ),
+        migrations.AddField(
+            model_name='jsonupload',
+            name='concluido_em',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Concluído em'),
+        ),
+        migrations.AddField(
+            model_name='jsonupload',
+            name='criados',
+            field=models.PositiveIntegerField(default=0, verbose_name='Criados'),
+        ),
+        migrations.AddField(
+            model_name='jsonupload',
+            name='enviado_por',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Enviado por'),
+        ),
+        migrations.AddField(
+            model_name='jsonupload',
+            name='erros',
+            field=models.PositiveIntegerField(default=0, verbose_name='Erros'),
+        ),
+        migrations.AddField(
+            model_name='jsonupload',
+            name='inalterados',
+            field=models.PositiveIntegerField(default=0, verbose_name='Inalterados'),
+        ),
+        migrations.AddField(
+            model_name='jsonupload',
+            name='mensagem',
+            field=models.TextField(blank=True, verbose_name='Mensagem'),
+        ),
+        migrations.AddField(
+            model_name='jsonupload',
+            name='processados',
+            field=models.PositiveIntegerField(default=0, verbose_name='Registros Gravados'),
+        ),
+        migrations.AddField(
+            model_name='jsonupload',
+            name='relatorio_erros',
+            field=models.FileField(blank=True, upload_to='json_uploads/relatorios/', verbose_name='Relatório de Erros (CSV)'),
+        ),
+        migrations.AddField(
+            model_name='jsonupload',
+            name='status',
+            field=models.CharField(choices=[('PENDENTE', 'Na fila'), ('PROCESSANDO', 'Processando'), ('CONCLUIDO', 'Concluído'), ('FALHOU', 'Falhou')], default='PENDENTE', max_length=20, verbose_name='Status'),
+        ),
+        migrations.AddField(
+            model_name='jsonupload',
+            name='total',
+            field=models.PositiveIntegerField(default=0, verbose_name='Registros a Gravar'),
+        ),
+    ]
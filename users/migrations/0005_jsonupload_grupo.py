@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_jsonupload_atualizados_jsonupload_concluido_em_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jsonupload',
+            name='grupo',
+            field=models.ForeignKey(blank=True, help_text='Opcional: os alunos do arquivo (e seus responsáveis) são matriculados neste grupo ao final.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='users.grupo', verbose_name='Matricular no Grupo de Audiência'),
+        ),
+    ]
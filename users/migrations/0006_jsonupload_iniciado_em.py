@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 20:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_jsonupload_grupo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jsonupload',
+            name='iniciado_em',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Iniciado em'),
+        ),
+    ]
@@ -389,6 +389,19 @@ class CustomUser(AbstractUser):
         return f"{nome} ({self.get_tipo_usuario_display()})"
 
 
+# Relações lidas por CustomUser.registro (e pelo __str__). Listagens que exibem
+# usuários devem carregá-las junto (select_related), ou cada linha custa uma query.
+RELACOES_REGISTRO_USUARIO = (
+    'registro_aluno', 'registro_professor', 'registro_colaborador',
+    'registro_responsavel', 'registro_ure', 'registro_visitante',
+)
+
+
+def relacoes_usuario(campo):
+    """select_related do usuário em `campo` e do registro usado no __str__ dele."""
+    return (campo, *(f'{campo}__{relacao}' for relacao in RELACOES_REGISTRO_USUARIO))
+
+
 # ==============================================================================
 # 3. PROFILE (Dados Adicionais do Usuário)
 # ==============================================================================
@@ -623,6 +636,51 @@ class JSONUpload(models.Model):
         auto_now_add=True,
         verbose_name=_("Data de Upload")
     )
+    grupo = models.ForeignKey(
+        'Grupo',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name=_("Matricular no Grupo de Audiência"),
+        help_text=_("Opcional: os alunos do arquivo (e seus responsáveis) são matriculados neste grupo ao final.")
+    )
+
+    # Processamento em segundo plano (users/tasks.py: importar_alunos_json_task)
+    class Status(models.TextChoices):
+        PENDENTE = 'PENDENTE', _('Na fila')
+        PROCESSANDO = 'PROCESSANDO', _('Processando')
+        CONCLUIDO = 'CONCLUIDO', _('Concluído')
+        FALHOU = 'FALHOU', _('Falhou')
+
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDENTE,
+        verbose_name=_("Status")
+    )
+    enviado_por = models.ForeignKey(
+        CustomUser,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name=_("Enviado por")
+    )
+    total = models.PositiveIntegerField(default=0, verbose_name=_("Registros a Gravar"))
+    processados = models.PositiveIntegerField(default=0, verbose_name=_("Registros Gravados"))
+    criados = models.PositiveIntegerField(default=0, verbose_name=_("Criados"))
+    atualizados = models.PositiveIntegerField(default=0, verbose_name=_("Atualizados"))
+    inalterados = models.PositiveIntegerField(default=0, verbose_name=_("Inalterados"))
+    erros = models.PositiveIntegerField(default=0, verbose_name=_("Erros"))
+    mensagem = models.TextField(blank=True, verbose_name=_("Mensagem"))
+    relatorio_erros = models.FileField(
+        upload_to='json_uploads/relatorios/',
+        blank=True,
+        verbose_name=_("Relatório de Erros (CSV)")
+    )
+    iniciado_em = models.DateTimeField(null=True, blank=True, verbose_name=_("Iniciado em"))
+    concluido_em = models.DateTimeField(null=True, blank=True, verbose_name=_("Concluído em"))
 
     class Meta:
         verbose_name = _("Upload de Seeder JSON")
@@ -0,0 +1,216 @@
+import csv
+import io
+import json
+
+from django.db import IntegrityError, transaction
+
+from .grupos import matricular_registros
+from .models import RegistroAluno, RegistroResponsavel
+
+
+# ==============================================================================
+# SEEDER DE ALUNOS (JSONUpload)
+# ==============================================================================
+# O arquivo é uma lista de objetos {"nome_completo", "ra_numero", "ra_digito_verificador"}.
+# Ele é lido em blocos (iterar_alunos) e comparado com o banco em UMA consulta
+# pelas chaves (ra_numero, ra_digito_verificador). Só o que mudou é gravado,
+# em lotes de LOTE: bulk_update para quem já existe (nome/turma) e
+# bulk_create(update_conflicts=True) para os novos.
+
+LOTE = 500
+TAMANHO_LEITURA = 64 * 1024
+
+
+class ErroEstrutura(ValueError):
+    pass
+
+
+def iterar_alunos(arquivo, tamanho_leitura=TAMANHO_LEITURA):
+    """
+    Parser incremental de uma lista JSON no nível raiz: devolve um objeto por vez
+    sem carregar o arquivo inteiro (json.load) nem a lista toda na memória.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    posicao = 0
+    fim_arquivo = False
+
+    def ler_mais():
+        nonlocal buffer, posicao, fim_arquivo
+        bloco = arquivo.read(tamanho_leitura)
+        if not bloco:
+            fim_arquivo = True
+        buffer = buffer[posicao:] + bloco
+        posicao = 0
+
+    def proximo_caractere():
+        nonlocal posicao
+        while True:
+            while posicao < len(buffer) and buffer[posicao].isspace():
+                posicao += 1
+            if posicao < len(buffer):
+                return buffer[posicao]
+            if fim_arquivo:
+                return ''
+            ler_mais()
+
+    if proximo_caractere() != '[':
+        raise ErroEstrutura("O JSON deve ser uma lista de objetos (alunos).")
+    posicao += 1
+
+    if proximo_caractere() == ']':
+        return
+
+    while True:
+        if not proximo_caractere():
+            raise ErroEstrutura("Arquivo JSON incompleto.")
+        while True:
+            try:
+                item, fim = decoder.raw_decode(buffer, posicao)
+                break
+            except json.JSONDecodeError:
+                if fim_arquivo:
+                    raise
+                ler_mais()
+        posicao = fim
+        yield item
+
+        separador = proximo_caractere()
+        posicao += 1
+        if separador == ']':
+            return
+        if separador != ',':
+            raise ErroEstrutura("Separador inválido entre os itens da lista.")
+
+
+def ler_registros(arquivo):
+    """
+    Valida os itens do arquivo. Retorna ({(ra, dígito): (linha, nome)}, erros).
+    Erros são tuplas (linha, ra_numero, ra_digito_verificador, motivo).
+    """
+    registros = {}
+    erros = []
+
+    for linha, item in enumerate(iterar_alunos(arquivo), start=1):
+        if not isinstance(item, dict):
+            erros.append((linha, '', '', 'Item não é um objeto.'))
+            continue
+
+        nome_completo = (item.get('nome_completo') or '').strip()
+        ra_numero = str(item.get('ra_numero') or '').strip()
+        ra_digito_verificador = str(item.get('ra_digito_verificador') or '').strip()
+
+        if not ra_numero or not ra_digito_verificador:
+            erros.append((linha, ra_numero, ra_digito_verificador, 'RA ou dígito ausente.'))
+            continue
+        if not nome_completo:
+            erros.append((linha, ra_numero, ra_digito_verificador, 'Nome ausente.'))
+            continue
+
+        chave = (ra_numero, ra_digito_verificador)
+        if chave in registros:
+            erros.append((linha, ra_numero, ra_digito_verificador,
+                          f'RA repetido no arquivo (mantida a linha {registros[chave][0]}).'))
+            continue
+        registros[chave] = (linha, nome_completo)
+
+    return registros, erros
+
+
+def calcular_diff(registros, turma):
+    """
+    Compara o arquivo com o banco em uma única consulta.
+    Retorna (novos, alterados, inalterados, erros).
+    """
+    existentes = {}
+    ras = {ra_numero for ra_numero, _ in registros}
+    for aluno in RegistroAluno.objects.filter(ra_numero__in=ras).only(
+            'pk', 'ra_numero', 'ra_digito_verificador', 'nome_completo', 'turma_id'):
+        chave = (aluno.ra_numero, aluno.ra_digito_verificador)
+        if chave in registros:
+            existentes.setdefault(chave, []).append(aluno)
+
+    novos, alterados, erros = [], [], []
+    inalterados = 0
+
+    for chave, (linha, nome_completo) in registros.items():
+        candidatos = existentes.get(chave)
+        if not candidatos:
+            novos.append(RegistroAluno(
+                ra_numero=chave[0], ra_digito_verificador=chave[1],
+                nome_completo=nome_completo, turma=turma,
+            ))
+            continue
+
+        if len(candidatos) > 1:
+            # Mesmo RA em mais de uma turma: só atualiza o registro da turma de destino
+            candidatos = [aluno for aluno in candidatos if aluno.turma_id == turma.pk]
+            if len(candidatos) != 1:
+                erros.append((linha, chave[0], chave[1], 'RA cadastrado em mais de uma turma.'))
+                continue
+
+        aluno = candidatos[0]
+        if aluno.nome_completo == nome_completo and aluno.turma_id == turma.pk:
+            inalterados += 1
+            continue
+        aluno.nome_completo = nome_completo
+        aluno.turma = turma
+        alterados.append(aluno)
+
+    return novos, alterados, inalterados, erros
+
+
+def gravar_lote(novos, alterados):
+    """
+    Grava um lote em uma transação. Se o lote falhar, grava item a item para
+    isolar os registros com problema. Retorna (criados, atualizados, erros).
+    """
+    try:
+        with transaction.atomic():
+            if alterados:
+                RegistroAluno.objects.bulk_update(alterados, ['nome_completo', 'turma'])
+            if novos:
+                RegistroAluno.objects.bulk_create(
+                    novos,
+                    update_conflicts=True,
+                    unique_fields=['ra_numero', 'ra_digito_verificador', 'turma'],
+                    update_fields=['nome_completo'],
+                )
+        return len(novos), len(alterados), []
+    except IntegrityError:
+        pass
+
+    contagem = {'criados': 0, 'atualizados': 0}
+    erros = []
+    for chave, alunos in (('atualizados', alterados), ('criados', novos)):
+        for aluno in alunos:
+            try:
+                with transaction.atomic():
+                    aluno.save()
+                contagem[chave] += 1
+            except IntegrityError as e:
+                erros.append((None, aluno.ra_numero, aluno.ra_digito_verificador, f'Erro de integridade: {e}'))
+    return contagem['criados'], contagem['atualizados'], erros
+
+
+def matricular_no_grupo(registros, turma, grupo):
+    """
+    Matricula no grupo os alunos do arquivo que estão na turma, com os
+    responsáveis deles (users/grupos.py). Retorna quantos MembroGrupo foram criados.
+    """
+    alunos = [
+        aluno for aluno in RegistroAluno.objects.filter(turma=turma, ra_numero__in={ra for ra, _ in registros})
+        if (aluno.ra_numero, aluno.ra_digito_verificador) in registros
+    ]
+    responsaveis = RegistroResponsavel.objects.filter(alunos__in=[aluno.pk for aluno in alunos]).distinct()
+    return len(matricular_registros(grupo, alunos + list(responsaveis)))
+
+
+def relatorio_csv(erros):
+    """CSV (pt-BR, ;) com as linhas rejeitadas."""
+    saida = io.StringIO()
+    writer = csv.writer(saida, delimiter=';', quoting=csv.QUOTE_ALL)
+    writer.writerow(['Linha', 'RA', 'Dígito', 'Motivo'])
+    for linha, ra_numero, ra_digito_verificador, motivo in erros:
+        writer.writerow([linha or '', ra_numero, ra_digito_verificador, motivo])
+    return saida.getvalue().encode('utf-8-sig')
@@ -0,0 +1,136 @@
+import io
+import json
+import logging
+
+from celery import shared_task
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.urls import reverse
+from django.utils import timezone
+
+from . import seeder
+from .models import JSONUpload
+
+logger = logging.getLogger(__name__)
+
+
+def _atualizar(upload, **campos):
+    """Grava o progresso direto no banco (o admin pode estar consultando a mesma linha)."""
+    for campo, valor in campos.items():
+        setattr(upload, campo, valor)
+    JSONUpload.objects.filter(pk=upload.pk).update(**campos)
+
+
+def _avisar_progresso(upload, mensagem='', final=False):
+    from mensagens.notificacoes import avisar_usuario, enviar_progresso
+
+    if not upload.enviado_por_id:
+        return
+    url = reverse('admin:users_jsonupload_change', args=[upload.pk])
+    try:
+        enviar_progresso(upload.enviado_por_id, f'seeder:{upload.pk}', upload.processados, upload.total, mensagem, url)
+        if final:
+            avisar_usuario(upload.enviado_por_id, mensagem, url)
+    except Exception as e:
+        # Sem Redis/Channels a importação continua: o progresso fica no registro
+        logger.warning(f"Não foi possível enviar o progresso da importação {upload.pk}: {e}")
+
+
+def _segundos_desde(momento):
+    return (timezone.now() - momento).total_seconds()
+
+
+def interrompida(upload):
+    """
+    PROCESSANDO há mais que o limite de tempo das tasks: o worker morreu no meio
+    da importação (nenhuma execução viva passa de CELERY_TASK_TIME_LIMIT).
+    """
+    return (
+        upload.status == JSONUpload.Status.PROCESSANDO
+        and (upload.iniciado_em is None or _segundos_desde(upload.iniciado_em) > settings.CELERY_TASK_TIME_LIMIT)
+    )
+
+
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True, ignore_result=True, max_retries=3)
+def importar_alunos_json_task(self, upload_id):
+    """
+    Importa os alunos de um JSONUpload: leitura incremental do arquivo, diff
+    contra o banco em uma consulta e gravação em lotes (ver users/seeder.py).
+    O progresso de cada lote é gravado no JSONUpload e enviado ao admin pelo
+    WebSocket de notificações.
+
+    Pode rodar de novo depois de um worker morto (acks_late devolve a mensagem
+    à fila): o diff e o upsert são idempotentes, então a importação recomeça do
+    início e o que já foi gravado entra como inalterado.
+    """
+    upload = JSONUpload.objects.select_related('turma', 'grupo__auth_group').filter(pk=upload_id).first()
+    if upload is None:
+        return
+    if upload.status == JSONUpload.Status.PROCESSANDO and not interrompida(upload):
+        # Outra execução pode estar viva: confere de novo quando ela já teria estourado o limite
+        restante = settings.CELERY_TASK_TIME_LIMIT - _segundos_desde(upload.iniciado_em)
+        raise self.retry(countdown=int(restante) + 5)
+    if upload.status not in (JSONUpload.Status.PENDENTE, JSONUpload.Status.PROCESSANDO):
+        return
+
+    if upload.status == JSONUpload.Status.PROCESSANDO:
+        logger.warning(f"Importação {upload_id} interrompida no meio; recomeçando.")
+    _atualizar(
+        upload, status=JSONUpload.Status.PROCESSANDO, iniciado_em=timezone.now(),
+        total=0, processados=0, criados=0, atualizados=0, inalterados=0, erros=0,
+    )
+    erros = []
+
+    try:
+        with upload.json_file.open('rb') as f:
+            registros, erros = seeder.ler_registros(io.TextIOWrapper(f, encoding='utf-8-sig'))
+
+        novos, alterados, inalterados, erros_diff = seeder.calcular_diff(registros, upload.turma)
+        erros.extend(erros_diff)
+        _atualizar(upload, total=len(novos) + len(alterados), inalterados=inalterados, erros=len(erros))
+        _avisar_progresso(upload, "Importação de alunos iniciada.")
+
+        lotes = [([], alterados[i:i + seeder.LOTE]) for i in range(0, len(alterados), seeder.LOTE)]
+        lotes += [(novos[i:i + seeder.LOTE], []) for i in range(0, len(novos), seeder.LOTE)]
+
+        for lote_novos, lote_alterados in lotes:
+            criados, atualizados, erros_lote = seeder.gravar_lote(lote_novos, lote_alterados)
+            erros.extend(erros_lote)
+            _atualizar(
+                upload,
+                processados=upload.processados + len(lote_novos) + len(lote_alterados),
+                criados=upload.criados + criados,
+                atualizados=upload.atualizados + atualizados,
+                erros=len(erros),
+            )
+            _avisar_progresso(upload)
+
+        mensagem = (f"Processamento concluído: {upload.criados} registros criados. "
+                    f"{upload.atualizados} registros atualizados (turma ou nome). "
+                    f"{upload.inalterados} sem alteração. ({len(erros)} erros)")
+
+        if upload.grupo_id:
+            matriculados = seeder.matricular_no_grupo(registros, upload.turma, upload.grupo)
+            mensagem += f" {matriculados} novas matrículas no grupo {upload.grupo}."
+        status = JSONUpload.Status.CONCLUIDO
+
+    except (seeder.ErroEstrutura, json.JSONDecodeError, UnicodeDecodeError) as e:
+        mensagem = f"Falha: o arquivo não é um JSON válido no formato esperado ({e})."
+        status = JSONUpload.Status.FALHOU
+    except Exception as e:
+        logger.exception(f"Erro inesperado na importação {upload_id}")
+        mensagem = f"Erro inesperado no processamento do arquivo: {e}"
+        status = JSONUpload.Status.FALHOU
+
+    if erros:
+        upload.relatorio_erros.save(f"erros_upload_{upload.pk}.csv", ContentFile(seeder.relatorio_csv(erros)), save=False)
+        _atualizar(upload, relatorio_erros=upload.relatorio_erros.name)
+
+    # O arquivo com os dados dos alunos não fica guardado depois da importação
+    try:
+        upload.json_file.delete(save=False)
+    except Exception:
+        pass
+
+    _atualizar(upload, status=status, mensagem=mensagem, concluido_em=timezone.now(), json_file=upload.json_file.name or '')
+    _avisar_progresso(upload, mensagem, final=True)
@@ -1,3 +1,356 @@
-from django.test import TestCase
+import io
+import json
+import re
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from celery.exceptions import Retry
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from config.redis_conf import get_redis, redis_disponivel
+from core import massa_dados
+from core.orcamento import OrcamentoQueriesMixin
+from mensagens import notificacoes
+from mensagens.models import Canal
+
+from . import seeder
+from .grupos import matricular_registros, membros_grupo_alterados, registros_da_turma
+from .models import CustomUser, JSONUpload, MembroGrupo, RegistroAluno, Turma
+from .tasks import importar_alunos_json_task
+
+CACHE_LOCAL = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+# ==============================================================================
+# ORÇAMENTO DE QUERIES DO DASHBOARD E DO ADMIN DE USUÁRIOS (core/orcamento.py)
+# ==============================================================================
+# Um usuário em muitos grupos, com canais movimentados e galerias em cada
+# grupo; turmas cheias de alunos e responsáveis para as listagens do admin.
+
+@override_settings(CACHES=CACHE_LOCAL)
+class OrcamentoUsuariosTests(OrcamentoQueriesMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.grupos = massa_dados.criar_grupos(10)
+        fotografo = massa_dados.criar_usuario('fotografo', is_fotografo=True)
+        cls.responsaveis = massa_dados.criar_usuarios(15, cls.grupos)
+        for grupo in cls.grupos:
+            massa_dados.criar_galeria(fotografo, f'Evento {grupo}', grupos=[grupo], imagens=5)
+            massa_dados.criar_mensagens(Canal.objects.get(grupo=grupo), cls.responsaveis[1:], 30)
+        for i in range(4):
+            massa_dados.criar_turma(f'{i + 1}º Ano', alunos=25, grupo=cls.grupos[i])
+        cls.admin = massa_dados.criar_usuario('diretoria', is_staff=True, is_superuser=True)
+
+    def setUp(self):
+        cache.clear()
+
+    @skipUnless(redis_disponivel(), 'Redis indisponível')
+    def test_dashboard_com_contagens_frias(self):
+        usuario = self.responsaveis[0]
+        # Sem o HASH de não lidas no Redis: o dashboard carrega as contagens do banco
+        get_redis().delete(notificacoes.chave_usuario(usuario.pk))
+        self.entrar(usuario)
+
+        response = self.assertOrcamentoDaUrl(reverse('users:dashboard'))
+        self.assertEqual(len(response.context['canais_nao_lidos']), len(self.grupos))
+
+    def test_changelists_do_admin(self):
+        self.entrar(self.admin)
+        for modelo in ('customuser', 'profile', 'registroaluno', 'turma', 'grupo', 'membrogrupo'):
+            with self.subTest(modelo=modelo):
+                self.assertOrcamentoDaUrl(reverse(f'admin:users_{modelo}_changelist'))
+
+
+# ==============================================================================
+# AÇÕES DE GRUPO EM MASSA DO ADMIN ("selecionar todos")
+# ==============================================================================
+
+@override_settings(CACHES=CACHE_LOCAL)
+class AcaoGrupoEmMassaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.grupo = massa_dados.criar_grupos(1)[0]
+        cls.usuarios = massa_dados.criar_usuarios(5, prefixo='aluno')
+        massa_dados.criar_usuarios(3, prefixo='professor')
+        cls.admin = massa_dados.criar_usuario('diretoria', is_staff=True, is_superuser=True)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_selecionar_todos_no_changelist_filtrado(self):
+        # Só a primeira linha vem marcada: "selecionar todos" vale pelo filtro da URL
+        url = reverse('admin:users_customuser_changelist') + '?q=aluno'
+        confirmacao = self.client.post(url, {
+            'action': 'add_to_group_mass', 'select_across': '1', 'index': '0',
+            '_selected_action': [self.usuarios[0].pk],
+        })
+        self.assertEqual(confirmacao.status_code, 200)
+        self.assertEqual(confirmacao.context['total'], len(self.usuarios))
+
+        # Envia de volta exatamente os campos ocultos da tela de confirmação
+        dados = {}
+        for nome, valor in re.findall(r'<input type="hidden" name="([^"]+)" value="([^"]*)"', confirmacao.content.decode()):
+            dados.setdefault(nome, []).append(valor)
+        dados.update({'grupo': self.grupo.pk, 'apply': '1'})
+
+        response = self.client.post(url, dados)
+        self.assertEqual(response.status_code, 302)
+        membros = set(CustomUser.objects.filter(groups=self.grupo.auth_group).values_list('pk', flat=True))
+        self.assertEqual(membros, {usuario.pk for usuario in self.usuarios})
+
+
+# ==============================================================================
+# IMPORTAÇÃO DE ALUNOS POR JSON (seeder.py e importar_alunos_json_task)
+# ==============================================================================
+
+def _aluno(nome, ra, digito='1'):
+    return {'nome_completo': nome, 'ra_numero': ra, 'ra_digito_verificador': digito}
+
+
+class ParserAlunosTests(TestCase):
+
+    def test_itens_atravessando_os_blocos_de_leitura(self):
+        alunos = [_aluno(f'Ana [{i}], "Bia"', f'{1000 + i}') for i in range(30)]
+        texto = ' \n' + json.dumps(alunos, ensure_ascii=False, indent=2)
+        # Blocos de 7 caracteres: objetos e strings sempre cortados no meio
+        self.assertEqual(list(seeder.iterar_alunos(io.StringIO(texto), tamanho_leitura=7)), alunos)
+        self.assertEqual(list(seeder.iterar_alunos(io.StringIO(' [ ] '))), [])
+
+    def test_arquivos_malformados(self):
+        casos = {
+            '{"nome_completo": "Ana"}': seeder.ErroEstrutura,
+            '[{"ra_numero": "1"} {"ra_numero": "2"}]': seeder.ErroEstrutura,
+            '[{"ra_numero": "1"},': seeder.ErroEstrutura,
+            '[{"ra_numero": "1"': json.JSONDecodeError,
+        }
+        for texto, erro in casos.items():
+            with self.subTest(texto=texto), self.assertRaises(erro):
+                list(seeder.iterar_alunos(io.StringIO(texto), tamanho_leitura=4))
+
+
+class ImportacaoAlunosTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.turma = massa_dados.criar_turma('5º Ano', alunos=0)
+        cls.outra_turma = massa_dados.criar_turma('4º Ano', alunos=0)
+
+    def setUp(self):
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta, ignore_errors=True)
+        configuracao = self.settings(MEDIA_ROOT=pasta)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def importar(self, conteudo):
+        if not isinstance(conteudo, str):
+            conteudo = json.dumps(conteudo)
+        upload = JSONUpload.objects.create(
+            turma=self.turma, json_file=ContentFile(conteudo.encode(), name='alunos.json')
+        )
+        importar_alunos_json_task(upload.pk)
+        upload.refresh_from_db()
+        return upload
+
+    def contagens(self, upload):
+        return upload.criados, upload.atualizados, upload.inalterados, upload.erros
+
+    def test_arquivo_valido(self):
+        upload = self.importar([_aluno(f'Aluno {i}', f'{5000 + i}') for i in range(12)])
+
+        self.assertEqual(upload.status, JSONUpload.Status.CONCLUIDO)
+        self.assertEqual(self.contagens(upload), (12, 0, 0, 0))
+        self.assertEqual(RegistroAluno.objects.filter(turma=self.turma).count(), 12)
+        # Nem relatório de erros nem o arquivo original ficam guardados
+        self.assertFalse(upload.relatorio_erros)
+        self.assertFalse(upload.json_file)
+
+    def test_arquivo_malformado(self):
+        upload = self.importar('[{"nome_completo": "Ana", "ra_numero": "1", "ra_digito_verificador": "1"')
+
+        self.assertEqual(upload.status, JSONUpload.Status.FALHOU)
+        self.assertIn('não é um JSON válido', upload.mensagem)
+        self.assertFalse(RegistroAluno.objects.exists())
+
+    def test_erros_parciais_geram_relatorio(self):
+        upload = self.importar([
+            _aluno('Ana', '100'),
+            _aluno('Bruno', ''),
+            _aluno('', '101'),
+            _aluno('Ana Repetida', '100'),
+            'não é um objeto',
+            _aluno('Carla', '102'),
+        ])
+
+        self.assertEqual(upload.status, JSONUpload.Status.CONCLUIDO)
+        self.assertEqual(self.contagens(upload), (2, 0, 0, 4))
+        with upload.relatorio_erros.open('rb') as f:
+            relatorio = f.read().decode('utf-8-sig').splitlines()
+        self.assertEqual([linha.split(';')[0] for linha in relatorio[1:]], ['"2"', '"3"', '"4"', '"5"'])
+        self.assertIn('mantida a linha 1', relatorio[3])
+
+    def test_reimportacao(self):
+        alunos = [_aluno(f'Aluno {i}', f'{7000 + i}') for i in range(5)]
+        self.importar(alunos)
+
+        upload = self.importar(alunos)
+        self.assertEqual(self.contagens(upload), (0, 0, 5, 0))
+        self.assertEqual(upload.total, 0)
+
+        # Nome corrigido e aluno vindo de outra turma: atualizados, sem duplicar
+        RegistroAluno.objects.create(nome_completo='Dora', ra_numero='7100', ra_digito_verificador='1',
+                                     turma=self.outra_turma)
+        alunos[0] = _aluno('Aluno Zero', '7000')
+        upload = self.importar(alunos + [_aluno('Dora', '7100')])
+        self.assertEqual(self.contagens(upload), (0, 2, 4, 0))
+        self.assertEqual(RegistroAluno.objects.count(), 6)
+        self.assertEqual(RegistroAluno.objects.get(ra_numero='7100').turma, self.turma)
+
+    def enviado(self, alunos, iniciado_ha):
+        """Upload que um worker deixou em PROCESSANDO há `iniciado_ha` segundos."""
+        return JSONUpload.objects.create(
+            turma=self.turma, json_file=ContentFile(json.dumps(alunos).encode(), name='alunos.json'),
+            status=JSONUpload.Status.PROCESSANDO, iniciado_em=timezone.now() - timedelta(seconds=iniciado_ha),
+            total=len(alunos), processados=4, criados=4,
+        )
+
+    def test_importacao_interrompida_recomeca(self):
+        alunos = [_aluno(f'Aluno {i}', f'{8000 + i}') for i in range(10)]
+        # Worker morto depois do primeiro lote
+        for aluno in alunos[:4]:
+            RegistroAluno.objects.create(turma=self.turma, **aluno)
+        upload = self.enviado(alunos, settings.CELERY_TASK_TIME_LIMIT + 60)
+
+        importar_alunos_json_task(upload.pk)
+        upload.refresh_from_db()
+
+        self.assertEqual(upload.status, JSONUpload.Status.CONCLUIDO)
+        self.assertEqual(self.contagens(upload), (6, 0, 4, 0))
+        self.assertEqual((upload.processados, upload.total), (6, 6))
+        self.assertEqual(RegistroAluno.objects.filter(turma=self.turma).count(), 10)
+
+    def test_importacao_em_andamento_reagenda(self):
+        upload = self.enviado([_aluno('Ana', '8100')], 30)
+
+        with mock.patch.object(importar_alunos_json_task, 'retry', side_effect=Retry()) as retry, \
+                self.assertRaises(Retry):
+            importar_alunos_json_task(upload.pk)
+
+        # Confere de novo quando a execução viva já teria estourado o limite de tempo
+        self.assertAlmostEqual(retry.call_args.kwargs['countdown'], settings.CELERY_TASK_TIME_LIMIT - 30 + 5, delta=2)
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, JSONUpload.Status.PROCESSANDO)
+        self.assertFalse(RegistroAluno.objects.exists())
+
+    def test_acao_retoma_so_as_interrompidas(self):
+        parada = self.enviado([_aluno('Ana', '8200')], settings.CELERY_TASK_TIME_LIMIT + 60)
+        rodando = self.enviado([_aluno('Bia', '8201')], 30)
+        self.client.force_login(massa_dados.criar_usuario('diretoria', is_staff=True, is_superuser=True))
+
+        with mock.patch.object(importar_alunos_json_task, 'delay') as delay:
+            self.client.post(reverse('admin:users_jsonupload_changelist'), {
+                'action': 'retomar_importacao', '_selected_action': [parada.pk, rodando.pk],
+            })
+        delay.assert_called_once_with(parada.pk)
+
+    def test_lote_com_conflito_grava_item_a_item(self):
+        RegistroAluno.objects.create(nome_completo='Eva', ra_numero='200', ra_digito_verificador='1',
+                                     turma=self.turma)
+        movido = RegistroAluno.objects.create(nome_completo='Eva', ra_numero='200', ra_digito_verificador='1',
+                                              turma=self.outra_turma)
+        # Mover para a turma em que o mesmo RA já existe viola o unique_together
+        movido.turma = self.turma
+        novo = RegistroAluno(nome_completo='Fábio', ra_numero='201', ra_digito_verificador='1', turma=self.turma)
+
+        criados, atualizados, erros = seeder.gravar_lote([novo], [movido])
+
+        self.assertEqual((criados, atualizados, len(erros)), (1, 0, 1))
+        self.assertEqual(erros[0][1:3], ('200', '1'))
+        self.assertTrue(RegistroAluno.objects.filter(ra_numero='201', turma=self.turma).exists())
+
+
+# ==============================================================================
+# MATRÍCULA EM MASSA (grupos.matricular_registros)
+# ==============================================================================
+
+class MatriculaEmMassaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Cada aluno tem usuário e um responsável (sem usuário)
+        cls.turma = massa_dados.criar_turma('3º Ano', alunos=40)
+        cls.grupo = massa_dados.criar_grupos(1)[0]
+
+    def setUp(self):
+        self.sinais = []
+        membros_grupo_alterados.connect(self.receber)
+        self.addCleanup(membros_grupo_alterados.disconnect, self.receber)
+
+    def receber(self, sender, **kwargs):
+        self.sinais.append(kwargs)
+
+    def usuarios_no_grupo(self):
+        return set(CustomUser.objects.filter(groups=self.grupo.auth_group).values_list('pk', flat=True))
+
+    def test_turma_inteira_com_numero_fixo_de_queries(self):
+        # Alunos e responsáveis (2) + vínculos existentes, MembroGrupo e AuthGroup (3) + savepoint (2)
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(7):
+            novos = matricular_registros(self.grupo, registros_da_turma(self.turma))
+
+        self.assertEqual(len(novos), 80)
+        self.assertEqual(MembroGrupo.objects.filter(grupo=self.grupo).count(), 80)
+        alunos_com_usuario = set(CustomUser.objects.filter(registro_aluno__turma=self.turma).values_list('pk', flat=True))
+        self.assertEqual(len(alunos_com_usuario), 40)
+        self.assertEqual(self.usuarios_no_grupo(), alunos_com_usuario)
+
+        # Um único sinal para a operação inteira
+        self.assertEqual(len(self.sinais), 1)
+        self.assertEqual(self.sinais[0]['auth_group_id'], self.grupo.auth_group_id)
+        self.assertEqual((self.sinais[0]['vinculos'], len(self.sinais[0]['membros'])), (40, 80))
+
+    def test_ja_matriculados_sao_ignorados(self):
+        alunos = list(RegistroAluno.objects.filter(turma=self.turma).order_by('pk'))
+        with self.captureOnCommitCallbacks(execute=True):
+            matricular_registros(self.grupo, alunos[:10])
+            novos = matricular_registros(self.grupo, alunos)
+            repetida = matricular_registros(self.grupo, alunos)
+
+        self.assertEqual({membro.aluno_id for membro in novos}, {aluno.pk for aluno in alunos[10:]})
+        self.assertEqual(repetida, [])
+        self.assertEqual(MembroGrupo.objects.filter(grupo=self.grupo).count(), 40)
+        # A terceira chamada não mudou nada: nenhum sinal
+        self.assertEqual(len(self.sinais), 2)
+
+    def test_vinculo_ao_auth_group_e_sincronizado(self):
+        aluno = RegistroAluno.objects.filter(turma=self.turma).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            matricular_registros(self.grupo, [aluno])
+        # Vínculo do usuário removido por fora: a próxima matrícula o recria
+        usuario = CustomUser.objects.get(registro_aluno=aluno)
+        usuario.groups.remove(self.grupo.auth_group)
+        self.sinais.clear()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            novos = matricular_registros(self.grupo, [aluno])
+
+        self.assertEqual(novos, [])
+        self.assertEqual(self.usuarios_no_grupo(), {usuario.pk})
+        self.assertEqual([(sinal['vinculos'], sinal['membros']) for sinal in self.sinais], [(1, [])])
+
+    def test_registro_invalido_nao_grava_nada(self):
+        aluno = RegistroAluno.objects.filter(turma=self.turma).first()
+        with self.assertRaises(ValidationError):
+            matricular_registros(self.grupo, [aluno, Turma.objects.first()])
+        self.assertFalse(MembroGrupo.objects.filter(grupo=self.grupo).exists())
+        self.assertEqual(self.usuarios_no_grupo(), set())
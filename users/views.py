@@ -13,7 +13,10 @@ from django.db.models import Q  # NOVO: Import necessário para queries complexa
 # 🎯 CORREÇÕES DE IMPORTAÇÃO: Modelos de outros apps
 # ==============================================================================
 from mensagens.models import Canal, UltimaLeituraUsuario, Mensagem
+from mensagens import notificacoes
 from repositorio.models import Galeria  # <--- ADICIONADO PARA O DASHBOARD
+from repositorio.cache import bloco_galerias_dashboard
+from core.orcamento import orcamento_queries
 
 # Importar modelos e formulários
 from .forms import (
@@ -172,30 +175,18 @@ def admin_approve_user(request, user_id):
 
 def get_chat_notifications(user):
     """
-    Retorna uma QuerySet de canais onde há mensagens mais novas
-    do que a última vez que o usuário leu (UltimaLeituraUsuario).
+    Retorna a lista de canais com mensagens não lidas pelo usuário.
+    Os totais vêm dos contadores no Redis (mensagens/notificacoes.py), que são
+    carregados a partir de UltimaLeituraUsuario apenas na primeira leitura.
     """
-    # 1. Busca todos os canais que o usuário pertence (Filtra Canais cujo Grupo tem o usuário logado)
-    # 🚨 CORREÇÃO DO VALUERROR: Substituída a sintaxe '...__user=user' pela sintaxe '...__in=user.groups.all()'
-    # para garantir que o filtro receba uma coleção de objetos Group, conforme esperado pelo Django.
-    channels_qs = Canal.objects.filter(grupo__auth_group__in=user.groups.all())
-    canais_nao_lidos = []
-
-    for channel in channels_qs:
-        # Tenta encontrar o registro de última leitura do usuário para este canal
-        # 🚨 CORRIGIDO: Usa UltimaLeituraUsuario, campo 'usuario' e campo 'canal'
-        last_read_obj = UltimaLeituraUsuario.objects.filter(usuario=user, canal=channel).first()
-
-        # 2. Encontra a data da última mensagem no canal
-        # 🚨 CORRIGIDO: Usa Mensagem e campo 'data_envio'
-        latest_message = Mensagem.objects.filter(canal=channel).order_by('-data_envio').first()
-
-        if latest_message:
-            # Se não houver registro de leitura OU se a última mensagem for mais nova que o last_read
-            # 🚨 CORRIGIDO: Usa o campo 'data_leitura'
-            if not last_read_obj or latest_message.data_envio > last_read_obj.data_leitura:
-                # 3. Se houver nova mensagem, adiciona o canal à lista
-                canais_nao_lidos.append(channel)
+    contagens = notificacoes.contagens_usuario(user)
+    canal_ids = [int(chave.split(':', 1)[1]) for chave in contagens if chave.startswith('canal:')]
+    if not canal_ids:
+        return []
+
+    canais_nao_lidos = list(Canal.objects.filter(id__in=canal_ids).order_by('nome'))
+    for canal in canais_nao_lidos:
+        canal.nao_lidas = contagens[f'canal:{canal.id}']
 
     # Retorna uma lista dos objetos Canal que têm novas mensagens
     return canais_nao_lidos
@@ -451,6 +442,8 @@ class UserPasswordChangeView(PasswordChangeView):
 # 3. VISTA DA DASHBOARD (🎯 MODIFICADA: 3 GALERIAS POR GRUPO)
 # ==============================================================================
 
+# HASH de não lidas frio: +2 (canais e tópicos de suporte, notificacoes._contagens_db)
+@orcamento_queries(7)
 @login_required
 def dashboard(request):
     """
@@ -466,46 +459,9 @@ def dashboard(request):
     canais_nao_lidos_list = get_chat_notifications(request.user)
     context['canais_nao_lidos'] = canais_nao_lidos_list
 
-    # Função interna para injetar as URLs do proxy (Lógica extraída de galerias/views.py)
-    def inject_proxy_urls(galerias_qs):
-        for galeria in galerias_qs:
-            if galeria.capa and galeria.capa.arquivo_processado:
-                try:
-                    # Usa o reverse para a rota do proxy do app galerias
-                    galeria.capa_proxy_url = reverse(
-                        'galerias:private_media_proxy',
-                        kwargs={'path': galeria.capa.arquivo_processado.name}
-                    )
-                except Exception:
-                    galeria.capa_proxy_url = None
-            else:
-                galeria.capa_proxy_url = None
-
-    # 🎯 1. Busca as 3 últimas galerias puramente públicas e publicadas
-    ultimas_galerias_publicas = Galeria.objects.filter(
-        acesso_publico=True,
-        status='PB'
-    ).select_related('capa').order_by('-data_do_evento', '-criado_em')[:3]
-    inject_proxy_urls(ultimas_galerias_publicas)
-
-    # 🎯 2. Busca as 3 últimas galerias DE CADA GRUPO do usuário
-    user_groups = request.user.groups.all()
-    grupos_com_galerias = []
-
-    for group in user_groups:
-        galerias_do_grupo = Galeria.objects.filter(
-            status='PB',
-            grupos_acesso__auth_group=group
-        ).select_related('capa').order_by('-data_do_evento', '-criado_em')[:3]
-
-        if galerias_do_grupo.exists():
-            inject_proxy_urls(galerias_do_grupo)
-            grupos_com_galerias.append({
-                'nome_grupo': group.name,
-                'galerias': galerias_do_grupo
-            })
-
-    context['ultimas_galerias_publicas'] = ultimas_galerias_publicas
-    context['grupos_com_galerias'] = grupos_com_galerias
+    # 🎯 Galerias: 3 públicas + as 3 últimas de cada grupo do usuário.
+    # Montado em uma única query por janela (ROW_NUMBER por grupo) e cacheado
+    # por usuário; publicar/arquivar uma galeria invalida o cache.
+    context.update(bloco_galerias_dashboard(request.user))
 
     return render(request, 'users/dashboard.html', context)